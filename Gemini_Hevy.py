@@ -3,7 +3,6 @@ import pickle
 import io
 import json
 import pandas as pd
-import requests
 import time
 from datetime import datetime, timedelta
 from googleapiclient.discovery import build
@@ -12,6 +11,7 @@ from google.auth.transport.requests import Request
 from googleapiclient.http import MediaIoBaseDownload
 from google import genai
 from dotenv import load_dotenv
+import hevy_client
 
 # --- CONFIGURATION ---
 DRY_RUN = False  # Set to False to actually post workouts to Hevy
@@ -164,9 +164,6 @@ def get_drive_service():
 def fetch_and_save_hevy_exercises():
     """Downloads exercise list from Hevy and saves as CSV locally."""
     print("   [!] 'HEVY APP exercises.csv' missing. Downloading from Hevy API...")
-    url = "https://api.hevyapp.com/v1/exercise_templates"
-    headers = {"api-key": HEVY_API_KEY}
-    
     all_exercises = []
     page = 1
     page_count = 1
@@ -174,7 +171,8 @@ def fetch_and_save_hevy_exercises():
     try:
         # Hevy paginates, so we loop to get them all
         while page <= page_count:
-            response = requests.get(url, headers=headers, params={"page": page, "pageSize": 50})
+            response = hevy_client.get("/v1/exercise_templates", api_key=HEVY_API_KEY,
+                                       params={"page": page, "pageSize": 50})
             if response.status_code != 200:
                 print(f"Error fetching exercises: {response.text}")
                 return None
@@ -343,10 +341,8 @@ def generate_monthly_plan():
 
 def get_or_create_folder(folder_name="AI Fitness"):
     """Get the folder ID for the given folder name, or create it if it doesn't exist."""
-    headers = {"api-key": HEVY_API_KEY, "Content-Type": "application/json"}
-
     # List existing folders
-    response = requests.get("https://api.hevyapp.com/v1/routine_folders", headers=headers)
+    response = hevy_client.get("/v1/routine_folders", api_key=HEVY_API_KEY)
     if response.status_code == 200:
         folders = response.json().get('routine_folders', [])
         for folder in folders:
@@ -357,7 +353,7 @@ def get_or_create_folder(folder_name="AI Fitness"):
     # Folder doesn't exist, create it
     print(f"   Creating new folder '{folder_name}'...")
     payload = {"routine_folder": {"title": folder_name}}
-    response = requests.post("https://api.hevyapp.com/v1/routine_folders", headers=headers, json=payload)
+    response = hevy_client.post("/v1/routine_folders", api_key=HEVY_API_KEY, json=payload)
     if response.status_code in [200, 201]:
         folder_id = response.json()['routine_folder']['id']
         print(f"   Created folder '{folder_name}' (ID: {folder_id})")
@@ -368,10 +364,8 @@ def get_or_create_folder(folder_name="AI Fitness"):
 
 def delete_routines_in_folder(folder_id):
     """Delete all routines in the specified folder."""
-    headers = {"api-key": HEVY_API_KEY}
-
     # List routines in the folder
-    response = requests.get(f"https://api.hevyapp.com/v1/routines?routine_folder_id={folder_id}", headers=headers)
+    response = hevy_client.get("/v1/routines", api_key=HEVY_API_KEY, params={"routine_folder_id": folder_id})
     if response.status_code != 200:
         print(f"   Failed to list routines: {response.text}")
         return
@@ -385,7 +379,7 @@ def delete_routines_in_folder(folder_id):
     for routine in routines:
         routine_id = routine['id']
         title = routine['title']
-        delete_response = requests.delete(f"https://api.hevyapp.com/v1/routines/{routine_id}", headers=headers)
+        delete_response = hevy_client.delete(f"/v1/routines/{routine_id}", api_key=HEVY_API_KEY)
         if delete_response.status_code == 200:
             print(f"   -> Deleted '{title}'")
         else:
@@ -408,9 +402,6 @@ def post_to_hevy(routines_json):
         print("ERROR: Could not get or create folder")
         return
 
-    url = "https://api.hevyapp.com/v1/routines"
-    headers = {"api-key": HEVY_API_KEY, "Content-Type": "application/json"}
-
     routines_list = routines_json.get('routines', []) if isinstance(routines_json, dict) else routines_json
 
     print(f"\n   Creating {len(routines_list)} new routine(s)...")
@@ -422,7 +413,7 @@ def post_to_hevy(routines_json):
         title = payload['routine']['title']
         print(f"   Posting routine: {title}...")
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = hevy_client.post("/v1/routines", api_key=HEVY_API_KEY, json=payload)
         # Hevy returns 200 or 201 for success, or the routine data itself
         if response.status_code in [200, 201] or 'routine' in response.json():
             routine_data = response.json().get('routine', [{}])
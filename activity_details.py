@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import raw_archive
+import rate_limit
+
+# Opt-in deep fetch of per-activity details for the Garmin runs CSV. The
+# activity list often lacks hrTimeInZone_1..4, so for activities missing them
+# the HR-zone breakdown is fetched through a small thread pool.
+#
+# raw_archive doubles as the on-disk cache: responses are stored as
+# "garmin_activity/hr_zones" keyed by (day, activity id), and an activity that
+# is already archived is never fetched again.
+#
+# Enable with GARMIN_DEEP_FETCH=True (daily_garmin_runs.py, history_garmin_runs.py).
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+DEEP_FETCH = os.getenv("GARMIN_DEEP_FETCH", "False").lower() == "true"
+WORKERS = int(os.getenv("GARMIN_DETAIL_WORKERS", "4"))
+# -------------------------------------
+
+ZONES_ENDPOINT = "garmin_activity/hr_zones"
+ZONE_COLUMNS = ["hrTimeInZone_1", "hrTimeInZone_2", "hrTimeInZone_3", "hrTimeInZone_4"]
+
+
+def _day(act):
+    return str(act.get('startTimeLocal') or '')[:10]
+
+
+def needs_zones(act):
+    return all(act.get(col) is None for col in ZONE_COLUMNS)
+
+
+def fetch_zones(api, act, limiter=None):
+    """HR-zone response for one activity, from the archive when it was fetched before"""
+    activity_id, day = act.get('activityId'), _day(act)
+    if raw_archive.has(ZONES_ENDPOINT, day, activity_id):
+        return raw_archive.get(ZONES_ENDPOINT, day, activity_id)
+    rate_limit.acquire("garmin", limiter)
+    data = api.get_activity_hr_in_timezones(activity_id)
+    try:
+        raw_archive.put(ZONES_ENDPOINT, day, data, item=activity_id)
+    except Exception as e:
+        print(f"   Warning: Could not archive HR zones for {activity_id}: {e}")
+    return data
+
+
+def zone_seconds(data):
+    """
+    [zone 1..4 seconds] from an HR-zone response. Zone 5 is dropped, like in the
+    activity summary's hrTimeInZone_1..4, so Z4 means the same for both sources.
+    """
+    seconds = [None] * len(ZONE_COLUMNS)
+    for zone in data if isinstance(data, list) else []:
+        number, secs = zone.get('zoneNumber'), zone.get('secsInZone')
+        if not number or secs is None or int(number) > len(ZONE_COLUMNS):
+            continue
+        i = int(number) - 1
+        seconds[i] = (seconds[i] or 0) + secs
+    return seconds
+
+
+def fill_zones(api, activities, limiter=None, workers=None):
+    """{activity id: [zone 1..4 seconds]} for the activities whose summary lacks zones"""
+    todo = [act for act in activities if act.get('activityId') and needs_zones(act)]
+    if not todo:
+        return {}
+    zones = {}
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as pool:
+        futures = [(act['activityId'], pool.submit(fetch_zones, api, act, limiter)) for act in todo]
+        for activity_id, future in futures:
+            try:
+                zones[activity_id] = zone_seconds(future.result())
+            except Exception as e:
+                print(f"   HR zone fetch error for {activity_id}: {e}")
+    return zones
@@ -0,0 +1,266 @@
+import os
+import json
+import argparse
+from contextlib import contextmanager
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+import fitness_store
+import raw_archive
+import rate_limit
+
+try:
+    import fcntl  # Not available on Windows
+except ImportError:
+    fcntl = None
+
+# Per-second activity streams (HR, speed, cadence, elevation, distance) for
+# Garmin runs, stored as one append-only file of fixed-width records:
+#
+#   data/activity_streams.dat         numpy records (DTYPE), activities back to back
+#   data/activity_streams.idx.json    {activity id: {"offset", "length", "slot", "start", "name"}}
+#
+# Writers hold an exclusive lock (activity_streams.lock) around index load,
+# data write and index save, so the daily and history jobs can ingest at the
+# same time. A re-ingested activity reuses its slot when the records fit.
+#
+# read() / read_many() memory-map the file and slice out records, so scanning
+# hundreds of runs costs page faults instead of JSON parsing. Detail responses
+# are archived as "garmin_activity/details" (day, activity id), which is also
+# the cache: an activity is fetched once, and --replay rebuilds the file offline.
+#
+#     python3 activity_streams.py --start 2024-01-01     # backfill runs since
+#     python3 activity_streams.py --replay               # rebuild from the archive
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+# Ingest streams for new runs in daily_garmin_runs.py / history_garmin_runs.py
+INGEST = os.getenv("GARMIN_STREAMS", "False").lower() == "true"
+STREAMS_FILE = os.getenv("ACTIVITY_STREAMS_FILE", os.path.join(fitness_store.LOCAL_DATA_DIR, "activity_streams.dat"))
+INDEX_FILE = os.path.splitext(STREAMS_FILE)[0] + ".idx.json"
+# Upper bound on samples Garmin returns per activity (1/s covers ~5.5 h)
+MAX_SAMPLES = int(os.getenv("ACTIVITY_STREAM_MAX_SAMPLES", "20000"))
+WORKERS = int(os.getenv("GARMIN_DETAIL_WORKERS", "4"))
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+# -------------------------------------
+
+DETAILS_ENDPOINT = "garmin_activity/details"
+
+# field -> Garmin metric descriptor key
+METRICS = {
+    "hr": "directHeartRate",
+    "speed": "directSpeed",
+    "cadence": "directRunCadence",
+    "elevation": "directElevation",
+    "distance": "sumDistance",
+}
+DTYPE = np.dtype([("t", "<u4")] + [(field, "<f4") for field in METRICS])
+
+
+# --- INDEX ---
+def load_index():
+    try:
+        with open(INDEX_FILE, mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    tmp_path = INDEX_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_FILE)
+
+
+@contextmanager
+def _locked_index():
+    """Read-modify-write the index (and the data file) under an exclusive lock"""
+    folder = os.path.dirname(STREAMS_FILE)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(os.path.splitext(STREAMS_FILE)[0] + ".lock", mode='w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            index = load_index()
+            yield index
+            _save_index(index)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# --- EXTRACTION ---
+def to_records(details):
+    """Structured array (DTYPE) from an activity details response; t = seconds from the first sample"""
+    descriptors = (details or {}).get('metricDescriptors') or []
+    columns = {d.get('key'): d.get('metricsIndex') for d in descriptors}
+    samples = (details or {}).get('activityDetailMetrics') or []
+    ts_index = columns.get('directTimestamp')
+    records = np.zeros(len(samples), dtype=DTYPE)
+    if not samples or ts_index is None:
+        return records[:0]
+
+    def column(index):
+        values = []
+        for sample in samples:
+            metrics = sample.get('metrics') or []
+            value = metrics[index] if index is not None and index < len(metrics) else None
+            values.append(np.nan if value is None else value)
+        return np.asarray(values, dtype='<f8')
+
+    ts = column(ts_index)
+    keep = ~np.isnan(ts)
+    if not keep.any():
+        return records[:0]
+    records = records[keep]
+    records["t"] = ((ts[keep] - ts[keep][0]) / 1000).astype('<u4')
+    for field, key in METRICS.items():
+        records[field] = column(columns.get(key))[keep]
+    return records
+
+
+# --- STORAGE ---
+def append(activity_id, records, start="", name=""):
+    """
+    Store one activity's records and point the index at them. A re-ingest is
+    written over the activity's old slot when it fits, otherwise appended.
+    """
+    with _locked_index() as index:
+        entry = index.get(str(activity_id))
+        slot = entry.get("slot", entry["length"]) if entry else 0
+        if entry and len(records) <= slot:
+            offset = entry["offset"]
+            with open(STREAMS_FILE, mode='r+b') as f:
+                f.seek(offset * DTYPE.itemsize)
+                f.write(records.tobytes())
+        else:
+            with open(STREAMS_FILE, mode='ab') as f:
+                offset = f.tell() // DTYPE.itemsize
+                f.write(records.tobytes())
+            slot = len(records)
+        index[str(activity_id)] = {"offset": offset, "length": len(records), "slot": slot,
+                                   "start": start or (entry or {}).get("start", ""),
+                                   "name": name or (entry or {}).get("name", "")}
+
+
+def _mapped():
+    if not os.path.isfile(STREAMS_FILE) or os.path.getsize(STREAMS_FILE) < DTYPE.itemsize:
+        return None
+    return np.memmap(STREAMS_FILE, dtype=DTYPE, mode='r')
+
+
+def read(activity_id, index=None):
+    """Memory-mapped records of one activity, or None if it has no stream"""
+    entry = (index or load_index()).get(str(activity_id))
+    data = _mapped()
+    if entry is None or data is None:
+        return None
+    return data[entry["offset"]:entry["offset"] + entry["length"]]
+
+
+def read_many(activity_ids=None, start=None, end=None):
+    """{activity id: records} for the given ids, or every activity starting within [start, end]"""
+    index = load_index()
+    data = _mapped()
+    if data is None:
+        return {}
+    if activity_ids is None:
+        activity_ids = [
+            a for a, e in index.items()
+            if (not start or e["start"][:10] >= start) and (not end or e["start"][:10] <= end)
+        ]
+    return {
+        str(a): data[index[str(a)]["offset"]:index[str(a)]["offset"] + index[str(a)]["length"]]
+        for a in activity_ids if str(a) in index
+    }
+
+
+# --- INGESTION ---
+def fetch_details(api, act, limiter=None):
+    """Activity details response, from the archive when it was fetched before"""
+    activity_id, day = act.get('activityId'), str(act.get('startTimeLocal') or '')[:10]
+    if raw_archive.has(DETAILS_ENDPOINT, day, activity_id):
+        return raw_archive.get(DETAILS_ENDPOINT, day, activity_id)
+    rate_limit.acquire("garmin", limiter)
+    data = api.get_activity_details(activity_id, maxchart=MAX_SAMPLES)
+    try:
+        raw_archive.put(DETAILS_ENDPOINT, day, data, item=activity_id)
+    except Exception as e:
+        print(f"   Warning: Could not archive details for {activity_id}: {e}")
+    return data
+
+
+def ingest(api, activities, limiter=None, workers=None):
+    """Fetch streams for activities not yet stored (concurrently), append them in order"""
+    index = load_index()
+    todo = [a for a in activities if a.get('activityId') and str(a['activityId']) not in index]
+    if not todo:
+        return 0
+    stored = 0
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as pool:
+        futures = [(act, pool.submit(fetch_details, api, act, limiter)) for act in todo]
+        for act, future in futures:
+            try:
+                records = to_records(future.result())
+            except Exception as e:
+                print(f"   Stream fetch error for {act.get('activityId')}: {e}")
+                continue
+            if len(records):
+                append(act['activityId'], records, act.get('startTimeLocal', ''), act.get('activityName', ''))
+                stored += 1
+    return stored
+
+
+def replay():
+    """Rebuild the streams file and index from archived detail responses"""
+    with _locked_index() as index:
+        index.clear()
+        if os.path.isfile(STREAMS_FILE):
+            os.remove(STREAMS_FILE)
+    stored = 0
+    for day, activity_id, details in raw_archive.iter_items(DETAILS_ENDPOINT):
+        records = to_records(details)
+        if len(records):
+            append(activity_id, records, day)
+            stored += 1
+    return stored
+
+
+def _login():
+    import garth
+    from garminconnect import Garmin
+    garth.resume(TOKEN_DIR)
+    api = Garmin("dummy", "dummy")
+    api.garth = garth.client
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store per-second streams of Garmin runs")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD (default 30 days ago)")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD (default today)")
+    parser.add_argument("--replay", action="store_true", help="rebuild from raw_archive without calling Garmin")
+    args = parser.parse_args()
+
+    if args.replay:
+        print(f"Rebuilt {replay()} activity streams into {STREAMS_FILE}")
+        return
+
+    end = date.fromisoformat(args.end) if args.end else date.today()
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=30)
+    try:
+        api = _login()
+    except Exception as e:
+        print(f"Login failed: {e}")
+        return
+    activities = api.get_activities_by_date(start.isoformat(), end.isoformat(), "running") or []
+    print(f"{len(activities)} runs from {start} to {end}")
+    print(f"Stored {ingest(api, activities)} new activity streams")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import fitness_store
+
+# Athlete registry + scheduler, so one Pi can sync several people.
+#
+#   athletes.json
+#   {"athletes": [
+#       {"name": "alice", "save_path": "/home/pi/GDrive/Team/alice",
+#        "hevy_api_key": "...", "garmin_token_dir": ".garth_alice"},
+#       {"name": "bob", "save_path": "/home/pi/GDrive/Team/bob", "jobs": ["garmin_health"]}
+#   ]}
+#
+# Every sync is the normal script run with the athlete's settings in its
+# environment (SAVE_PATH, HEVY_API_KEY, GARMIN_TOKEN_DIR, and LOCAL_DATA_DIR =
+# data/athletes/<name> for the local stores and state). Athletes run
+# concurrently; each athlete's Garmin jobs run one after another (they share a
+# token dir) alongside its Hevy job. All processes draw from one token bucket
+# per service (rate_limit.for_service), so adding athletes lengthens the sync
+# window only as far as the shared API budget requires.
+#
+#     python3 athletes.py                     # list the registry
+#     python3 athletes.py login alice         # Garmin login into alice's token dir
+#     python3 athletes.py run                 # hourly sync for everyone (cron)
+#     python3 athletes.py run --athlete alice --jobs hevy_workouts
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+ATHLETES_FILE = os.getenv("ATHLETES_FILE", os.path.join(PROJECT_DIR, "athletes.json"))
+ATHLETE_WORKERS = int(os.getenv("ATHLETE_WORKERS", "8"))
+JOB_TIMEOUT = int(os.getenv("ATHLETE_JOB_TIMEOUT", "1800"))
+# Shared per-service buckets live here (one file per service)
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR", os.path.join(fitness_store.LOCAL_DATA_DIR, "rate_limit"))
+# -------------------------------------
+
+JOBS = {
+    "garmin_health": ("garmin", "daily_garmin_health.py"),
+    "garmin_runs": ("garmin", "daily_garmin_runs.py"),
+    "hevy_workouts": ("hevy", "daily_hevy_workouts.py"),
+}
+
+# Local stores that must not be shared between athletes (env var -> name inside LOCAL_DATA_DIR)
+LOCAL_STORES = {
+    "FITNESS_DB": "fitness.db",
+    "RAW_ARCHIVE_DIR": "raw",
+    "GARMIN_DAILY_MMAP": "garmin_daily.dat",
+    "HEVY_DATASET_DIR": "hevy_sets",
+    "INTRADAY_DIR": "intraday",
+    "ACTIVITY_STREAMS_FILE": "activity_streams.dat",
+}
+
+_print_lock = threading.Lock()
+
+
+def load():
+    """Registry entries, or [] when there is no athletes.json (single-user setup)"""
+    try:
+        with open(ATHLETES_FILE, mode='r', encoding='utf-8') as f:
+            athletes = json.load(f).get("athletes", [])
+    except OSError:
+        return []
+    names = [a.get("name") for a in athletes]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError(f"{ATHLETES_FILE}: every athlete needs a unique 'name'")
+    return athletes
+
+
+def env_for(athlete):
+    """Process environment for one athlete's syncs"""
+    env = dict(os.environ)
+    name = athlete["name"]
+    env["ATHLETE"] = name
+    env["SAVE_PATH"] = athlete.get("save_path") or os.path.join(os.getenv("SAVE_PATH", "."), name)
+    env["GARMIN_TOKEN_DIR"] = athlete.get("garmin_token_dir") or f".garth_{name}"
+    env["HEVY_API_KEY"] = athlete.get("hevy_api_key", "")
+    data_dir = athlete.get("local_data_dir") or os.path.join(fitness_store.LOCAL_DATA_DIR, "athletes", name)
+    env["LOCAL_DATA_DIR"] = data_dir
+    # Set explicitly: the scripts' load_dotenv() would otherwise fill these in
+    # from the shared .env and point every athlete at the same store
+    for var, default in LOCAL_STORES.items():
+        env[var] = os.path.join(data_dir, default)
+    env["RATE_LIMIT_DIR"] = RATE_LIMIT_DIR
+    # Anything else the athlete needs (e.g. GARMIN_DEEP_FETCH)
+    env.update({k: str(v) for k, v in athlete.get("env", {}).items()})
+    return env
+
+
+def jobs_for(athlete, only=None):
+    jobs = [j for j in athlete.get("jobs", list(JOBS)) if j in JOBS and (not only or j in only)]
+    if not athlete.get("hevy_api_key"):
+        jobs = [j for j in jobs if JOBS[j][0] != "hevy"]
+    return jobs
+
+
+def run_job(athlete, job):
+    """Run one sync script for one athlete; its output is printed as a block when it ends"""
+    script = JOBS[job][1]
+    try:
+        result = subprocess.run(
+            [sys.executable, script], cwd=PROJECT_DIR, env=env_for(athlete),
+            capture_output=True, text=True, timeout=JOB_TIMEOUT,
+        )
+        output, ok = result.stdout + result.stderr, result.returncode == 0
+    except subprocess.TimeoutExpired:
+        output, ok = f"Timed out after {JOB_TIMEOUT}s\n", False
+    with _print_lock:
+        print(f"=== [{athlete['name']}] {job} {'OK' if ok else 'FAILED'} ===")
+        print(output.rstrip())
+    return ok
+
+
+def _lane(athlete, jobs):
+    return [(job, run_job(athlete, job)) for job in jobs]
+
+
+def run_all(athletes, only=None):
+    """
+    One lane per athlete and service: a lane runs its jobs in order, lanes run
+    concurrently. Returns {(athlete, job): ok}.
+    """
+    lanes = []
+    for athlete in athletes:
+        jobs = jobs_for(athlete, only)
+        for service in ("garmin", "hevy"):
+            lane = [j for j in jobs if JOBS[j][0] == service]
+            if lane:
+                lanes.append((athlete, lane))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, ATHLETE_WORKERS)) as pool:
+        futures = [(athlete, pool.submit(_lane, athlete, lane)) for athlete, lane in lanes]
+        for athlete, future in futures:
+            for job, ok in future.result():
+                results[(athlete["name"], job)] = ok
+    return results
+
+
+def login(athlete):
+    """Interactive Garmin login saving tokens into the athlete's token dir"""
+    env = env_for(athlete)
+    # Don't fall back to the main user's credentials from .env
+    env["GARMIN_EMAIL"] = athlete.get("garmin_email", "")
+    env["GARMIN_PASSWORD"] = ""
+    subprocess.run([sys.executable, "setup_garmin_login.py"], cwd=PROJECT_DIR, env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-athlete registry and sync scheduler")
+    sub = parser.add_subparsers(dest="command")
+    run_parser = sub.add_parser("run", help="run the syncs for all (or some) athletes")
+    run_parser.add_argument("--athlete", action="append", help="only this athlete (repeatable)")
+    run_parser.add_argument("--jobs", help=f"comma-separated subset of {', '.join(JOBS)}")
+    login_parser = sub.add_parser("login", help="Garmin login for one athlete")
+    login_parser.add_argument("name")
+    args = parser.parse_args()
+
+    athletes = load()
+    if not athletes:
+        print(f"No athletes registered ({ATHLETES_FILE}); the scripts run single-user from .env.")
+        return
+
+    if args.command == "login":
+        match = [a for a in athletes if a["name"] == args.name]
+        if not match:
+            print(f"Unknown athlete: {args.name}")
+            return
+        login(match[0])
+    elif args.command == "run":
+        if args.athlete:
+            athletes = [a for a in athletes if a["name"] in args.athlete]
+        only = set(args.jobs.split(",")) if args.jobs else None
+        print(f"--- SYNCING {len(athletes)} ATHLETES ({ATHLETE_WORKERS} lanes at a time) ---")
+        results = run_all(athletes, only)
+        failed = [f"{name}/{job}" for (name, job), ok in results.items() if not ok]
+        print(f"--- DONE: {len(results) - len(failed)} ok, {len(failed)} failed {' '.join(failed)} ---")
+    else:
+        for athlete in athletes:
+            token_dir = env_for(athlete)["GARMIN_TOKEN_DIR"]
+            logged_in = os.path.isdir(os.path.join(PROJECT_DIR, token_dir))
+            print(f"{athlete['name']:16} jobs: {', '.join(jobs_for(athlete))}  "
+                  f"garmin tokens: {'yes' if logged_in else 'no'}  data: {env_for(athlete)['SAVE_PATH']}")
+
+
+if __name__ == "__main__":
+    main()
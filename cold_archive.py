@@ -0,0 +1,213 @@
+import os
+import csv
+import sys
+from datetime import date, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+import migrate_data
+import raw_archive
+
+# Cold tier for the append-only history CSVs. Each closed year is sealed into a
+# zstd-compressed Parquet file next to the CSV and removed from the hot file:
+#
+#   <SAVE_PATH>/archive/hevy_stats_2024.parquet
+#   <SAVE_PATH>/archive/garmin_history_2024.parquet
+#   <SAVE_PATH>/archive/garmin_runs_2024.parquet
+#
+# Rebuilds of the local stores read archived years first, then the hot CSV
+# (hot rows win on the same key). The dashboard's CSV fallback only opens the
+# archive files for years the selected range reaches into.
+#
+#     python3 cold_archive.py            # seal every closed year (and sweep raw_archive)
+#     python3 cold_archive.py --check    # report what would be sealed
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+SAVE_PATH = os.getenv("SAVE_PATH")
+# Days after New Year before the previous year is sealed, so late syncs and
+# edits to December workouts still land in the hot file
+GRACE_DAYS = int(os.getenv("ARCHIVE_GRACE_DAYS", "30"))
+# -------------------------------------
+
+ARCHIVE_DIR = "archive"
+
+# CSV file -> fitness_store table describing its columns
+FILES = {
+    "hevy_stats.csv": "hevy_sets",
+    "garmin_history.csv": "garmin_daily",
+    "garmin_runs.csv": "garmin_runs",
+}
+
+_ARROW_TYPES = {"TEXT": pa.string(), "REAL": pa.float64(), "INTEGER": pa.int64()}
+
+
+def key_headers(table):
+    spec = fitness_store.TABLES[table]
+    return [header for header, sql, _ in spec["columns"] if sql in spec["key"]]
+
+
+def _schema(table):
+    return pa.schema([
+        (header, pa.date32() if sql == "date" else _ARROW_TYPES[sql_type])
+        for header, sql, sql_type in fitness_store.TABLES[table]["columns"]
+    ])
+
+
+def _year_path(csv_path, year):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(csv_path), ARCHIVE_DIR, f"{stem}_{year}.parquet")
+
+
+def archived_years(csv_path):
+    """Years sealed for a CSV (given by its path on the mount), oldest first"""
+    prefix = os.path.splitext(os.path.basename(csv_path))[0] + "_"
+    folder = os.path.join(os.path.dirname(csv_path), ARCHIVE_DIR)
+    folders = [folder]
+    if staging_cache.enabled():
+        folders.append(staging_cache.local_path(folder))
+
+    years = set()
+    for path in folders:
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            year = name[len(prefix):-len(".parquet")]
+            if name.startswith(prefix) and name.endswith(".parquet") and year.isdigit():
+                years.add(int(year))
+    return sorted(years)
+
+
+def _read_year(csv_path, year):
+    return pq.read_table(staging_cache.read_path(_year_path(csv_path, year)))
+
+
+def _to_csv_rows(table, arrow_table):
+    columns = fitness_store.TABLES[table]["columns"]
+    data = [arrow_table.column(header).to_pylist() for header, _, _ in columns]
+    for values in zip(*data):
+        yield [
+            migrate_data._format_value(v.isoformat() if sql == "date" and v else v, sql, sql_type)
+            for v, (_, sql, sql_type) in zip(values, columns)
+        ]
+
+
+def iter_rows(csv_path, table):
+    """CSV-ordered string rows from every archived year of csv_path"""
+    for year in archived_years(csv_path):
+        yield from _to_csv_rows(table, _read_year(csv_path, year))
+
+
+def read_frame(csv_path, table, start=None, end=None):
+    """
+    Archived rows as a CSV-shaped DataFrame for the years overlapping the
+    inclusive ISO window. None when the window does not reach the archive.
+    """
+    first = int(str(start)[:4]) if start else None
+    last = int(str(end)[:4]) if end else None
+    years = [y for y in archived_years(csv_path)
+             if (first is None or y >= first) and (last is None or y <= last)]
+    if not years:
+        return None
+
+    frame = pa.concat_tables([_read_year(csv_path, y) for y in years]).to_pandas(date_as_object=False)
+    frame['Date'] = frame['Date'].astype('datetime64[ns]')
+    return frame
+
+
+def _write_year(csv_path, table, year, rows):
+    columns = fitness_store.TABLES[table]["columns"]
+    typed = [fitness_store._clean_row(table, row) for row in rows]
+    arrays = {}
+    for i, (header, sql, _) in enumerate(columns):
+        values = [r[i] for r in typed]
+        arrays[header] = [date.fromisoformat(v) for v in values] if sql == "date" else values
+    arrow_table = pa.Table.from_pydict(arrays, schema=_schema(table))
+
+    path = staging_cache.stage(_year_path(csv_path, year))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(arrow_table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    staging_cache.mark_dirty(path)
+
+
+def closed_before(today=None):
+    """First year that is still hot: years below it are sealed"""
+    today = today or date.today()
+    return (today - timedelta(days=GRACE_DAYS)).year
+
+
+def seal_file(name, table, folder, check_only=False):
+    """Move the closed years of one CSV into the archive. Returns the years sealed."""
+    remote_path = os.path.join(folder, name)
+    if not os.path.isfile(staging_cache.read_path(remote_path)):
+        print(f"   {name}: not found, skipping")
+        return []
+
+    csv_path = staging_cache.stage(remote_path)
+    headers, rows = migrate_data.canonical_rows(table, csv_path)
+    hot_year = closed_before()
+
+    by_year = {}
+    hot = []
+    for row in rows:
+        year = int(row[0][:4])
+        if year < hot_year:
+            by_year.setdefault(year, []).append(row)
+        else:
+            hot.append(row)
+
+    if not by_year:
+        print(f"   {name}: nothing to seal ({len(hot)} hot rows)")
+        return []
+    for year in sorted(by_year):
+        print(f"   {name}: {year} -> {len(by_year[year])} rows")
+    if check_only:
+        return []
+
+    key_positions = [headers.index(h) for h in key_headers(table)]
+    existing_years = set(archived_years(remote_path))
+    for year, year_rows in sorted(by_year.items()):
+        if year in existing_years:
+            # Re-sealing (e.g. after a full history re-import): hot rows win
+            merged = {}
+            for row in list(_to_csv_rows(table, _read_year(remote_path, year))) + year_rows:
+                merged[tuple(row[i] for i in key_positions)] = row
+            year_rows = list(merged.values())
+        _write_year(remote_path, table, year, year_rows)
+
+    # Only trim the hot file once every archive file is written
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(hot)
+    os.replace(tmp_path, csv_path)
+    staging_cache.mark_dirty(csv_path)
+    return sorted(by_year)
+
+
+def main():
+    folder = SAVE_PATH or "."
+    check_only = "--check" in sys.argv
+    print(f"--- SEALING CLOSED YEARS (before {closed_before()}) ---")
+    print(f"Folder: {folder}")
+    for name, table in FILES.items():
+        try:
+            seal_file(name, table, folder, check_only)
+        except Exception as e:
+            print(f"   {name}: FAILED ({e}) - file left untouched")
+    if not check_only:
+        try:
+            print(f"   raw archive: removed {raw_archive.gc()} unreferenced objects")
+        except Exception as e:
+            print(f"   Warning: Could not sweep the raw archive: {e}")
+    print("--- COMPLETE ---")
+
+
+if __name__ == "__main__":
+    main()
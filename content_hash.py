@@ -0,0 +1,58 @@
+import os
+import json
+import hashlib
+from dotenv import load_dotenv
+import fitness_store
+
+# Change detection for the hourly jobs. Each job remembers a hash of the
+# normalized payload it last persisted per key (a day, a workout id, ...) and
+# skips the write entirely when the new payload hashes the same, so unchanged
+# pulls leave the CSVs (and their mtimes) on the Drive mount alone.
+#
+#   data/content_hash/<job>.json   {key: sha256}
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+HASH_DIR = os.path.join(fitness_store.LOCAL_DATA_DIR, "content_hash")
+# -------------------------------------
+
+
+def digest(payload):
+    """Stable hash of any JSON-serialisable payload (key order doesn't matter)"""
+    data = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _path(job):
+    return os.path.join(HASH_DIR, f"{job}.json")
+
+
+def load(job):
+    try:
+        with open(_path(job), mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def changed(state, key, payload):
+    return state.get(str(key)) != digest(payload)
+
+
+def remember(state, key, payload):
+    """Call only once the payload has actually been persisted"""
+    state[str(key)] = digest(payload)
+    return state
+
+
+def save(job, state, keys=None):
+    """Persist the hashes, keeping only `keys` when given (drops keys that left the window)"""
+    if keys is not None:
+        keys = {str(k) for k in keys}
+        state = {k: v for k, v in state.items() if k in keys}
+    os.makedirs(HASH_DIR, exist_ok=True)
+    tmp_path = _path(job) + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, _path(job))
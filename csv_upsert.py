@@ -0,0 +1,151 @@
+import os
+import io
+import csv
+import json
+from fitness_store import normalize_date
+
+# Tail-only upserts for date-keyed CSVs (one row per day, sorted by date).
+# A sidecar "<file>.idx" maps each date to the byte offset of its row, so the
+# hourly job can replace today's row or append a new day without reading or
+# rewriting the rest of the file. Anything out of order falls back to a full
+# read-sort-rewrite, which also rebuilds the index. Batch jobs (history import,
+# gap backfill) use upsert_rows() instead: one merge and one write for all days.
+
+
+def _index_path(csv_file):
+    return csv_file + ".idx"
+
+
+def _encode_row(row):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(row)  # csv default line terminator is \r\n
+    return buf.getvalue().encode('utf-8')
+
+
+def _first_field(line):
+    field = line.split(b',', 1)[0].strip().strip(b'"')
+    return normalize_date(field.decode('utf-8', errors='replace'))
+
+
+def build_index(csv_file):
+    """Scan the CSV once and record the byte offset of every row's date"""
+    offsets = {}
+    with open(csv_file, mode='rb') as f:
+        header = f.readline()
+        pos = len(header)
+        for line in f:
+            if line.strip():
+                key = _first_field(line)
+                if key:
+                    offsets[key] = pos
+            pos += len(line)
+    index = {"size": pos, "offsets": offsets}
+    save_index(csv_file, index)
+    return index
+
+
+def save_index(csv_file, index):
+    tmp_path = _index_path(csv_file) + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _index_path(csv_file))
+
+
+def load_index(csv_file):
+    """Load the sidecar index, rebuilding it if the CSV was changed behind our back"""
+    size = os.path.getsize(csv_file)
+    try:
+        with open(_index_path(csv_file), mode='r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("size") == size:
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_index(csv_file)
+
+
+def _rewrite(csv_file, headers, key, row):
+    """Full read-sort-rewrite fallback for out-of-order keys"""
+    with open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+        all_data = list(csv.reader(f))
+    rows = [r for r in all_data[1:] if r and normalize_date(r[0]) != key]
+    rows.append(row)
+    rows.sort(key=lambda x: normalize_date(x[0]) or '')
+
+    with open(csv_file, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    build_index(csv_file)
+    return "rewritten"
+
+
+def upsert_row(csv_file, headers, key, row):
+    """
+    Insert or replace the row for `key` (ISO date).
+    Returns "created", "replaced", "appended" or "rewritten".
+    """
+    if not os.path.isfile(csv_file) or os.path.getsize(csv_file) == 0:
+        with open(csv_file, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerow(row)
+        build_index(csv_file)
+        return "created"
+
+    index = load_index(csv_file)
+    offsets = index["offsets"]
+    last_key = max(offsets, key=offsets.get) if offsets else None
+    data = _encode_row(row)
+
+    if key == last_key:
+        # Today is already the last row: cut it off and write the new version
+        with open(csv_file, mode='r+b') as f:
+            f.truncate(offsets[key])
+            f.seek(offsets[key])
+            f.write(data)
+        status = "replaced"
+    elif key not in offsets and (last_key is None or key > last_key):
+        with open(csv_file, mode='r+b') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            f.seek(end - 1)
+            if f.read(1) not in (b'\n', b'\r'):
+                f.write(b'\r\n')
+                end += 2
+            f.write(data)
+        offsets[key] = end
+        status = "appended"
+    else:
+        return _rewrite(csv_file, headers, key, row)
+
+    index["size"] = os.path.getsize(csv_file)
+    save_index(csv_file, index)
+    return status
+
+
+def upsert_rows(csv_file, headers, rows_by_key):
+    """
+    Insert or replace many days at once ({ISO date: row}) with a single
+    read-merge-sort-write. Returns the number of days written.
+    """
+    if not rows_by_key:
+        return 0
+    merged = {}
+    if os.path.isfile(csv_file) and os.path.getsize(csv_file) > 0:
+        with open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            for row in reader:
+                if row:
+                    merged[normalize_date(row[0]) or row[0]] = row
+    merged.update(rows_by_key)
+
+    tmp_path = csv_file + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(merged[key] for key in sorted(merged))
+    os.replace(tmp_path, csv_file)
+    build_index(csv_file)
+    return len(rows_by_key)
@@ -1,9 +1,25 @@
 import garth
 from garminconnect import Garmin
-from datetime import date
-import csv
+from datetime import date, timedelta
 import os
 from dotenv import load_dotenv
+import fitness_store
+import csv_upsert
+import staging_cache
+import garmin_metrics
+import endpoint_planner
+import refresh_policy
+import content_hash
+
+try:
+    import garmin_daily_mmap  # Optional: needs numpy
+except ImportError:
+    garmin_daily_mmap = None
+
+try:
+    import garmin_intraday  # Optional: needs numpy
+except ImportError:
+    garmin_intraday = None
 
 import os
 import sys
@@ -26,9 +42,13 @@ if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
 
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
@@ -46,16 +66,51 @@ else:
     print("WARNING: SAVE_PATH not set in .env. Using current folder.")
     CSV_FILE = "garmin_stats.csv"
 
-TOKEN_DIR = ".garth"
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+# Also pull intraday HR / stress / body battery / respiration (garmin_intraday.py).
+# Off by default: it costs extra calls on every hourly run
+INTRADAY = os.getenv("GARMIN_INTRADAY", "False").lower() == "true"
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(CSV_FILE)
 # -------------------------------------
 
-def get_safe(data, *keys):
+def _on_file(day):
+    return os.path.isfile(CSV_FILE) and day in csv_upsert.load_index(CSV_FILE)["offsets"]
+
+def save_row(day, row, hashes):
+    """Upsert one day's row into the CSV and the local stores. False if the CSV write failed."""
+    # Same row as the last one persisted for this day: leave the files alone
+    if not content_hash.changed(hashes, day, row) and _on_file(day):
+        print(f"No change for {day} since the last run; nothing written.")
+        return True
+
+    # Tail-only upsert: replaces today's row or appends a new day without
+    # rewriting the rest of the history (see csv_upsert.py)
+    try:
+        result = csv_upsert.upsert_row(CSV_FILE, garmin_metrics.HEADERS, day, row)
+    except Exception as e:
+        print(f"CRITICAL: Failed to update existing CSV: {e}")
+        print("Aborting to prevent data loss. Please check the file.")
+        return False
+    staging_cache.mark_dirty(CSV_FILE)
+
+    print(f"SUCCESS! Saved data for {day} to {CSV_FILE} ({result})")
+
+    # Mirror into the unified store (CSV stays the source of truth)
     try:
-        for key in keys:
-            data = data[key]
-        return data
-    except (KeyError, TypeError, AttributeError):
-        return None
+        fitness_store.upsert_rows("garmin_daily", [row])
+    except Exception as e:
+        print(f"Warning: Could not update fitness store: {e}")
+
+    # The day's record in the memory-mapped daily store is overwritten in place
+    if garmin_daily_mmap:
+        try:
+            garmin_daily_mmap.upsert_rows([row])
+        except Exception as e:
+            print(f"Warning: Could not update daily mmap store: {e}")
+    content_hash.remember(hashes, day, row)
+    return True
 
 def main():
     try:
@@ -74,228 +129,65 @@ def main():
         print(f"2. Pulling data for {today}...")
 
         # --- DATA PULLING ---
-        # 1. Core Biometrics
-        try:
-            user_stats = api.get_user_summary(today)
-            rhr = get_safe(user_stats, 'restingHeartRate')
-            min_hr = get_safe(user_stats, 'minHeartRate')
-            max_hr = get_safe(user_stats, 'maxHeartRate')
-            stress_avg = get_safe(user_stats, 'averageStressLevel')
-            steps = get_safe(user_stats, 'totalSteps')
-            vo2_max = get_safe(user_stats, 'vo2Max')
-            spo2_avg = get_safe(user_stats, 'averageSpO2')
-            respiration_avg = get_safe(user_stats, 'averageRespirationValue')
-            cals_total = get_safe(user_stats, 'totalKilocalories')
-            cals_active = get_safe(user_stats, 'activeKilocalories')
-            cals_goal = get_safe(user_stats, 'dailyStepGoal')
-        except:
-            rhr, min_hr, max_hr, stress_avg, steps, vo2_max, spo2_avg, respiration_avg, cals_total, cals_active, cals_goal = [None] * 11
-
-        # 1b. Try dedicated endpoints for missing metrics
-        # SpO2
-        if spo2_avg is None:
-            try:
-                spo2_data = api.get_spo2_data(today)
-                if spo2_data:
-                    spo2_avg = get_safe(spo2_data, 'averageSpO2')
-                    if spo2_avg is None:
-                        spo2_avg = get_safe(spo2_data, 'latestSpO2')
-                    if spo2_avg is None:
-                        spo2_avg = get_safe(spo2_data, 'latestSpO2Value')
-            except:
-                pass
-
-        # Respiration
-        if respiration_avg is None:
-            try:
-                resp_data = api.get_respiration_data(today)
-                if resp_data:
-                    respiration_avg = get_safe(resp_data, 'avgWakingRespirationValue')
-                    if respiration_avg is None:
-                        respiration_avg = get_safe(resp_data, 'avgSleepRespirationValue')
-            except:
-                pass
-
-        # VO2 Max - try fitness stats
-        if vo2_max is None:
-            try:
-                if hasattr(api, 'get_max_metrics'):
-                    max_metrics = api.get_max_metrics(today)
-                    if max_metrics:
-                        # Look for VO2 max in various locations
-                        for metric in max_metrics if isinstance(max_metrics, list) else [max_metrics]:
-                            if get_safe(metric, 'generic', 'vo2MaxPreciseValue'):
-                                vo2_max = get_safe(metric, 'generic', 'vo2MaxPreciseValue')
-                                break
-                            if get_safe(metric, 'vo2MaxPreciseValue'):
-                                vo2_max = get_safe(metric, 'vo2MaxPreciseValue')
-                                break
-            except:
-                pass
-
-        # 2. Sleep
-        try:
-            sleep_data = api.get_sleep_data(today)
-            sleep_total = get_safe(sleep_data, 'dailySleepDTO', 'sleepTimeSeconds')
-            sleep_deep = get_safe(sleep_data, 'dailySleepDTO', 'deepSleepSeconds')
-            sleep_rem = get_safe(sleep_data, 'dailySleepDTO', 'remSleepSeconds')
-            sleep_score = get_safe(sleep_data, 'dailySleepDTO', 'sleepScores', 'overall', 'value')
-            
-            if sleep_total: sleep_total = round(sleep_total / 3600, 2)
-            if sleep_deep: sleep_deep = round(sleep_deep / 3600, 2)
-            if sleep_rem: sleep_rem = round(sleep_rem / 3600, 2)
-        except:
-            sleep_total, sleep_deep, sleep_rem, sleep_score = None, None, None, None
-
-        # 3. Training Status
-        training_status = None
-        t_status = None
+        # Raw responses are archived (raw_archive.py) and parsed by garmin_metrics.
+        # Endpoints this account never gets data from are skipped (endpoint_planner.py),
+        # and metrics already final for today are reused from the archive (refresh_policy.py).
+        account = getattr(api, 'display_name', None)
+        plan = endpoint_planner.load(account)
+        dead = endpoint_planner.skipped(plan, today)
+        if dead:
+            print(f"   Skipping endpoints with no data for this account: {', '.join(sorted(dead))}")
+        policy = refresh_policy.load()
+        final = refresh_policy.final_endpoints(policy, today)
+        if final:
+            print(f"   Already final today, not re-polled: {', '.join(sorted(final))}")
+
+        raw = garmin_metrics.fetch_day(api, today, skip=dead | final)
         try:
-            if hasattr(api, 'get_training_status'):
-                t_status = api.get_training_status(today)
-                # Try multiple paths for training status
-                training_status = get_safe(t_status, 'mostRecentTerminatedTrainingStatus', 'status')
-                if training_status is None:
-                    training_status = get_safe(t_status, 'trainingStatusData', 'status')
-                if training_status is None:
-                    training_status = get_safe(t_status, 'status')
-                if training_status is None and isinstance(t_status, list) and len(t_status) > 0:
-                    training_status = get_safe(t_status[0], 'status')
-
-                # Also try to get VO2 max from training status if still missing
-                if vo2_max is None and t_status:
-                    vo2_max = get_safe(t_status, 'vo2MaxValue')
-                    if vo2_max is None:
-                        vo2_max = get_safe(t_status, 'mostRecentTerminatedTrainingStatus', 'vo2MaxValue')
-        except:
-            pass
-
-        # 4. Body Comp
-        weight, muscle_mass, fat_pct, water_pct = None, None, None, None
-        try:
-            body_comp = api.get_body_composition(today)
-            if body_comp and 'totalAverage' in body_comp:
-                avg = body_comp['totalAverage']
-                w_g = avg.get('weight')
-                if w_g: weight = round(w_g / 453.592, 1)
-                m_g = avg.get('muscleMass')
-                if m_g: muscle_mass = round(m_g / 453.592, 1)
-                fat_pct = avg.get('bodyFat')
-                water_pct = avg.get('bodyWater')
-        except:
-            pass
-
-        # 5. HRV
-        hrv_status, hrv_avg = None, None
-        try:
-            if hasattr(api, 'get_hrv_data'):
-                h = api.get_hrv_data(today)
-            else:
-                h = api.connectapi(f"/hrv-service/hrv/daily/{today}")
-
-            hrv_status = get_safe(h, 'hrvSummary', 'status')
-
-            # Try multiple HRV value sources in order of preference
-            hrv_avg = get_safe(h, 'hrvSummary', 'weeklyAverage')
-            if hrv_avg is None:
-                hrv_avg = get_safe(h, 'hrvSummary', 'lastNightAvg')
-            if hrv_avg is None:
-                hrv_avg = get_safe(h, 'lastNightAvg')
-            if hrv_avg is None:
-                # Try to get from HRV values array
-                hrv_values = get_safe(h, 'hrvValues')
-                if hrv_values and len(hrv_values) > 0:
-                    # Get the most recent HRV reading
-                    hrv_avg = get_safe(hrv_values[-1], 'hrvValue')
-            if hrv_avg is None:
-                hrv_avg = get_safe(h, 'hrvValue')
+            endpoint_planner.save(account, endpoint_planner.learn(plan, today, raw))
         except Exception as e:
-            print(f"HRV fetch error: {e}")
-
-        # 6. Activities
-        activity_str = ""
-        try:
-            activities = api.get_activities_by_date(today, today)
-            if activities:
-                names = [f"{act['activityName']} ({act['activityType']['typeKey']})" for act in activities]
-                activity_str = "; ".join(names)
-        except:
-            pass
+            print(f"Warning: Could not update endpoint planner: {e}")
+        raw.update(refresh_policy.cached(today, final))
+        refresh_policy.mark_final(policy, today, raw)
 
         # --- PREPARE ROW ---
-        new_row = [
-            today, 
-            weight, muscle_mass, fat_pct, water_pct,
-            sleep_total, sleep_deep, sleep_rem, sleep_score,
-            rhr, min_hr, max_hr, stress_avg, respiration_avg, spo2_avg,
-            vo2_max, training_status, hrv_status, hrv_avg,
-            steps, cals_goal, cals_total, cals_active,
-            activity_str
-        ]
-
-        headers = [
-            "Date", 
-            "Weight (lbs)", "Muscle Mass (lbs)", "Body Fat %", "Water %",
-            "Sleep Total (hr)", "Sleep Deep (hr)", "Sleep REM (hr)", "Sleep Score",
-            "RHR", "Min HR", "Max HR", "Avg Stress", "Respiration", "SpO2",
-            "VO2 Max", "Training Status", "HRV Status", "HRV Avg",
-            "Steps", "Step Goal", "Cals Total", "Cals Active",
-            "Activities"
-        ]
+        new_row = garmin_metrics.derive_row(today, raw)
 
         # --- SMART SAVE ---
-        rows = []
         folder_path = os.path.dirname(CSV_FILE)
         if folder_path and not os.path.exists(folder_path):
             os.makedirs(folder_path)
 
-        file_exists = os.path.isfile(CSV_FILE)
-        read_failed = False
-
-        def normalize_date(date_str):
-            """Normalize date string to ISO format for comparison"""
-            if not date_str:
-                return None
-            try:
-                # Try ISO format first (YYYY-MM-DD)
-                if '-' in date_str and len(date_str) == 10:
-                    return date_str
-                # Try US format (M/D/YYYY or MM/DD/YYYY)
-                if '/' in date_str:
-                    parts = date_str.split('/')
-                    if len(parts) == 3:
-                        month, day, year = parts
-                        return f"{year}-{int(month):02d}-{int(day):02d}"
-                return date_str
-            except:
-                return date_str
+        hashes = content_hash.load("garmin_health")
+        if not save_row(today, new_row, hashes):
+            return
 
-        if file_exists:
+        if garmin_intraday and INTRADAY:
             try:
-                with open(CSV_FILE, mode='r', newline='') as f:
-                    reader = csv.reader(f)
-                    all_data = list(reader)
-                    if all_data:
-                        # Filter out rows for today's date (handles both formats)
-                        rows = [row for row in all_data[1:] if row and normalize_date(row[0]) != today]
+                counts = garmin_intraday.ingest_day(api, today, fetched=raw)
+                print(f"   Intraday samples: {', '.join(f'{s} {n}' for s, n in counts.items())}")
             except Exception as e:
-                print(f"CRITICAL: Failed to read existing CSV: {e}")
-                print("Aborting to prevent data loss. Please check the file.")
-                read_failed = True
+                print(f"Warning: Could not ingest intraday series: {e}")
+
+        # --- YESTERDAY ---
+        # One full re-poll per day picks up late syncs and late-finalizing sleep/HRV
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        if refresh_policy.needs_refresh(policy, yesterday):
+            print(f"3. Re-polling {yesterday} once for late data...")
+            y_raw = garmin_metrics.fetch_day(api, yesterday, skip=dead)
+            if save_row(yesterday, garmin_metrics.derive_row(yesterday, y_raw), hashes):
+                refresh_policy.mark_refreshed(policy, yesterday)
+            if garmin_intraday and INTRADAY:
+                try:
+                    garmin_intraday.ingest_day(api, yesterday, fetched=y_raw)
+                except Exception as e:
+                    print(f"Warning: Could not ingest intraday series: {e}")
 
-        if read_failed:
-            return
-
-        rows.append(new_row)
-        # Sort by normalized date
-        rows.sort(key=lambda x: normalize_date(x[0]) if x else '')
-
-        with open(CSV_FILE, mode='w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
-            writer.writerows(rows)
-            
-        print(f"SUCCESS! Saved data for {today} to {CSV_FILE}")
+        try:
+            refresh_policy.save(policy)
+            content_hash.save("garmin_health", hashes, keys=[today, yesterday])
+        except Exception as e:
+            print(f"Warning: Could not save refresh state: {e}")
 
     except Exception as e:
         print(f"Global Error: {e}")
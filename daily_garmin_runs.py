@@ -7,6 +7,16 @@ import sys
 import platform
 import json
 from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+import content_hash
+import activity_details
+import rate_limit
+
+try:
+    import activity_streams  # Optional: needs numpy
+except ImportError:
+    activity_streams = None
 
 # 1. Load configuration
 load_dotenv()
@@ -21,9 +31,13 @@ is_windows = platform.system() == "Windows"
 if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
@@ -32,14 +46,21 @@ elif check_mount and is_windows:
 # --- CONFIGURATION ---
 SAVE_PATH = os.getenv("SAVE_PATH")
 CSV_FILE = os.path.join(SAVE_PATH, "garmin_runs.csv") if SAVE_PATH else "garmin_runs.csv"
-TOKEN_DIR = ".garth"
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(CSV_FILE)
 # ---------------------
 
 def safe_get(data, key, default=None):
     return data.get(key, default)
 
-def main():
-    # 1. Load Existing IDs
+def signature(act):
+    """Date_Time key the CSV is deduplicated on"""
+    start_local = act.get('startTimeLocal', '')
+    return f"{start_local[:10]}_{start_local[11:]}"
+
+def load_existing_ids():
     existing_ids = set()
     folder_path = os.path.dirname(CSV_FILE)
     if folder_path and not os.path.exists(folder_path):
@@ -55,8 +76,10 @@ def main():
                         existing_ids.add(f"{row[0]}_{row[1]}")
         except:
             pass
+    return existing_ids
 
-    # 2. Login
+def main():
+    # 1. Login
     try:
         garth.resume(TOKEN_DIR)
         api = Garmin("dummy", "dummy")
@@ -65,7 +88,7 @@ def main():
         print(f"Login Error: {e}")
         return
 
-    # 3. Check Last 3 Days
+    # 2. Check Last 3 Days
     today = date.today()
     start_check = today - timedelta(days=3)
     
@@ -73,8 +96,35 @@ def main():
 
     try:
         # Note: If you want Strength stats too, change "running" to None or check your filters
+        rate_limit.acquire("garmin")
         activities = api.get_activities_by_date(start_check.isoformat(), today.isoformat(), "running")
-        
+
+        # Same activity list as the last run: the CSV is already up to date
+        hashes = content_hash.load("garmin_runs")
+        if not content_hash.changed(hashes, "recent", activities) and os.path.isfile(CSV_FILE):
+            print("No change since the last run; nothing written.")
+            return
+
+        # 3. Load Existing IDs
+        existing_ids = load_existing_ids()
+
+        # --- 4. DEEP DIVE (opt-in, GARMIN_DEEP_FETCH) ---
+        # The summary often lacks hrTimeInZone_1..4; fetch the zone breakdown
+        # for the new activities concurrently (cached per activity on disk).
+        zones = {}
+        if activities and activity_details.DEEP_FETCH:
+            fresh = [a for a in activities if signature(a) not in existing_ids]
+            zones = activity_details.fill_zones(api, fresh)
+
+        # Per-second streams (opt-in, GARMIN_STREAMS); already-stored activities are skipped
+        if activities and activity_streams and activity_streams.INGEST:
+            try:
+                stored = activity_streams.ingest(api, activities)
+                if stored:
+                    print(f"Stored streams for {stored} activities.")
+            except Exception as e:
+                print(f"Warning: Could not store activity streams: {e}")
+
         new_rows = []
         if activities:
             for act in activities:
@@ -86,19 +136,7 @@ def main():
                 if sig in existing_ids:
                     continue
 
-                # --- 4. DEEP DIVE (Daily Only) ---
-                # Some fields like hrTimeInZone or sets might be missing from the summary.
-                # We fetch the full activity details for these few new items.
                 activity_id = act.get('activityId')
-                full_details = {}
-                try:
-                    # Attempt to fetch full details if needed (warning: adds API time)
-                    # For simple runs, summary is often enough, but for zones we might need more.
-                    # We will rely on summary first, if missing and critical, you could enable:
-                    # full_details = api.get_activity_details(activity_id) 
-                    pass 
-                except:
-                    pass
 
                 # --- FIELD EXTRACTION ---
                 # Basic
@@ -138,6 +176,8 @@ def main():
                 z2 = act.get('hrTimeInZone_2')
                 z3 = act.get('hrTimeInZone_3')
                 z4 = act.get('hrTimeInZone_4')
+                if activity_id in zones:
+                    z1, z2, z3, z4 = zones[activity_id]
 
                 new_rows.append([
                     date_str, time_str, title, atype_key,
@@ -162,10 +202,22 @@ def main():
                          "hrTimeInZone_1", "hrTimeInZone_2", "hrTimeInZone_3", "hrTimeInZone_4"
                      ])
                 writer.writerows(new_rows)
+            staging_cache.mark_dirty(CSV_FILE)
             print(f"SUCCESS: Added {len(new_rows)} new activities.")
+
+            # Mirror into the unified store (CSV stays the source of truth)
+            try:
+                fitness_store.upsert_rows("garmin_runs", new_rows)
+            except Exception as e:
+                print(f"Warning: Could not update fitness store: {e}")
         else:
             print("No new activities found.")
 
+        try:
+            content_hash.save("garmin_runs", content_hash.remember(hashes, "recent", activities))
+        except Exception as e:
+            print(f"Warning: Could not save content hash: {e}")
+
     except Exception as e:
         print(f"Error: {e}")
 
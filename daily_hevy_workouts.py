@@ -1,8 +1,20 @@
-import requests
 import csv
 import os
-from datetime import datetime, timedelta
+import argparse
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv  # <--- New Import
+import fitness_store
+import signature_index
+import staging_cache
+import raw_archive
+import content_hash
+import hevy_client
+import hevy_events
+
+try:
+    import hevy_dataset  # Optional: needs pandas + pyarrow
+except ImportError:
+    hevy_dataset = None
 
 import os
 import sys
@@ -25,9 +37,13 @@ if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
 
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
@@ -51,21 +67,345 @@ else:
     # Fallback if someone forgets to set the .env
     print("WARNING: SAVE_PATH not found in .env. Using current directory.")
     CSV_FILE = "hevy_stats.csv"
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(CSV_FILE)
 # -------------------------------------
 
+HEADERS = fitness_store.csv_headers("hevy_sets")
+WORKOUT_ENDPOINT = "hevy/workout"
+# Content-hash marker for a workout whose deletion was applied (event replays are no-ops)
+DELETED = "deleted"
+
+
+def workout_rows(workout):
+    """(date, CSV rows) for one Hevy workout, or (None, []) without a start time"""
+    return fitness_store.workout_rows(workout)
+
+
+def row_key(row):
+    """(date, workout, exercise, set) - the identity a CSV row has"""
+    return (fitness_store.normalize_date(row[0]), row[1], row[2], str(row[3]))
+
+
+def archive_workout(workout, w_date_clean):
+    try:
+        raw_archive.put(WORKOUT_ENDPOINT, w_date_clean, workout, item=workout.get('id', ''))
+    except Exception as e:
+        print(f"Warning: Could not archive workout: {e}")
+
+
+def save_new_rows(new_rows, new_signatures, sig_index, skipped_count):
+    """Append rows to the CSV and mirror them into the dedup index and local stores"""
+    # Ensure headers exist if new file
+    is_new_file = not os.path.isfile(CSV_FILE)
+
+    with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if is_new_file:
+             writer.writerow(HEADERS)
+        writer.writerows(new_rows)
+    staging_cache.mark_dirty(CSV_FILE)
+    print(f"SUCCESS: Added {len(new_rows)} new sets. (Skipped {skipped_count} duplicates)")
+
+    try:
+        if sig_index:
+            signature_index.add(sig_index, new_signatures.items())
+        else:
+            signature_index.rebuild(CSV_FILE)
+    except Exception as e:
+        print(f"Warning: Could not update signature index: {e}")
+
+    # Mirror into the unified store (CSV stays the source of truth)
+    try:
+        fitness_store.upsert_rows("hevy_sets", new_rows)
+    except Exception as e:
+        print(f"Warning: Could not update fitness store: {e}")
+
+    if hevy_dataset:
+        try:
+            hevy_dataset.append_rows(new_rows)
+        except Exception as e:
+            print(f"Warning: Could not update Hevy dataset: {e}")
+
+
+def replace_workouts(stale_keys, new_rows):
+    """
+    Drop the CSV rows whose (date, workout, exercise, set) is in stale_keys - the
+    previous versions of edited or deleted workouts - append new_rows, and
+    rebuild the derived stores. Another workout with the same title on the same
+    day keeps its rows. Returns the number of rows removed.
+    """
+    kept, removed = [], 0
+    if os.path.isfile(CSV_FILE):
+        with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            for row in reader:
+                if len(row) > 3 and row_key(row) in stale_keys:
+                    removed += 1
+                elif row:
+                    kept.append(row)
+    # A set another workout already holds under the same key stays that workout's
+    on_file = {row_key(row) for row in kept if len(row) > 3}
+    added = [row for row in new_rows if row_key(row) not in on_file]
+
+    tmp_path = CSV_FILE + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(kept)
+        writer.writerows(added)
+    os.replace(tmp_path, CSV_FILE)
+    staging_cache.mark_dirty(CSV_FILE)
+    print(f"SUCCESS: Replaced edited/deleted workouts ({removed} old sets out, {len(added)} sets in).")
+
+    try:
+        signature_index.rebuild(CSV_FILE)
+    except Exception as e:
+        print(f"Warning: Could not rebuild signature index: {e}")
+    try:
+        fitness_store.rebuild_from_csv("hevy_sets")
+    except Exception as e:
+        print(f"Warning: Could not rebuild fitness store: {e}")
+    if hevy_dataset:
+        try:
+            hevy_dataset.rebuild_from_csv()
+        except Exception as e:
+            print(f"Warning: Could not rebuild Hevy dataset: {e}")
+    return removed
+
+
+def previous_keys(workout_id, workout=None, known=False):
+    """
+    Row keys the CSV holds for a workout's previous version, or None if it is
+    unknown here. Archived payloads come first (they also catch a changed date
+    or title); then the normalized store, including the copy seeded from the CSV
+    ("csv:<date>:<title>") for workouts synced before Hevy ids were kept.
+
+    The seeded copy merges every same-title workout of the day, so it is only
+    claimed for a workout id seen before (`known`), or when its (exercise, set)
+    rows are exactly the incoming workout's; a new workout with the same title
+    on the same day must not take another workout's sets.
+    """
+    keys = set()
+    for _, payload in raw_archive.find(WORKOUT_ENDPOINT, workout_id):
+        keys.update(row_key(row) for row in workout_rows(payload)[1])
+    if keys:
+        return keys
+
+    seeded_id, rows = None, []
+    if workout:
+        w_date_clean, rows = workout_rows(workout)
+        seeded_id = f"csv:{w_date_clean}:{workout.get('title', 'Unknown Workout')}"
+    stored = fitness_store.hevy_workout_set_keys([workout_id] + ([seeded_id] if seeded_id else []))
+    if stored.get(workout_id):
+        return stored[workout_id]
+    seeded = stored.get(seeded_id)
+    if seeded and (known or {key[2:] for key in seeded} == {(row[2], row[3]) for row in rows}):
+        return seeded
+    return None
+
+
+def sync_window(sig_index):
+    """Re-read the newest page and keep workouts from the last two days (HEVY_EVENT_SYNC=False)"""
+    cutoff_date = datetime.now() - timedelta(days=2)
+    print(f"Checking Hevy for workouts since {cutoff_date.date()}...")
+
+    params = {"page": 1, "pageSize": 10}
+
+    # Pooled session with timeouts and retries (hevy_client.py)
+    response = hevy_client.get("/v1/workouts", api_key=API_KEY, params=params)
+
+    if response.status_code != 200:
+        print(f"Error: {response.status_code} - {response.text}")
+        return
+
+    data = response.json()
+    workouts = data.get('workouts', [])
+
+    if not workouts:
+        print("No workouts found.")
+        return
+
+    new_rows = []
+    new_signatures = {}
+    recent_workouts = []
+    skipped_count = 0
+
+    # Workouts whose payload hashes the same as when they were last persisted
+    # are skipped outright; edited ones hash differently and are reprocessed
+    hashes = content_hash.load("hevy_workouts")
+    window_ids = []
+    unchanged_count = 0
+
+    for workout in workouts:
+        w_date_clean, rows = workout_rows(workout)
+        if not w_date_clean:
+            continue
+        if datetime.fromisoformat(workout['start_time']).replace(tzinfo=None) < cutoff_date:
+            continue
+        window_ids.append(workout.get('id', ''))
+        if not content_hash.changed(hashes, workout.get('id', ''), workout):
+            unchanged_count += 1
+            continue
+        recent_workouts.append(workout)
+        archive_workout(workout, w_date_clean)
+
+        for row in rows:
+            signature = signature_index.make_signature(*row[:4])
+
+            if signature in new_signatures or (sig_index and signature_index.contains(sig_index, signature)):
+                skipped_count += 1
+                continue
+            new_rows.append(row)
+            new_signatures[signature] = w_date_clean
+
+    # SAVE ONLY NEW ROWS
+    if new_rows:
+        save_new_rows(new_rows, new_signatures, sig_index, skipped_count)
+    else:
+        print(f"No *new* sets found. (Skipped {skipped_count} duplicates, {unchanged_count} unchanged workouts)")
+
+    if not recent_workouts:
+        return
+
+    # Normalized copy keyed by Hevy ids; rewriting whole workouts also picks up edits
+    try:
+        fitness_store.upsert_hevy_workouts(recent_workouts)
+    except Exception as e:
+        print(f"Warning: Could not update normalized workouts: {e}")
+        return
+
+    try:
+        for workout in recent_workouts:
+            content_hash.remember(hashes, workout.get('id', ''), workout)
+        content_hash.save("hevy_workouts", hashes, keys=window_ids)
+    except Exception as e:
+        print(f"Warning: Could not save content hashes: {e}")
+
+
+def sync_events(sig_index, since=None):
+    """
+    Apply Hevy's workout events since the stored cursor (hevy_events.py): new
+    workouts are appended, edited and deleted ones replace their previous rows.
+    The cursor only moves once the CSV was written, so the next run retries.
+    Returns False if the events feed could not be read.
+    """
+    started = datetime.now(timezone.utc)
+    since = since or hevy_events.since()
+    print(f"Reading Hevy workout events since {since}...")
+    try:
+        events = hevy_events.latest(hevy_events.fetch(since, api_key=API_KEY))
+    except Exception as e:
+        print(f"Error reading workout events: {e}")
+        return False
+
+    hashes = content_hash.load("hevy_workouts")
+    updated, deleted, unchanged_count = [], [], 0
+    for workout_id, event in events.items():
+        if event.get('type') == 'deleted':
+            if hashes.get(str(workout_id)) != DELETED:
+                deleted.append(workout_id)
+        elif content_hash.changed(hashes, workout_id, event.get('workout')):
+            updated.append(event['workout'])
+        else:
+            unchanged_count += 1
+
+    stale_keys = set()
+    unmatched = []
+    for workout_id in deleted:
+        keys = previous_keys(workout_id)
+        if keys:
+            stale_keys |= keys
+        else:
+            unmatched.append(workout_id)
+
+    new_rows, new_signatures, skipped_count = [], {}, 0
+    for workout in updated:
+        w_date_clean, rows = workout_rows(workout)
+        if not w_date_clean:
+            continue
+        # Look up the previous version before its archived copy is replaced
+        keys = previous_keys(workout['id'], workout, known=str(workout['id']) in hashes)
+        archive_workout(workout, w_date_clean)
+        if keys:
+            stale_keys |= keys
+            new_rows.extend(rows)
+            continue
+        workout_skipped = 0
+        for row in rows:
+            signature = signature_index.make_signature(*row[:4])
+            if signature in new_signatures or (sig_index and signature_index.contains(sig_index, signature)):
+                workout_skipped += 1
+                continue
+            new_rows.append(row)
+            new_signatures[signature] = w_date_clean
+        skipped_count += workout_skipped
+        if rows and workout_skipped == len(rows):
+            # Already on file but unknown locally: can't tell an edit from a re-send
+            unmatched.append(workout['id'])
+
+    if stale_keys:
+        replace_workouts(stale_keys, new_rows)
+    elif new_rows:
+        save_new_rows(new_rows, new_signatures, sig_index, skipped_count)
+    else:
+        print(f"No changes. ({len(events)} events: {unchanged_count} unchanged, {skipped_count} duplicate sets)")
+    if unmatched:
+        print(f"Warning: {len(unmatched)} edited/deleted workouts are not in the local store or archive "
+              f"and were left as they are in the CSV: {', '.join(map(str, unmatched))}")
+
+    # Normalized copy keyed by Hevy ids (CSV stays the source of truth)
+    try:
+        if updated:
+            fitness_store.upsert_hevy_workouts(updated)
+        if deleted:
+            removed = fitness_store.delete_hevy_workouts(deleted)
+            if removed:
+                print(f"Deleted {removed} workouts removed in Hevy.")
+    except Exception as e:
+        print(f"Warning: Could not update normalized workouts: {e}")
+
+    # Deleted workouts leave the archive, moved ones keep only their current day
+    try:
+        for workout_id in deleted:
+            raw_archive.forget(WORKOUT_ENDPOINT, workout_id)
+        for workout in updated:
+            w_date_clean, _ = workout_rows(workout)
+            if w_date_clean:
+                raw_archive.forget(WORKOUT_ENDPOINT, workout['id'], keep_day=w_date_clean)
+    except Exception as e:
+        print(f"Warning: Could not update the raw archive: {e}")
+
+    try:
+        for workout in updated:
+            content_hash.remember(hashes, workout.get('id', ''), workout)
+        for workout_id in deleted:
+            hashes[str(workout_id)] = DELETED
+        content_hash.save("hevy_workouts", hashes)
+    except Exception as e:
+        print(f"Warning: Could not save content hashes: {e}")
+
+    hevy_events.save_cursor(hevy_events.next_cursor(started))
+    return True
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Hourly Hevy workout sync")
+    parser.add_argument("--since", help="replay the events feed from this date (YYYY-MM-DD), e.g. after a long outage")
+    parser.add_argument("--window", action="store_true", help="re-read the newest page instead of the events feed")
+    args = parser.parse_args()
+
     # Safety Check: Did the user actually set the key?
     if not API_KEY:
         print("CRITICAL ERROR: 'HEVY_API_KEY' not found. Please create a .env file.")
         return
 
-    headers = {
-        "api-key": API_KEY,
-        "Accept": "application/json"
-    }
-    
-    # 1. READ EXISTING DATA (Smart Deduplication)
-    existing_sets = set()
+    # 1. LOAD DEDUP INDEX (Smart Deduplication)
+    # Signatures (Date_Workout_Exercise_Set) live in a persisted index next to
+    # the CSV, so we no longer stream the whole history every hour.
+    sig_index = None
     
     # Check if directory exists first
     folder = os.path.dirname(CSV_FILE)
@@ -78,97 +418,20 @@ def main():
 
     if os.path.isfile(CSV_FILE):
         try:
-            with open(CSV_FILE, mode='r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader, None) # Skip header
-                for row in reader:
-                    if len(row) > 3:
-                        # Signature: Date_Workout_Exercise_Set
-                        signature = f"{row[0]}_{row[1]}_{row[2]}_{row[3]}"
-                        existing_sets.add(signature)
+            sig_index = signature_index.load(CSV_FILE)
         except Exception as e:
-            print(f"Warning reading file: {e}")
+            print(f"Warning reading signature index: {e}")
 
-    # 2. FETCH RECENT WORKOUTS
-    cutoff_date = datetime.now() - timedelta(days=2)
-    print(f"Checking Hevy for workouts since {cutoff_date.date()}...")
-    
-    url = "https://api.hevyapp.com/v1/workouts"
-    params = {"page": 1, "pageSize": 10}
-    
+    # 2. FETCH CHANGES
     try:
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code != 200:
-            print(f"Error: {response.status_code} - {response.text}")
-            return
-
-        data = response.json()
-        workouts = data.get('workouts', [])
-        
-        if not workouts:
-            print("No workouts found.")
-            return
-
-        new_rows = []
-        skipped_count = 0
-        
-        for workout in workouts:
-            w_date_str = workout.get('start_time')
-            if not w_date_str: continue
-
-            w_dt = datetime.fromisoformat(w_date_str).replace(tzinfo=None)
-            
-            if w_dt < cutoff_date:
-                continue
-            
-            w_date_clean = w_dt.strftime("%Y-%m-%d")
-            w_title = workout.get('title', 'Unknown Workout')
-
-            for exercise in workout.get('exercises', []):
-                ex_name = exercise.get('title', 'Unknown')
-                
-                for i, s in enumerate(exercise.get('sets', [])):
-                    set_num = str(i + 1)
-
-                    signature = f"{w_date_clean}_{w_title}_{ex_name}_{set_num}"
-
-                    if signature in existing_sets:
-                        skipped_count += 1
-                        continue
-
-                    weight_kg = s.get('weight_kg', 0)
-                    weight_lbs = round(weight_kg * 2.20462, 1) if weight_kg else 0
-                    reps = s.get('reps', 0)
-
-                    row = [
-                        w_date_clean,
-                        w_title,
-                        ex_name,
-                        set_num,
-                        weight_lbs,
-                        reps,
-                        s.get('rpe', ''),
-                        s.get('type', 'normal')
-                    ]
-                    new_rows.append(row)
-
-        # 3. SAVE ONLY NEW ROWS
-        if new_rows:
-            # Ensure headers exist if new file
-            is_new_file = not os.path.isfile(CSV_FILE)
-            
-            with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if is_new_file:
-                     writer.writerow(["Date", "Workout", "Exercise", "Set", "Weight (lbs)", "Reps", "RPE", "Type"])
-                writer.writerows(new_rows)
-            print(f"SUCCESS: Added {len(new_rows)} new sets. (Skipped {skipped_count} duplicates)")
-        else:
-            print(f"No *new* sets found. (Skipped {skipped_count} duplicates)")
-
+        if hevy_events.EVENT_SYNC and not args.window:
+            since = f"{args.since}T00:00:00Z" if args.since else None
+            if sync_events(sig_index, since):
+                return
+            print("Falling back to the newest page.")
+        sync_window(sig_index)
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -6,10 +6,41 @@ import json
 import requests
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import fitness_store
+import hevy_client
+import staging_cache
+import migrate_data
+from muscle_groups import get_muscle_group, is_cardio_exercise
+
+try:
+    import hevy_dataset  # Optional: needs pyarrow
+except ImportError:
+    hevy_dataset = None
+
+try:
+    import cold_archive  # Optional: needs pyarrow
+except ImportError:
+    cold_archive = None
+
+try:
+    import garmin_daily_mmap  # Optional: numpy-only fixed-width daily store
+except ImportError:
+    garmin_daily_mmap = None
+
+try:
+    import garmin_intraday  # Optional: numpy-only intraday series pyramid
+except ImportError:
+    garmin_intraday = None
+
+try:
+    import activity_streams  # Optional: numpy-only per-second run streams
+except ImportError:
+    activity_streams = None
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -34,6 +65,7 @@ else:
 HEVY_STATS_FILE = os.path.join(SAVE_PATH, "hevy_stats.csv")
 GARMIN_STATS_FILE = os.path.join(SAVE_PATH, "garmin_stats.csv")
 GARMIN_RUNS_FILE = os.path.join(SAVE_PATH, "garmin_runs.csv")
+GARMIN_HISTORY_FILE = os.path.join(SAVE_PATH, "garmin_history.csv")
 HEVY_EXERCISES_FILE = os.path.join(SAVE_PATH, "HEVY APP exercises.csv")
 
 # Tracked Files & Commands (using environment-based paths)
@@ -82,89 +114,155 @@ TRACKED_FILES = {
     }
 }
 
-# Exercise to muscle group mapping
-MUSCLE_GROUP_MAP = {
-    # Shoulders
-    'shoulder': 'Shoulders',
-    'lateral raise': 'Shoulders',
-    'rear delt': 'Shoulders',
-    'front raise': 'Shoulders',
-    'shrug': 'Shoulders',
-    'face pull': 'Shoulders',
-    # Chest
-    'bench press': 'Chest',
-    'chest': 'Chest',
-    'pec': 'Chest',
-    'fly': 'Chest',
-    'push up': 'Chest',
-    'pushup': 'Chest',
-    # Back
-    'row': 'Back',
-    'lat pulldown': 'Back',
-    'pull up': 'Back',
-    'pullup': 'Back',
-    'deadlift': 'Back',
-    'back extension': 'Back',
-    # Arms - Biceps
-    'bicep': 'Biceps',
-    'curl': 'Biceps',
-    'hammer curl': 'Biceps',
-    # Arms - Triceps
-    'tricep': 'Triceps',
-    'pushdown': 'Triceps',
-    'skull crusher': 'Triceps',
-    'dip': 'Triceps',
-    # Legs - Quads
-    'squat': 'Quads',
-    'leg press': 'Quads',
-    'leg extension': 'Quads',
-    'lunge': 'Quads',
-    # Legs - Hamstrings
-    'leg curl': 'Hamstrings',
-    'romanian deadlift': 'Hamstrings',
-    'rdl': 'Hamstrings',
-    # Legs - Glutes
-    'hip thrust': 'Glutes',
-    'glute': 'Glutes',
-    'hip abduction': 'Glutes',
-    'hip adduction': 'Glutes',
-    # Calves
-    'calf': 'Calves',
-    # Core
-    'ab': 'Core',
-    'crunch': 'Core',
-    'plank': 'Core',
-    'core': 'Core',
-}
 
-# Cardio exercises to filter out of strength training charts
-CARDIO_KEYWORDS = ['stair', 'treadmill', 'bike', 'elliptical', 'run', 'cardio', 'walk']
+# --- DATA LOADING FUNCTIONS ---
+def load_store_frame(table, start=None, end=None):
+    """Date-bounded read from the unified store, typed like the CSV. None if the store is empty."""
+    if not fitness_store.has_rows(table):
+        return None
+    headers, rows = fitness_store.fetch_range(table, start, end)
+    df = pd.DataFrame.from_records(rows, columns=headers)
+    for header, _, sql_type in fitness_store.TABLES[table]["columns"]:
+        if sql_type in ("REAL", "INTEGER"):
+            df[header] = pd.to_numeric(df[header], errors='coerce')
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    return df
+
+
+def load_mmap_garmin(start=None, end=None):
+    """Garmin daily rows sliced out of the memory-mapped store. None if it is not built."""
+    columns = garmin_daily_mmap.read_range(start, end) if garmin_daily_mmap else None
+    if columns is None:
+        return None
+    dates = columns.pop("dates")
+    df = pd.DataFrame(columns, columns=fitness_store.csv_headers("garmin_daily")[1:])
+    df.insert(0, 'Date', pd.to_datetime(pd.Series(dates, dtype=object), format='%Y-%m-%d'))
+    return df
 
 
-def get_muscle_group(exercise_name):
-    """Map exercise name to muscle group"""
-    name_lower = exercise_name.lower()
-    for keyword, muscle in MUSCLE_GROUP_MAP.items():
-        if keyword in name_lower:
-            return muscle
-    return 'Other'
+def load_intraday(series, start, end):
+    """Intraday series at the pyramid level that fits the range. None if nothing is stored."""
+    data = garmin_intraday.read(series, start, end) if garmin_intraday else None
+    if data is None or len(data["time"]) == 0:
+        return None
+    level = data.pop("level")
+    df = pd.DataFrame(data)
+    df.attrs["level"] = level
+    return df
+
+
+def load_run_efficiency(start=None, end=None):
+    """Per-run metres per heartbeat from the memory-mapped streams. None if none are stored."""
+    streams = activity_streams.read_many(start=start, end=end) if activity_streams else {}
+    if not streams:
+        return None
+    index = activity_streams.load_index()
+    records = []
+    for activity_id, s in streams.items():
+        moving = (s['speed'] > 0.5) & (s['hr'] > 0)
+        if moving.sum() < 60:
+            continue
+        records.append({
+            'Date': pd.Timestamp(index[activity_id]['start'][:10]),
+            'Run': index[activity_id]['name'] or activity_id,
+            'id': activity_id,
+            'Metres per beat': float(s['speed'][moving].mean() / s['hr'][moving].mean() * 60),
+        })
+    return pd.DataFrame(records).sort_values('Date') if records else None
+
+
+def coded_categorical(keys, labels):
+    """Categorical from integer keys + {key: label}, without building a string per row"""
+    labels = {k: ("" if v is None else v) for k, v in labels.items()}
+    categories = pd.Index(sorted(set(labels.values())))
+    lookup = np.full(max(labels, default=0) + 1, -1, dtype='int32')
+    for key, label in labels.items():
+        lookup[key] = categories.get_loc(label)
+    return pd.Categorical.from_codes(lookup[np.asarray(keys, dtype='int64')], categories=categories)
+
+
+def load_normalized_hevy(start=None, end=None):
+    """Sets from the normalized store as int codes + categoricals. None if not populated."""
+    result = fitness_store.fetch_hevy_normalized(start, end)
+    if result is None:
+        return None
+    facts, workout_titles, exercises = result
+
+    df = pd.DataFrame.from_records(facts, columns=[
+        'Date', 'workout_id', 'exercise_id', 'set_index', 'set_type', 'Weight (lbs)', 'Reps', 'RPE'
+    ])
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    df['workout_id'] = df['workout_id'].astype('int32')
+    df['exercise_id'] = df['exercise_id'].astype('int32')
+    df['Set'] = (df.pop('set_index') + 1).astype('int16')
+    df['Weight (lbs)'] = pd.to_numeric(df['Weight (lbs)'], errors='coerce').astype('float32')
+    df['Reps'] = pd.to_numeric(df['Reps'], errors='coerce').fillna(0).astype('int32')
+    df['RPE'] = pd.to_numeric(df['RPE'], errors='coerce').astype('float32')
+
+    type_labels = dict(enumerate(fitness_store.SET_TYPES + ["other"]))
+    df['Type'] = coded_categorical(df.pop('set_type').fillna(0), type_labels)
+    df['Workout'] = coded_categorical(df['workout_id'], workout_titles)
+    df['Exercise'] = coded_categorical(df['exercise_id'], {k: v[0] for k, v in exercises.items()})
+    df['primary_muscle_group'] = coded_categorical(df['exercise_id'], {k: v[1] for k, v in exercises.items()})
+    cardio = np.zeros(max(exercises, default=0) + 1, dtype=bool)
+    for key, (_, _, is_cardio) in exercises.items():
+        cardio[key] = is_cardio
+    df['is_cardio'] = cardio[df['exercise_id'].to_numpy()]
+    df['Volume'] = df['Weight (lbs)'].fillna(0) * df['Reps']
+    return df
+
+
+def read_canonical_csv(path, table):
+    """Fixed-format parse for files stamped by migrate_data.py. None if not migrated (or not canonical after all)."""
+    if not migrate_data.is_canonical(path):
+        return None
+    try:
+        df = pd.read_csv(path, dtype=migrate_data.csv_dtypes(table))
+        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+        return df
+    except (ValueError, TypeError):
+        return None
 
 
-def is_cardio_exercise(exercise_name):
-    """Check if exercise is cardio-based"""
-    name_lower = exercise_name.lower()
-    return any(keyword in name_lower for keyword in CARDIO_KEYWORDS)
+def with_archive(df, csv_path, table, start=None, end=None):
+    """Union the cold-archive years the window reaches into with the hot frame (hot rows win)"""
+    archived = cold_archive.read_frame(csv_path, table, start, end) if cold_archive else None
+    if archived is None:
+        return df
+    if df is None:
+        return archived
+    df = pd.concat([archived, df], ignore_index=True)
+    df = df.drop_duplicates(subset=cold_archive.key_headers(table), keep='last')
+    return df.sort_values('Date', kind='stable').reset_index(drop=True)
 
 
-# --- DATA LOADING FUNCTIONS ---
 @st.cache_data(ttl=300)
-def load_hevy_data():
-    """Load and prepare hevy workout data"""
-    if not os.path.exists(HEVY_STATS_FILE):
-        return None
+def load_hevy_data(start=None, end=None):
+    """Load and prepare hevy workout data (start/end: inclusive ISO dates)"""
     try:
-        df = pd.read_csv(HEVY_STATS_FILE)
-        df['Date'] = pd.to_datetime(df['Date'])
+        # Month partitions: only the months overlapping the window are opened,
+        # and the derived columns were computed when they were written
+        df = hevy_dataset.read_range(start, end) if hevy_dataset else None
+        if df is not None:
+            df['Date'] = pd.to_datetime(df['Date'])
+            return df
+
+        # Normalized store: integer keys decoded straight into categoricals
+        df = load_normalized_hevy(start, end)
+        if df is not None:
+            return df
+
+        df = load_store_frame("hevy_sets", start, end)
+        if df is None:
+            hevy_file = staging_cache.read_path(HEVY_STATS_FILE)
+            if os.path.exists(hevy_file):
+                df = read_canonical_csv(hevy_file, "hevy_sets")
+                if df is None:
+                    df = pd.read_csv(hevy_file)
+                    df['Date'] = pd.to_datetime(df['Date'])
+            df = with_archive(df, HEVY_STATS_FILE, "hevy_sets", start, end)
+            if df is None:
+                return None
         df['primary_muscle_group'] = df['Exercise'].apply(get_muscle_group)
         df['is_cardio'] = df['Exercise'].apply(is_cardio_exercise)
         df['Volume'] = df['Weight (lbs)'].fillna(0) * df['Reps'].fillna(0)
@@ -175,32 +273,51 @@ def load_hevy_data():
 
 
 @st.cache_data(ttl=300)
-def load_garmin_data():
-    """Load and prepare garmin health data"""
-    if not os.path.exists(GARMIN_STATS_FILE):
-        return None
+def load_garmin_data(start=None, end=None):
+    """Load and prepare garmin health data (start/end: inclusive ISO dates)"""
     try:
-        df = pd.read_csv(GARMIN_STATS_FILE)
-        # Handle mixed date formats (ISO and US format)
-        df['Date'] = pd.to_datetime(df['Date'], format='mixed', dayfirst=False)
-        # Remove duplicate dates, keeping the last entry
-        df = df.drop_duplicates(subset=['Date'], keep='last')
-        df = df.sort_values('Date').reset_index(drop=True)
-        return df
+        # Fixed-width records indexed by day: a slice, no parsing
+        df = load_mmap_garmin(start, end)
+        if df is not None:
+            return df
+        # Store rows are already ISO-dated, unique per day and sorted
+        df = load_store_frame("garmin_daily", start, end)
+        if df is not None:
+            return df
+        garmin_file = staging_cache.read_path(GARMIN_STATS_FILE)
+        if not os.path.exists(garmin_file):
+            return with_archive(None, GARMIN_HISTORY_FILE, "garmin_daily", start, end)
+        # Migrated file: ISO dates, one row per day, already sorted
+        df = read_canonical_csv(garmin_file, "garmin_daily")
+        if df is None:
+            df = pd.read_csv(garmin_file)
+            # Handle mixed date formats (ISO and US format)
+            df['Date'] = pd.to_datetime(df['Date'], format='mixed', dayfirst=False)
+            # Remove duplicate dates, keeping the last entry
+            df = df.drop_duplicates(subset=['Date'], keep='last')
+            df = df.sort_values('Date').reset_index(drop=True)
+        # Sealed years of garmin_history.csv, only when the window reaches them
+        return with_archive(df, GARMIN_HISTORY_FILE, "garmin_daily", start, end)
     except Exception as e:
         st.error(f"Error loading Garmin data: {e}")
         return None
 
 
 @st.cache_data(ttl=300)
-def load_garmin_runs():
-    """Load garmin running data"""
-    if not os.path.exists(GARMIN_RUNS_FILE):
-        return None
+def load_garmin_runs(start=None, end=None):
+    """Load garmin running data (start/end: inclusive ISO dates)"""
     try:
-        df = pd.read_csv(GARMIN_RUNS_FILE)
-        df['Date'] = pd.to_datetime(df['Date'])
-        return df
+        df = load_store_frame("garmin_runs", start, end)
+        if df is not None:
+            return df
+        runs_file = staging_cache.read_path(GARMIN_RUNS_FILE)
+        df = None
+        if os.path.exists(runs_file):
+            df = read_canonical_csv(runs_file, "garmin_runs")
+            if df is None:
+                df = pd.read_csv(runs_file)
+                df['Date'] = pd.to_datetime(df['Date'])
+        return with_archive(df, GARMIN_RUNS_FILE, "garmin_runs", start, end)
     except Exception as e:
         st.error(f"Error loading Garmin runs data: {e}")
         return None
@@ -208,15 +325,14 @@ def load_garmin_runs():
 
 # --- HEVY API FUNCTIONS ---
 def get_or_create_hevy_folder(folder_name):
-    headers = {"api-key": HEVY_API_KEY, "Content-Type": "application/json"}
     try:
-        res = requests.get("https://api.hevyapp.com/v1/routine_folders", headers=headers)
+        res = hevy_client.get("/v1/routine_folders", api_key=HEVY_API_KEY)
         if res.status_code == 200:
             for folder in res.json().get('routine_folders', []):
                 if folder['title'] == folder_name:
                     return folder['id']
         payload = {"routine_folder": {"title": folder_name}}
-        res = requests.post("https://api.hevyapp.com/v1/routine_folders", headers=headers, json=payload)
+        res = hevy_client.post("/v1/routine_folders", api_key=HEVY_API_KEY, json=payload)
         if res.status_code in [200, 201]:
             return res.json()['routine_folder']['id']
     except Exception as e:
@@ -248,7 +364,6 @@ def upload_routine_json(json_data, folder_name):
             if not folder_id:
                 return "Error: Could not create/access folder on Hevy."
 
-        headers = {"api-key": HEVY_API_KEY, "Content-Type": "application/json"}
         success_count = 0
         errors = []
 
@@ -256,7 +371,7 @@ def upload_routine_json(json_data, folder_name):
             payload = {"routine": routine}
             if folder_id:
                 payload["routine"]["folder_id"] = folder_id
-            res = requests.post("https://api.hevyapp.com/v1/routines", headers=headers, json=payload)
+            res = hevy_client.post("/v1/routines", api_key=HEVY_API_KEY, json=payload)
             if res.status_code in [200, 201]:
                 success_count += 1
             else:
@@ -558,7 +673,7 @@ tab1, tab2, tab3 = st.tabs(["Training (Hevy)", "Recovery (Garmin)", "System & To
 
 # --- TAB 1: Training (Hevy) ---
 with tab1:
-    hevy_df = load_hevy_data()
+    hevy_df = load_hevy_data(start_date.isoformat(), end_date.isoformat())
 
     if hevy_df is None:
         st.warning("Hevy workout data file not found. Please check the file path.")
@@ -574,7 +689,7 @@ with tab1:
             col1, col2, col3, col4 = st.columns(4)
 
             # Count unique workout sessions (unique Date + Workout combinations)
-            total_workouts = filtered_hevy.groupby(['Date', 'Workout']).ngroups
+            total_workouts = filtered_hevy.groupby(['Date', 'Workout'], observed=True).ngroups
             total_volume = filtered_hevy['Volume'].sum()
             total_sets = len(filtered_hevy)
             unique_exercises = filtered_hevy['Exercise'].nunique()
@@ -639,7 +754,7 @@ with tab1:
                 st.subheader("Muscle Group Split")
                 # Filter out cardio from muscle group analysis
                 strength_only = filtered_hevy[~filtered_hevy['is_cardio']].copy()
-                muscle_volume = strength_only.groupby('primary_muscle_group')['Volume'].sum().reset_index()
+                muscle_volume = strength_only.groupby('primary_muscle_group', observed=True)['Volume'].sum().reset_index()
                 muscle_volume = muscle_volume.sort_values('Volume', ascending=False)
 
                 fig_muscle = px.pie(
@@ -680,7 +795,7 @@ with tab1:
             st.markdown("---")
             st.subheader("Cardio Training (Garmin Runs)")
 
-            runs_df = load_garmin_runs()
+            runs_df = load_garmin_runs(start_date.isoformat(), end_date.isoformat())
             if runs_df is not None:
                 # Filter by date range
                 runs_mask = (runs_df['Date'] >= start_datetime) & (runs_df['Date'] <= end_datetime)
@@ -782,6 +897,51 @@ with tab1:
                         )
                         fig_pace.update_traces(line_color='#e06c75', marker_color='#e5c07b')
                         st.plotly_chart(fig_pace, use_container_width=True)
+
+                    # Per-second streams (activity_streams.py): every run in range is
+                    # sliced out of one memory-mapped file
+                    efficiency_df = load_run_efficiency(start_date.isoformat(), end_date.isoformat())
+                    if efficiency_df is not None:
+                        stream_col1, stream_col2 = st.columns(2)
+                        with stream_col1:
+                            fig_eff = px.line(
+                                efficiency_df,
+                                x='Date',
+                                y='Metres per beat',
+                                markers=True,
+                                hover_data=['Run'],
+                                title="Aerobic Efficiency (higher is fitter)"
+                            )
+                            fig_eff.update_layout(template="plotly_dark", height=300)
+                            fig_eff.update_traces(line_color='#98c379', marker_color='#e5c07b')
+                            st.plotly_chart(fig_eff, use_container_width=True)
+                        with stream_col2:
+                            run_choice = st.selectbox(
+                                "Run",
+                                efficiency_df['id'].tolist()[::-1],
+                                format_func=lambda a: (
+                                    f"{efficiency_df.set_index('id').at[a, 'Date'].date()} "
+                                    f"{efficiency_df.set_index('id').at[a, 'Run']}"
+                                )
+                            )
+                            run = activity_streams.read(run_choice)
+                            fig_run = go.Figure()
+                            fig_run.add_trace(go.Scatter(
+                                x=run['t'] / 60, y=run['hr'], name='HR', line=dict(color='#e06c75')
+                            ))
+                            pace = np.where(run['speed'] > 0.5, 1000 / (run['speed'] * 60), np.nan)
+                            fig_run.add_trace(go.Scatter(
+                                x=run['t'] / 60, y=pace, name='Pace (min/km)', yaxis='y2',
+                                line=dict(color='#61afef')
+                            ))
+                            fig_run.update_layout(
+                                template="plotly_dark",
+                                height=300,
+                                xaxis_title="Minutes",
+                                yaxis=dict(title="HR (bpm)"),
+                                yaxis2=dict(title="Pace", overlaying='y', side='right', autorange='reversed')
+                            )
+                            st.plotly_chart(fig_run, use_container_width=True)
                 else:
                     st.info("No running data found for the selected date range.")
             else:
@@ -790,7 +950,7 @@ with tab1:
 
 # --- TAB 2: Recovery (Garmin) ---
 with tab2:
-    garmin_df = load_garmin_data()
+    garmin_df = load_garmin_data(start_date.isoformat(), end_date.isoformat())
 
     if garmin_df is None:
         st.warning("Garmin health data file not found. Please check the file path.")
@@ -979,6 +1139,42 @@ with tab2:
                         fig_rhr.update_traces(line_color='#e06c75', marker_color='#e5c07b')
                         st.plotly_chart(fig_rhr, use_container_width=True)
 
+            # Intraday series: the pyramid level keeps the point count flat at any zoom
+            intraday_series = garmin_intraday.available() if garmin_intraday else []
+            if intraday_series:
+                st.subheader("Intraday")
+                series = st.selectbox(
+                    "Series", intraday_series,
+                    format_func=lambda s: s.replace('_', ' ').title()
+                )
+                intraday_df = load_intraday(series, start_date.isoformat(), end_date.isoformat())
+                if intraday_df is None:
+                    st.info("No intraday samples for the selected date range.")
+                else:
+                    level = intraday_df.attrs["level"]
+                    resolution = {None: "raw", 300: "5 min", 3600: "1 h", 86400: "1 day"}[level]
+                    fig_intraday = go.Figure()
+                    if level is not None:
+                        fig_intraday.add_trace(go.Scatter(
+                            x=intraday_df['time'], y=intraday_df['max'],
+                            mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+                        ))
+                        fig_intraday.add_trace(go.Scatter(
+                            x=intraday_df['time'], y=intraday_df['min'], fill='tonexty',
+                            mode='lines', line=dict(width=0), fillcolor='rgba(97, 175, 239, 0.2)',
+                            name='Min / Max'
+                        ))
+                    fig_intraday.add_trace(go.Scatter(
+                        x=intraday_df['time'], y=intraday_df['mean'],
+                        mode='lines', line=dict(color='#61afef'), name='Mean' if level else 'Samples'
+                    ))
+                    fig_intraday.update_layout(
+                        template="plotly_dark",
+                        height=350,
+                        title=f"{series.replace('_', ' ').title()} ({resolution})"
+                    )
+                    st.plotly_chart(fig_intraday, use_container_width=True)
+
 
 # --- TAB 3: System & Tools ---
 with tab3:
@@ -0,0 +1,104 @@
+import os
+import json
+from datetime import date
+from dotenv import load_dotenv
+import fitness_store
+import garmin_metrics
+
+# Learns, per Garmin account, which optional endpoints actually yield data.
+# After an endpoint has contributed nothing to the row on DEAD_AFTER days in a
+# row it is skipped, and only re-probed (for a whole day) every PROBE_DAYS
+# days in case the device (or Garmin) starts providing it.
+#
+#   data/endpoint_planner.json
+#   {"<display name>": {"spo2": {"misses": 6, "last_miss": "2025-01-09",
+#                                "last_probe": "2025-01-09", "last_hit": null,
+#                                "yields": []}, ...}}
+#
+# Reset by deleting the file, or inspect it with:
+#     python3 endpoint_planner.py
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+STATE_FILE = os.path.join(fitness_store.LOCAL_DATA_DIR, "endpoint_planner.json")
+DEAD_AFTER = int(os.getenv("PLANNER_DEAD_AFTER", "5"))
+PROBE_DAYS = int(os.getenv("PLANNER_PROBE_DAYS", "7"))
+# -------------------------------------
+
+# Endpoints that depend on the device / account. Sleep, body composition and
+# activities are legitimately empty on some days and are always called.
+PLANNED = ["spo2", "respiration", "max_metrics", "training_status", "hrv"]
+
+
+def _load_all():
+    try:
+        with open(STATE_FILE, mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load(account):
+    return _load_all().get(account or "default", {})
+
+
+def save(account, state):
+    everything = _load_all()
+    everything[account or "default"] = state
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(everything, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _is_dead(entry, today):
+    if entry.get("misses", 0) < DEAD_AFTER or not entry.get("last_probe"):
+        return False
+    # The probe day itself keeps calling, so late-arriving data still counts
+    since_probe = (date.fromisoformat(today) - date.fromisoformat(entry["last_probe"])).days
+    return 0 < since_probe < PROBE_DAYS
+
+
+def skipped(state, today):
+    """Endpoints not worth calling today"""
+    return {name for name in PLANNED if _is_dead(state.get(name, {}), today)}
+
+
+def learn(state, day, raw):
+    """Record which of the endpoints called for `day` yielded data (misses count once per day)"""
+    for name, columns in garmin_metrics.contributions(day, raw, PLANNED).items():
+        entry = state.setdefault(name, {"misses": 0, "last_miss": None, "last_probe": None,
+                                        "last_hit": None, "yields": []})
+        entry["last_probe"] = day
+        if columns:
+            entry["misses"] = 0
+            entry["last_hit"] = day
+            entry["yields"] = sorted(set(entry.get("yields", [])) | set(columns))
+        elif entry.get("last_miss") != day and entry.get("last_hit") != day:
+            entry["misses"] = entry.get("misses", 0) + 1
+            entry["last_miss"] = day
+    return state
+
+
+def main():
+    everything = _load_all()
+    if not everything:
+        print(f"No planner state yet ({STATE_FILE}).")
+        return
+    today = date.today().isoformat()
+    for account, state in everything.items():
+        print(f"{account}:")
+        for name in PLANNED:
+            entry = state.get(name)
+            if not entry:
+                print(f"   {name:16} no data yet")
+                continue
+            status = "SKIPPED" if _is_dead(entry, today) else "called"
+            yields = ", ".join(entry.get("yields", [])) or "-"
+            print(f"   {name:16} {status:8} misses={entry.get('misses', 0)} last_hit={entry.get('last_hit')} yields: {yields}")
+
+
+if __name__ == "__main__":
+    main()
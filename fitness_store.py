@@ -0,0 +1,623 @@
+import os
+import csv
+import sqlite3
+from datetime import datetime
+from dotenv import load_dotenv
+import staging_cache
+from muscle_groups import get_muscle_group, is_cardio_exercise
+
+# Unified SQLite store for Hevy sets, Garmin daily health and Garmin activities.
+# The CSVs in SAVE_PATH stay the source of truth (Drive sync, Gemini coach);
+# this store mirrors them so the dashboard can run indexed, date-bounded reads.
+#
+# Hevy workouts are also kept normalized (workouts / exercises / set_facts)
+# with integer keys, so the dashboard can load sets as categoricals and ints
+# instead of repeating workout and exercise names on every row.
+#
+# Bootstrap (or rebuild) from the existing CSVs:
+#     python3 fitness_store.py
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+SAVE_PATH = os.getenv("SAVE_PATH")
+# Keep the database on local disk: SQLite locking does not work over FUSE mounts
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+DB_FILE = os.getenv("FITNESS_DB", os.path.join(LOCAL_DATA_DIR, "fitness.db"))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# -------------------------------------
+
+# (CSV header, SQL column, SQL type) in CSV column order
+TABLES = {
+    "hevy_sets": {
+        "csv": "hevy_stats.csv",
+        "key": ["date", "workout", "exercise", "set_num"],
+        "columns": [
+            ("Date", "date", "TEXT"),
+            ("Workout", "workout", "TEXT"),
+            ("Exercise", "exercise", "TEXT"),
+            ("Set", "set_num", "INTEGER"),
+            ("Weight (lbs)", "weight_lbs", "REAL"),
+            ("Reps", "reps", "INTEGER"),
+            ("RPE", "rpe", "REAL"),
+            ("Type", "set_type", "TEXT"),
+        ],
+    },
+    "garmin_daily": {
+        # History first so the daily file wins on overlapping days
+        "csv": ["garmin_history.csv", "garmin_stats.csv"],
+        "key": ["date"],
+        "columns": [
+            ("Date", "date", "TEXT"),
+            ("Weight (lbs)", "weight_lbs", "REAL"),
+            ("Muscle Mass (lbs)", "muscle_mass_lbs", "REAL"),
+            ("Body Fat %", "body_fat_pct", "REAL"),
+            ("Water %", "water_pct", "REAL"),
+            ("Sleep Total (hr)", "sleep_total_hr", "REAL"),
+            ("Sleep Deep (hr)", "sleep_deep_hr", "REAL"),
+            ("Sleep REM (hr)", "sleep_rem_hr", "REAL"),
+            ("Sleep Score", "sleep_score", "REAL"),
+            ("RHR", "rhr", "REAL"),
+            ("Min HR", "min_hr", "REAL"),
+            ("Max HR", "max_hr", "REAL"),
+            ("Avg Stress", "avg_stress", "REAL"),
+            ("Respiration", "respiration", "REAL"),
+            ("SpO2", "spo2", "REAL"),
+            ("VO2 Max", "vo2_max", "REAL"),
+            ("Training Status", "training_status", "TEXT"),
+            ("HRV Status", "hrv_status", "TEXT"),
+            ("HRV Avg", "hrv_avg", "REAL"),
+            ("Steps", "steps", "REAL"),
+            ("Step Goal", "step_goal", "REAL"),
+            ("Cals Total", "cals_total", "REAL"),
+            ("Cals Active", "cals_active", "REAL"),
+            ("Activities", "activities", "TEXT"),
+        ],
+    },
+    "garmin_runs": {
+        "csv": "garmin_runs.csv",
+        "key": ["date", "time"],
+        "columns": [
+            ("Date", "date", "TEXT"),
+            ("Time", "time", "TEXT"),
+            ("activityName", "activity_name", "TEXT"),
+            ("activityType_typeKey", "activity_type", "TEXT"),
+            ("duration", "duration", "REAL"),
+            ("elapsedDuration", "elapsed_duration", "REAL"),
+            ("movingDuration", "moving_duration", "REAL"),
+            ("averageSpeed", "average_speed", "REAL"),
+            ("averageHR", "average_hr", "REAL"),
+            ("maxHR", "max_hr", "REAL"),
+            ("steps", "steps", "REAL"),
+            ("summarizedExerciseSets", "summarized_exercise_sets", "TEXT"),
+            ("totalSets", "total_sets", "REAL"),
+            ("activeSets", "active_sets", "REAL"),
+            ("totalReps", "total_reps", "REAL"),
+            ("trainingEffectLabel", "training_effect_label", "TEXT"),
+            ("activityTrainingLoad", "activity_training_load", "REAL"),
+            ("minActivityLapDuration", "min_activity_lap_duration", "REAL"),
+            ("hrTimeInZone_1", "hr_time_in_zone_1", "REAL"),
+            ("hrTimeInZone_2", "hr_time_in_zone_2", "REAL"),
+            ("hrTimeInZone_3", "hr_time_in_zone_3", "REAL"),
+            ("hrTimeInZone_4", "hr_time_in_zone_4", "REAL"),
+        ],
+    },
+}
+
+
+# Normalized Hevy model. hevy_id / template_id are Hevy's own ids; rows seeded
+# from the CSV (which has no ids) use "csv:<date>:<title>" / "title:<name>".
+NORMALIZED_DDL = [
+    """CREATE TABLE IF NOT EXISTS workouts (
+        workout_id INTEGER PRIMARY KEY,
+        hevy_id TEXT UNIQUE NOT NULL,
+        date TEXT NOT NULL,
+        title TEXT)""",
+    "CREATE INDEX IF NOT EXISTS idx_workouts_date ON workouts (date)",
+    """CREATE TABLE IF NOT EXISTS exercises (
+        exercise_id INTEGER PRIMARY KEY,
+        template_id TEXT UNIQUE NOT NULL,
+        title TEXT,
+        hevy_muscle_group TEXT,
+        primary_muscle_group TEXT,
+        is_cardio INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS set_facts (
+        workout_id INTEGER NOT NULL,
+        exercise_index INTEGER NOT NULL,
+        set_index INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        set_type INTEGER,
+        weight_lbs REAL,
+        reps INTEGER,
+        rpe REAL,
+        PRIMARY KEY (workout_id, exercise_index, set_index)) WITHOUT ROWID""",
+]
+
+# set_facts.set_type codes
+SET_TYPES = ["normal", "warmup", "dropset", "failure"]
+
+
+def normalize_date(date_str):
+    """Normalize date string to ISO format (handles M/D/YYYY rows from older CSVs)"""
+    if not date_str:
+        return None
+    date_str = str(date_str).strip()
+    try:
+        if '-' in date_str and len(date_str) >= 10:
+            return date_str[:10]
+        if '/' in date_str:
+            parts = date_str.split('/')
+            if len(parts) == 3:
+                month, day, year = parts
+                return f"{year}-{int(month):02d}-{int(day):02d}"
+        return date_str
+    except:
+        return date_str
+
+
+def csv_headers(table):
+    """CSV header names for a table, in file order"""
+    return [c[0] for c in TABLES[table]["columns"]]
+
+
+def get_connection(db_file=None):
+    """Open the store, creating the schema on first use"""
+    db_file = db_file or DB_FILE
+    folder = os.path.dirname(db_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    # WAL lets the dashboard read while a cron job is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    for table, spec in TABLES.items():
+        cols = ", ".join(f'"{sql}" {sql_type}' for _, sql, sql_type in spec["columns"])
+        key = ", ".join(spec["key"])
+        # Every primary key leads with date, so range reads use the key index
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols}, PRIMARY KEY ({key}))")
+    for ddl in NORMALIZED_DDL:
+        conn.execute(ddl)
+    conn.commit()
+    return conn
+
+
+def _clean_row(table, row):
+    """Convert a CSV-ordered row into SQL values (blank -> NULL, ISO dates)"""
+    values = []
+    for (header, sql, sql_type), value in zip(TABLES[table]["columns"], row):
+        if value is None or (isinstance(value, str) and value.strip() == ""):
+            values.append(None)
+        elif sql == "date":
+            values.append(normalize_date(value))
+        elif sql_type in ("REAL", "INTEGER"):
+            try:
+                num = float(value)
+                values.append(int(num) if sql_type == "INTEGER" and num.is_integer() else num)
+            except (TypeError, ValueError):
+                values.append(None)
+        else:
+            values.append(str(value))
+    return values
+
+
+def _table_is_empty(conn, table):
+    return conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None
+
+
+def _csv_paths(table):
+    """Default CSV locations for a table inside SAVE_PATH"""
+    names = TABLES[table]["csv"]
+    if isinstance(names, str):
+        names = [names]
+    return [os.path.join(SAVE_PATH, name) if SAVE_PATH else name for name in names]
+
+
+def _seed_paths(table):
+    """Default CSV locations for a table (staged copies when present)"""
+    return [staging_cache.read_path(path) for path in _csv_paths(table)]
+
+
+def _archived_rows(csv_path, table):
+    """Rows sealed into the cold archive for csv_path (see cold_archive.py)"""
+    try:
+        import cold_archive  # Imported late: cold_archive imports this module
+    except ImportError:  # Optional: needs pyarrow
+        return
+    yield from cold_archive.iter_rows(csv_path, table)
+
+
+def seed_rows(table):
+    """Every row of a table's history: archived years first, then the hot CSV(s)"""
+    for path in _csv_paths(table):
+        yield from _archived_rows(path, table)
+        local = staging_cache.read_path(path)
+        if os.path.isfile(local):
+            yield from _read_csv_rows(local)
+
+
+def _read_csv_rows(csv_path):
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header
+        for row in reader:
+            if row:
+                yield row
+
+
+def upsert_rows(table, rows, seed=True, conn=None):
+    """
+    Insert or replace CSV-ordered rows.
+    If the table is still empty, its CSV(s) are imported first so a store
+    created by a cron job does not start out with a partial history.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        if seed and _table_is_empty(conn, table):
+            _insert(conn, table, seed_rows(table))
+
+        count = _insert(conn, table, rows)
+        conn.commit()
+        return count
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _insert(conn, table, rows):
+    columns = TABLES[table]["columns"]
+    names = ", ".join(f'"{sql}"' for _, sql, _ in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})"
+
+    width = len(columns)
+    cleaned = []
+    for row in rows:
+        row = list(row)[:width]
+        row += [None] * (width - len(row))
+        values = _clean_row(table, row)
+        if values[0]:
+            cleaned.append(values)
+    conn.executemany(sql, cleaned)
+    return len(cleaned)
+
+
+def has_rows(table, db_file=None):
+    """True if the store exists and holds data for this table"""
+    db_file = db_file or DB_FILE
+    if not os.path.isfile(db_file):
+        return False
+    try:
+        conn = get_connection(db_file)
+        try:
+            return not _table_is_empty(conn, table)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+def fetch_range(table, start=None, end=None, db_file=None):
+    """
+    Date-bounded read. start/end are inclusive ISO dates (YYYY-MM-DD) or None.
+    Returns (csv_headers, rows) so callers can build the same frame the CSV gave them.
+    """
+    columns = TABLES[table]["columns"]
+    names = ", ".join(f'"{sql}"' for _, sql, _ in columns)
+    where, params = [], []
+    if start:
+        where.append("date >= ?")
+        params.append(str(start)[:10])
+    if end:
+        where.append("date <= ?")
+        params.append(str(end)[:10])
+    sql = f"SELECT {names} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY " + ", ".join(TABLES[table]["key"])
+
+    conn = get_connection(db_file)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return csv_headers(table), rows
+
+
+# --- NORMALIZED HEVY MODEL ---
+_exercise_catalog = None
+
+
+def load_exercise_catalog():
+    """Hevy template id / title -> Hevy primary muscle group, from 'HEVY APP exercises.csv'"""
+    global _exercise_catalog
+    if _exercise_catalog is not None:
+        return _exercise_catalog
+
+    _exercise_catalog = {}
+    candidates = [os.path.join(PROJECT_DIR, "HEVY APP exercises.csv")]
+    if SAVE_PATH:
+        candidates.insert(0, staging_cache.read_path(os.path.join(SAVE_PATH, "HEVY APP exercises.csv")))
+    for path in candidates:
+        if os.path.isfile(path):
+            with open(path, mode='r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    group = row.get('primary_muscle_group')
+                    if row.get('id'):
+                        _exercise_catalog[row['id']] = group
+                    if row.get('title'):
+                        _exercise_catalog["title:" + row['title'].strip()] = group
+            break
+    return _exercise_catalog
+
+
+def _exercise_id(conn, template_id, title):
+    """Look up (or create) the exercise dimension row for a template"""
+    found = conn.execute("SELECT exercise_id FROM exercises WHERE template_id = ?", (template_id,)).fetchone()
+    if found:
+        return found[0]
+
+    catalog = load_exercise_catalog()
+    hevy_group = catalog.get(template_id) or catalog.get("title:" + title.strip())
+    # Dashboard keyword mapping first; Hevy's own group fills in what it can't place
+    primary = get_muscle_group(title)
+    if primary == 'Other' and hevy_group and hevy_group != 'cardio':
+        primary = hevy_group.replace('_', ' ').title()
+    is_cardio = is_cardio_exercise(title) or hevy_group == 'cardio'
+    cur = conn.execute(
+        "INSERT INTO exercises (template_id, title, hevy_muscle_group, primary_muscle_group, is_cardio) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (template_id, title, hevy_group, primary, int(is_cardio)),
+    )
+    return cur.lastrowid
+
+
+def _set_type_code(set_type):
+    set_type = set_type or "normal"
+    return SET_TYPES.index(set_type) if set_type in SET_TYPES else len(SET_TYPES)
+
+
+def _replace_workout(conn, hevy_id, date_str, title, exercises):
+    """
+    Write one workout and all of its sets, replacing whatever was stored for it.
+    exercises: list of (template_id, exercise_title, [(weight_lbs, reps, rpe, set_type), ...])
+    """
+    conn.execute(
+        "INSERT INTO workouts (hevy_id, date, title) VALUES (?, ?, ?) "
+        "ON CONFLICT(hevy_id) DO UPDATE SET date = excluded.date, title = excluded.title",
+        (hevy_id, date_str, title),
+    )
+    workout_id = conn.execute("SELECT workout_id FROM workouts WHERE hevy_id = ?", (hevy_id,)).fetchone()[0]
+    conn.execute("DELETE FROM set_facts WHERE workout_id = ?", (workout_id,))
+
+    facts = []
+    for ex_index, (template_id, ex_title, sets) in enumerate(exercises):
+        exercise_id = _exercise_id(conn, template_id, ex_title)
+        for set_index, (weight_lbs, reps, rpe, set_type) in enumerate(sets):
+            facts.append((workout_id, ex_index, set_index, exercise_id,
+                          _set_type_code(set_type), weight_lbs, reps, rpe))
+    conn.executemany(
+        "INSERT INTO set_facts (workout_id, exercise_index, set_index, exercise_id, set_type, weight_lbs, reps, rpe) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        facts,
+    )
+    return workout_id
+
+
+def _delete_workouts(conn, where, params):
+    ids = [r[0] for r in conn.execute(f"SELECT workout_id FROM workouts WHERE {where}", params)]
+    for workout_id in ids:
+        conn.execute("DELETE FROM set_facts WHERE workout_id = ?", (workout_id,))
+        conn.execute("DELETE FROM workouts WHERE workout_id = ?", (workout_id,))
+    return len(ids)
+
+
+def seed_normalized_from_csv(conn, csv_path=None):
+    """Build the normalized tables from hevy_stats.csv (synthetic ids, no Hevy ids in the CSV)"""
+    if csv_path:
+        if not os.path.isfile(csv_path):
+            return 0
+        rows = _read_csv_rows(csv_path)
+    else:
+        rows = seed_rows("hevy_sets")
+
+    workouts = {}
+    for row in rows:
+        if len(row) < 8:
+            row = row + [""] * (8 - len(row))
+        values = _clean_row("hevy_sets", row[:8])
+        date_str, title, ex_title, set_num, weight, reps, rpe, set_type = values
+        if not date_str:
+            continue
+        exercises = workouts.setdefault((date_str, title or ""), {})
+        sets = exercises.setdefault(ex_title or "Unknown", {})
+        sets[set_num or len(sets) + 1] = (weight, reps, rpe, set_type)
+
+    for (date_str, title), exercises in workouts.items():
+        _replace_workout(conn, f"csv:{date_str}:{title}", date_str, title, [
+            (f"title:{ex_title}", ex_title, [sets[k] for k in sorted(sets)])
+            for ex_title, sets in exercises.items()
+        ])
+    return len(workouts)
+
+
+def workout_rows(workout):
+    """(date, hevy_stats.csv rows) for one Hevy API workout, or (None, []) without a start time"""
+    start = workout.get('start_time')
+    if not start:
+        return None, []
+    date_str = datetime.fromisoformat(start).replace(tzinfo=None).strftime("%Y-%m-%d")
+    title = workout.get('title', 'Unknown Workout')
+
+    rows = []
+    for exercise in workout.get('exercises', []):
+        ex_title = exercise.get('title', 'Unknown')
+        for i, s in enumerate(exercise.get('sets', [])):
+            weight_kg = s.get('weight_kg', 0)
+            weight_lbs = round(weight_kg * 2.20462, 1) if weight_kg else 0
+            rows.append([date_str, title, ex_title, str(i + 1), weight_lbs,
+                         s.get('reps', 0), s.get('rpe', ''), s.get('type', 'normal')])
+    return date_str, rows
+
+
+def upsert_hevy_workouts(workouts, seed=True):
+    """Write raw Hevy API workouts (/v1/workouts objects) into the normalized tables"""
+    conn = get_connection()
+    try:
+        if seed and conn.execute("SELECT 1 FROM workouts LIMIT 1").fetchone() is None:
+            seed_normalized_from_csv(conn)
+
+        count = 0
+        for workout in workouts:
+            start = workout.get('start_time')
+            if not workout.get('id') or not start:
+                continue
+            date_str = datetime.fromisoformat(start).replace(tzinfo=None).strftime("%Y-%m-%d")
+            title = workout.get('title', 'Unknown Workout')
+
+            # The real workout supersedes any copy seeded from the CSV
+            _delete_workouts(conn, "hevy_id = ?", (f"csv:{date_str}:{title}",))
+
+            exercises = []
+            for exercise in workout.get('exercises', []):
+                ex_title = exercise.get('title', 'Unknown')
+                template_id = exercise.get('exercise_template_id') or f"title:{ex_title}"
+                sets = []
+                for s in exercise.get('sets', []):
+                    weight_kg = s.get('weight_kg', 0)
+                    weight_lbs = round(weight_kg * 2.20462, 1) if weight_kg else 0
+                    sets.append((weight_lbs, s.get('reps', 0), s.get('rpe'), s.get('type', 'normal')))
+                exercises.append((template_id, ex_title, sets))
+
+            _replace_workout(conn, workout['id'], date_str, title, exercises)
+            count += 1
+        conn.commit()
+        return count
+    finally:
+        conn.close()
+
+
+def hevy_workout_set_keys(hevy_ids):
+    """{hevy_id: {(date, title, exercise, set number)}} for the stored workouts among hevy_ids"""
+    if not os.path.isfile(DB_FILE):
+        return {}
+    conn = get_connection()
+    try:
+        keys = {}
+        for hevy_id in hevy_ids:
+            rows = conn.execute(
+                "SELECT w.date, w.title, e.title, f.set_index FROM workouts w "
+                "JOIN set_facts f ON f.workout_id = w.workout_id "
+                "JOIN exercises e ON e.exercise_id = f.exercise_id WHERE w.hevy_id = ?",
+                (hevy_id,),
+            ).fetchall()
+            if rows:
+                keys[hevy_id] = {(r[0], r[1] or "", r[2] or "", str(r[3] + 1)) for r in rows}
+        return keys
+    finally:
+        conn.close()
+
+
+def delete_hevy_workouts(hevy_ids):
+    """Remove workouts (and their sets) deleted in Hevy from the normalized tables"""
+    conn = get_connection()
+    try:
+        count = sum(_delete_workouts(conn, "hevy_id = ?", (hevy_id,)) for hevy_id in hevy_ids)
+        conn.commit()
+        return count
+    finally:
+        conn.close()
+
+
+def fetch_hevy_normalized(start=None, end=None, db_file=None):
+    """
+    Date-bounded read of the normalized Hevy model.
+    Returns (facts, workout_titles, exercises) or None if nothing is stored:
+      facts: rows of (date, workout_id, exercise_id, set_index, set_type, weight_lbs, reps, rpe)
+      workout_titles: {workout_id: title}
+      exercises: {exercise_id: (title, primary_muscle_group, is_cardio)}
+    """
+    db_file = db_file or DB_FILE
+    if not os.path.isfile(db_file):
+        return None
+
+    where, params = [], []
+    if start:
+        where.append("w.date >= ?")
+        params.append(str(start)[:10])
+    if end:
+        where.append("w.date <= ?")
+        params.append(str(end)[:10])
+    clause = (" WHERE " + " AND ".join(where)) if where else ""
+
+    conn = get_connection(db_file)
+    try:
+        if conn.execute("SELECT 1 FROM workouts LIMIT 1").fetchone() is None:
+            return None
+        facts = conn.execute(
+            "SELECT w.date, f.workout_id, f.exercise_id, f.set_index, f.set_type, f.weight_lbs, f.reps, f.rpe "
+            "FROM workouts w JOIN set_facts f ON f.workout_id = w.workout_id" + clause +
+            " ORDER BY w.date, f.workout_id, f.exercise_index, f.set_index",
+            params,
+        ).fetchall()
+        workout_titles = dict(conn.execute("SELECT w.workout_id, w.title FROM workouts w" + clause, params))
+        exercises = {
+            r[0]: (r[1], r[2], bool(r[3]))
+            for r in conn.execute("SELECT exercise_id, title, primary_muscle_group, is_cardio FROM exercises")
+        }
+    finally:
+        conn.close()
+    return facts, workout_titles, exercises
+
+
+def rebuild_from_csv(table, csv_paths=None):
+    """Replace a table's contents with the rows from its CSV file(s) and their archived years"""
+    conn = get_connection()
+    try:
+        conn.execute(f"DELETE FROM {table}")
+        total = 0
+        for path in csv_paths or _csv_paths(table):
+            if not csv_paths:
+                archived = _insert(conn, table, _archived_rows(path, table))
+                if archived:
+                    total += archived
+                    print(f"   {table}: imported {archived} archived rows for {os.path.basename(path)}")
+                path = staging_cache.read_path(path)
+            if os.path.isfile(path):
+                total += _insert(conn, table, _read_csv_rows(path))
+                print(f"   {table}: imported {path}")
+            else:
+                print(f"   {table}: {path} not found, skipping")
+        conn.commit()
+        return total
+    finally:
+        conn.close()
+
+
+def main():
+    print("--- REBUILDING FITNESS STORE ---")
+    print(f"Database: {DB_FILE}")
+    for table in TABLES:
+        try:
+            total = rebuild_from_csv(table)
+            print(f"   {table}: {total} rows")
+        except Exception as e:
+            print(f"   {table}: FAILED ({e})")
+
+    # Only seed the normalized model when empty: rows synced from the Hevy API
+    # carry real ids that a CSV rebuild cannot recover
+    conn = get_connection()
+    try:
+        if conn.execute("SELECT 1 FROM workouts LIMIT 1").fetchone() is None:
+            print(f"   workouts: {seed_normalized_from_csv(conn)} seeded from CSV")
+            conn.commit()
+    finally:
+        conn.close()
+    print("--- COMPLETE ---")
+
+
+if __name__ == "__main__":
+    main()
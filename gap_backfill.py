@@ -0,0 +1,298 @@
+import garth
+from garminconnect import Garmin
+from datetime import date, timedelta
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import fitness_store
+import csv_upsert
+import staging_cache
+import raw_archive
+import garmin_metrics
+import endpoint_planner
+from rate_limit import TokenBucket
+
+try:
+    import garmin_daily_mmap  # Optional: needs numpy
+except ImportError:
+    garmin_daily_mmap = None
+
+# Finds holes in the Garmin daily timeline (garmin_history.csv + garmin_stats.csv,
+# archived years included) and repairs only those:
+#
+#   missing day   no row at all -> every endpoint is fetched for that day
+#   null metric   a column that is empty although the account has produced it
+#                 before -> only the endpoint(s) behind that column are fetched
+#
+# Before calling Garmin, nulls are re-derived from raw_archive; an endpoint
+# whose response for the day is already archived is not called again (its
+# empty value is genuine). Weigh-ins and activities are legitimately absent on
+# most days and are only refetched for missing days unless --include-sparse.
+#
+#     python3 gap_backfill.py --dry-run                 # report only
+#     python3 gap_backfill.py                           # repair everything found
+#     python3 gap_backfill.py --start 2025-01-01 --end 2025-03-31
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+# Same knobs as history_garmin_import.py
+WORKERS = int(os.getenv("GARMIN_HISTORY_WORKERS", "4"))
+RATE_LIMIT = float(os.getenv("GARMIN_RATE_LIMIT", "2.0"))
+RATE_BURST = int(os.getenv("GARMIN_RATE_BURST", "4"))
+# -------------------------------------
+
+TABLE = "garmin_daily"
+NULLS = ("", "None", "nan", "NaN")
+
+# CSV column -> endpoints that can fill it, in the order derive_row consults them
+COLUMN_ENDPOINTS = {
+    "Weight (lbs)": ["body_composition"],
+    "Muscle Mass (lbs)": ["body_composition"],
+    "Body Fat %": ["body_composition"],
+    "Water %": ["body_composition"],
+    "Sleep Total (hr)": ["sleep"],
+    "Sleep Deep (hr)": ["sleep"],
+    "Sleep REM (hr)": ["sleep"],
+    "Sleep Score": ["sleep"],
+    "RHR": ["user_summary"],
+    "Min HR": ["user_summary"],
+    "Max HR": ["user_summary"],
+    "Avg Stress": ["user_summary"],
+    "Respiration": ["user_summary", "respiration"],
+    "SpO2": ["user_summary", "spo2"],
+    "VO2 Max": ["user_summary", "max_metrics", "training_status"],
+    "Training Status": ["training_status"],
+    "HRV Status": ["hrv"],
+    "HRV Avg": ["hrv"],
+    "Steps": ["user_summary"],
+    "Step Goal": ["user_summary"],
+    "Cals Total": ["user_summary"],
+    "Cals Active": ["user_summary"],
+    "Activities": ["activities"],
+}
+SPARSE = {"body_composition", "activities"}
+
+
+def _is_null(value):
+    return value is None or str(value).strip() in NULLS
+
+
+def load_timeline():
+    """{day: (row, hot CSV path the row belongs to)}; later files win, like the stores"""
+    timeline = {}
+    for path in fitness_store._csv_paths(TABLE):
+        for row in fitness_store._archived_rows(path, TABLE):
+            day = fitness_store.normalize_date(row[0])
+            if day:
+                timeline[day] = (row, path)
+        local = staging_cache.read_path(path)
+        if os.path.isfile(local):
+            for row in fitness_store._read_csv_rows(local):
+                day = fitness_store.normalize_date(row[0])
+                if day:
+                    timeline[day] = (row, path)
+    return timeline
+
+
+def _archived(day):
+    """Archived per-day responses for `day`: {endpoint name: payload}"""
+    raw = {}
+    for name in garmin_metrics.ENDPOINTS:
+        key = f"{garmin_metrics.ARCHIVE_PREFIX}/{name}"
+        if raw_archive.has(key, day):
+            raw[name] = raw_archive.get(key, day)
+    return raw
+
+
+def scan(timeline, start=None, end=None, include_sparse=False, dead=()):
+    """
+    {day: endpoints to fetch} for the window, None meaning "the whole day".
+    Only columns the account has ever produced count as fetchable nulls.
+    """
+    days = sorted(timeline)
+    if not days and not start:
+        return {}
+    first = date.fromisoformat(start or days[0])
+    last = date.fromisoformat(end) if end else date.today() - timedelta(days=1)
+    produced = {
+        h for i, h in enumerate(garmin_metrics.HEADERS)
+        if h in COLUMN_ENDPOINTS and any(
+            len(row) > i and not _is_null(row[i]) for row, _ in timeline.values()
+        )
+    }
+
+    gaps = {}
+    for n in range((last - first).days + 1):
+        day = (first + timedelta(days=n)).isoformat()
+        if day not in timeline:
+            gaps[day] = None
+            continue
+        row = timeline[day][0]
+        needed = set()
+        for i, header in enumerate(garmin_metrics.HEADERS):
+            if header not in produced or (len(row) > i and not _is_null(row[i])):
+                continue
+            endpoints = [e for e in COLUMN_ENDPOINTS[header] if e not in dead]
+            if not include_sparse:
+                endpoints = [e for e in endpoints if e not in SPARSE]
+            needed.update(endpoints)
+        if needed:
+            gaps[day] = needed
+    return gaps
+
+
+def _merge(old_row, new_row):
+    """Fill the nulls of old_row from new_row; values already present are kept"""
+    if not old_row:
+        return new_row
+    old_row = list(old_row) + [""] * (len(new_row) - len(old_row))
+    return [new if _is_null(old) and not _is_null(new) else old for old, new in zip(old_row, new_row)]
+
+
+def repair_offline(gaps, timeline):
+    """
+    Re-derive gaps from already-archived responses. Endpoints that are archived
+    for a day are dropped from its gap (calling them again would return the same);
+    a missing day whose user summary is archived only needs the endpoints that aren't.
+    Returns {day: merged row} for rows that gained values.
+    """
+    repaired = {}
+    for day, needed in list(gaps.items()):
+        raw = _archived(day)
+        if not raw:
+            continue
+        if needed is None:
+            if "user_summary" not in raw:
+                continue
+            repaired[day] = garmin_metrics.derive_row(day, raw)
+            needed = {n for n in garmin_metrics.ENDPOINTS if n not in garmin_metrics.FALLBACKS}
+        else:
+            old_row = timeline[day][0]
+            row = _merge(old_row, garmin_metrics.derive_row(day, raw))
+            if row != _merge(old_row, [""] * len(row)):
+                repaired[day] = row
+        needed -= set(raw)
+        if needed:
+            gaps[day] = needed
+        else:
+            del gaps[day]
+    return repaired
+
+
+def save_rows(rows, timeline):
+    """Merge repaired rows into the hot CSV each day belongs to (one write per file), then the stores"""
+    default_path = fitness_store._csv_paths(TABLE)[0]  # garmin_history.csv
+    by_file = {}
+    for day, row in rows.items():
+        path = timeline[day][1] if day in timeline else default_path
+        by_file.setdefault(path, {})[day] = row
+    for path, file_rows in by_file.items():
+        path = staging_cache.stage(path)
+        csv_upsert.upsert_rows(path, garmin_metrics.HEADERS, file_rows)
+        staging_cache.mark_dirty(path)
+    try:
+        fitness_store.upsert_rows(TABLE, list(rows.values()))
+    except Exception as e:
+        print(f"Warning: Could not update fitness store: {e}")
+    if garmin_daily_mmap:
+        try:
+            garmin_daily_mmap.upsert_rows(list(rows.values()))
+        except Exception as e:
+            print(f"Warning: Could not update daily mmap store: {e}")
+
+
+def _login():
+    garth.resume(TOKEN_DIR)
+    api = Garmin("dummy", "dummy")
+    api.garth = garth.client
+    try:
+        api.display_name = api.garth.profile['displayName']
+    except:
+        pass
+    return api
+
+
+def repair_online(api, gaps, timeline, dead=()):
+    """Fetch only the gap's day/endpoint pairs, in parallel behind one token bucket"""
+    limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+
+    def fill(day, needed):
+        if needed is None:
+            raw = garmin_metrics.fetch_day(api, day, limiter=limiter, skip=dead)
+            return garmin_metrics.derive_row(day, raw)
+        raw = _archived(day)
+        for name in sorted(needed):
+            data = garmin_metrics.fetch(api, name, day, limiter=limiter)
+            if data is not None:
+                raw[name] = data
+        old_row = timeline[day][0] if day in timeline else None
+        return _merge(old_row, garmin_metrics.derive_row(day, raw))
+
+    rows = {}
+    executor = ThreadPoolExecutor(max_workers=WORKERS)
+    try:
+        futures = [(day, executor.submit(fill, day, needed)) for day, needed in sorted(gaps.items())]
+        for day, future in futures:
+            try:
+                rows[day] = future.result()
+                print(f"   {day}: fetched {', '.join(sorted(gaps[day])) if gaps[day] else 'whole day'}")
+            except Exception as e:
+                print(f"   {day}: failed ({e})")
+    except KeyboardInterrupt:
+        print("\nStopping: cancelling queued days...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        return rows
+    executor.shutdown()
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find and repair gaps in the Garmin daily timeline")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD (default first day in the CSVs)")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD (default yesterday)")
+    parser.add_argument("--dry-run", action="store_true", help="report gaps and planned calls, change nothing")
+    parser.add_argument("--include-sparse", action="store_true",
+                        help="also refetch body composition / activities for days that lack them")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    timeline = load_timeline()
+    dead = set()
+    api = None
+    if not args.dry_run:
+        try:
+            api = _login()
+        except Exception as e:
+            print(f"Login failed: {e}")
+            return
+        dead = endpoint_planner.skipped(endpoint_planner.load(getattr(api, 'display_name', None)),
+                                        date.today().isoformat())
+
+    gaps = scan(timeline, args.start, args.end, args.include_sparse, dead)
+    missing = sorted(d for d, needed in gaps.items() if needed is None)
+    print(f"--- GARMIN GAP SCAN ({len(timeline)} days on file) ---")
+    print(f"Missing days: {len(missing)}" + (f" ({missing[0]} .. {missing[-1]})" if missing else ""))
+    print(f"Days with fetchable nulls: {len(gaps) - len(missing)}")
+
+    offline = repair_offline(gaps, timeline)
+    calls = sum(len(garmin_metrics.ENDPOINTS) if n is None else len(n) for n in gaps.values())
+    print(f"Filled from the raw archive: {len(offline)} days; still to fetch: {len(gaps)} days, ~{calls} calls")
+    if args.dry_run:
+        for day, needed in sorted(gaps.items()):
+            print(f"   {day}: {', '.join(sorted(needed)) if needed else 'whole day'}")
+        return
+
+    rows = dict(offline)
+    rows.update(repair_online(api, gaps, timeline, dead))
+    if rows:
+        save_rows(rows, timeline)
+    print(f"--- REPAIRED {len(rows)} DAYS ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+from datetime import date, timedelta
+from dotenv import load_dotenv
+import raw_archive
+import rate_limit
+from garmin_metrics import get_safe
+
+# Bulk (date-range) fetching for Garmin history backfills. Instead of ~7 calls
+# per day, each range endpoint is called once per window of up to
+# GARMIN_RANGE_DAYS days and the responses are pivoted into the same per-day
+# shape garmin_metrics.derive_row reads:
+#
+#   fetch_window(api, start, end) -> {day: {endpoint name: payload}}
+#
+# Range responses are archived as "garmin_range/<name>" (day = window start,
+# item = window end). Fields with no range endpoint (training status, SpO2,
+# respiration, VO2 max, min/max HR, calories) stay blank; a per-day run with
+# --refetch over the same window fills them in.
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+WINDOW_DAYS = int(os.getenv("GARMIN_RANGE_DAYS", "28"))
+# -------------------------------------
+
+ARCHIVE_PREFIX = "garmin_range"
+
+
+# --- RANGE ENDPOINTS ---
+def _resting_hr(api, start, end):
+    return api.connectapi(
+        f"/userstats-service/wellness/daily/{api.display_name}",
+        params={"fromDate": start, "untilDate": end, "metricId": 60},
+    )
+
+
+RANGE_ENDPOINTS = {
+    "daily_steps": lambda api, start, end: api.get_daily_steps(start, end),
+    "daily_stress": lambda api, start, end: api.connectapi(f"/usersummary-service/stats/stress/daily/{start}/{end}"),
+    "resting_hr": _resting_hr,
+    "body_composition": lambda api, start, end: api.get_body_composition(start, end),
+    "hrv": lambda api, start, end: api.connectapi(f"/hrv-service/hrv/daily/{start}/{end}"),
+    "sleep": lambda api, start, end: api.connectapi(f"/sleep-service/stats/sleep/daily/{start}/{end}"),
+    "activities": lambda api, start, end: api.get_activities_by_date(start, end),
+}
+
+
+def windows(days):
+    """Split sorted ISO days into contiguous (start, end) windows of at most WINDOW_DAYS"""
+    result = []
+    for day in days:
+        d = date.fromisoformat(day)
+        if result:
+            start, end = result[-1]
+            if d == end + timedelta(days=1) and (d - start).days < WINDOW_DAYS:
+                result[-1] = (start, d)
+                continue
+        result.append((d, d))
+    return [(s.isoformat(), e.isoformat()) for s, e in result]
+
+
+# --- PIVOTS: range response -> {day: fields in the per-day endpoint's shape} ---
+def _entries(data, *keys):
+    entries = get_safe(data, *keys) if keys else data
+    return entries if isinstance(entries, list) else []
+
+
+def _pivot_steps(data):
+    return {
+        e.get('calendarDate'): {"user_summary": {"totalSteps": e.get('totalSteps'), "dailyStepGoal": e.get('stepGoal')}}
+        for e in _entries(data)
+    }
+
+
+def _pivot_stress(data):
+    return {
+        e.get('calendarDate'): {"user_summary": {"averageStressLevel": get_safe(e, 'values', 'overallStressLevel')}}
+        for e in _entries(data)
+    }
+
+
+def _pivot_resting_hr(data):
+    return {
+        e.get('calendarDate'): {"user_summary": {"restingHeartRate": e.get('value')}}
+        for e in _entries(data, 'allMetrics', 'metricsMap', 'WELLNESS_RESTING_HEART_RATE')
+    }
+
+
+def _pivot_body_composition(data):
+    # Several weigh-ins on one day: the last one wins
+    return {
+        e.get('calendarDate'): {"body_composition": {"totalAverage": e}}
+        for e in _entries(data, 'dateWeightList')
+    }
+
+
+def _pivot_hrv(data):
+    return {
+        e.get('calendarDate'): {"hrv": {"hrvSummary": e}}
+        for e in _entries(data, 'hrvSummaries')
+    }
+
+
+def _pivot_sleep(data):
+    result = {}
+    for e in _entries(data, 'individualStats'):
+        values = e.get('values') or {}
+        result[e.get('calendarDate')] = {"sleep": {"dailySleepDTO": {
+            "sleepTimeSeconds": values.get('totalSleepTimeInSeconds'),
+            "deepSleepSeconds": values.get('deepTime'),
+            "remSleepSeconds": values.get('remTime'),
+            "sleepScores": {"overall": {"value": values.get('sleepScore')}},
+        }}}
+    return result
+
+
+def _pivot_activities(data):
+    result = {}
+    for act in _entries(data):
+        day = str(act.get('startTimeLocal') or '')[:10]
+        if day:
+            result.setdefault(day, {"activities": []})["activities"].append(act)
+    return result
+
+
+PIVOTS = {
+    "daily_steps": _pivot_steps,
+    "daily_stress": _pivot_stress,
+    "resting_hr": _pivot_resting_hr,
+    "body_composition": _pivot_body_composition,
+    "hrv": _pivot_hrv,
+    "sleep": _pivot_sleep,
+    "activities": _pivot_activities,
+}
+
+
+def merge_day(raw, fields):
+    """Merge pivoted fields into one day's raw dict (dict payloads are combined)"""
+    for endpoint, payload in fields.items():
+        if isinstance(payload, dict) and isinstance(raw.get(endpoint), dict):
+            raw[endpoint].update(payload)
+        else:
+            raw[endpoint] = payload
+    return raw
+
+
+def pivot(responses, days=None):
+    """Merge {range endpoint name: response} into {day: {endpoint name: payload}}"""
+    days = {} if days is None else days
+    for name, data in responses.items():
+        if data is None:
+            continue
+        try:
+            pivoted = PIVOTS[name](data)
+        except Exception as e:
+            print(f"   Could not pivot {name}: {e}")
+            continue
+        for day, fields in pivoted.items():
+            if day:
+                merge_day(days.setdefault(day, {}), fields)
+    return days
+
+
+def fetch_window(api, start, end, archive=True, limiter=None):
+    """Call every range endpoint once for [start, end] and pivot to per-day raw dicts"""
+    responses = {}
+    for name, call in RANGE_ENDPOINTS.items():
+        rate_limit.acquire("garmin", limiter)
+        try:
+            responses[name] = call(api, start, end)
+        except Exception as e:
+            print(f"   {name} range fetch error for {start}..{end}: {e}")
+            continue
+        if archive:
+            try:
+                raw_archive.put(f"{ARCHIVE_PREFIX}/{name}", start, responses[name], item=end)
+            except Exception as e:
+                print(f"   Warning: Could not archive {name} for {start}..{end}: {e}")
+    return pivot(responses)
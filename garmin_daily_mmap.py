@@ -0,0 +1,174 @@
+import os
+import json
+from datetime import date, timedelta
+import numpy as np
+from dotenv import load_dotenv
+import fitness_store
+
+# Memory-mapped fixed-width store for the Garmin daily health metrics.
+#
+#   garmin_daily.dat           one fixed-size record per day, indexed by the
+#                              day offset from EPOCH (numeric columns, float64 so
+#                              reads match the CSV exactly, NaN = missing, plus a
+#                              "present" flag)
+#   garmin_daily_strings.json  side table for the text columns
+#   garmin_daily_layout.json   record layout; a file with another layout (e.g. the
+#                              old float32 one) is rebuilt on the next upsert
+#
+# The Recovery tab slices a date range straight out of the mapped file with no
+# CSV parsing, and the hourly job's single-day upsert is an in-place write.
+#
+# Build (or rebuild) from garmin_history.csv + garmin_stats.csv:
+#     python3 garmin_daily_mmap.py
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+DATA_FILE = os.getenv("GARMIN_DAILY_MMAP", os.path.join(fitness_store.LOCAL_DATA_DIR, "garmin_daily.dat"))
+STRINGS_FILE = os.path.splitext(DATA_FILE)[0] + "_strings.json"
+LAYOUT_FILE = os.path.splitext(DATA_FILE)[0] + "_layout.json"
+# -------------------------------------
+
+EPOCH = date(2010, 1, 1)
+
+_COLUMNS = fitness_store.TABLES["garmin_daily"]["columns"]
+NUMERIC = [(header, sql) for header, sql, sql_type in _COLUMNS if sql_type != "TEXT" and sql != "date"]
+TEXT = [(header, sql) for header, sql, sql_type in _COLUMNS if sql_type == "TEXT" and sql != "date"]
+
+DTYPE = np.dtype([("present", "u1")] + [(sql, "<f8") for _, sql in NUMERIC])
+_LAYOUT = json.loads(json.dumps({"epoch": EPOCH.isoformat(), "dtype": DTYPE.descr}))
+
+
+def _layout_matches():
+    try:
+        with open(LAYOUT_FILE, mode='r', encoding='utf-8') as f:
+            return json.load(f) == _LAYOUT
+    except (OSError, ValueError):
+        return False
+
+
+def exists():
+    return (os.path.isfile(DATA_FILE) and os.path.getsize(DATA_FILE) >= DTYPE.itemsize
+            and _layout_matches())
+
+
+def _offset(date_str):
+    return (date.fromisoformat(date_str) - EPOCH).days
+
+
+def _length():
+    return os.path.getsize(DATA_FILE) // DTYPE.itemsize if os.path.isfile(DATA_FILE) else 0
+
+
+def _grow(days):
+    """Extend the file with empty (present=0) records so `days` records fit"""
+    folder = os.path.dirname(DATA_FILE)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    if _length() == 0:
+        with open(LAYOUT_FILE, mode='w', encoding='utf-8') as f:
+            json.dump(_LAYOUT, f)
+    missing = days - _length()
+    if missing > 0:
+        with open(DATA_FILE, mode='ab') as f:
+            f.write(b'\x00' * (missing * DTYPE.itemsize))
+
+
+def _load_strings():
+    try:
+        with open(STRINGS_FILE, mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_strings(strings):
+    tmp_path = STRINGS_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(strings, f)
+    os.replace(tmp_path, STRINGS_FILE)
+
+
+def _write_rows(rows):
+    """Write CSV-ordered rows in place. Returns the number stored."""
+    cleaned = []
+    for row in rows:
+        row = list(row)[:len(_COLUMNS)]
+        row += [None] * (len(_COLUMNS) - len(row))
+        values = dict(zip((sql for _, sql, _ in _COLUMNS), fitness_store._clean_row("garmin_daily", row)))
+        if values["date"] and _offset(values["date"]) >= 0:
+            cleaned.append(values)
+    if not cleaned:
+        return 0
+
+    _grow(max(_offset(v["date"]) for v in cleaned) + 1)
+    records = np.memmap(DATA_FILE, dtype=DTYPE, mode='r+')
+    strings = _load_strings()
+    for values in cleaned:
+        records[_offset(values["date"])] = (1,) + tuple(
+            np.nan if values[sql] is None else values[sql] for _, sql in NUMERIC
+        )
+        strings[values["date"]] = [values[sql] or "" for _, sql in TEXT]
+    records.flush()
+    del records
+    _save_strings(strings)
+    return len(cleaned)
+
+
+def upsert_rows(rows, seed=True):
+    """
+    In-place upsert of CSV-ordered garmin rows.
+    On first use the store is built from the CSVs instead (they already
+    contain the new rows), so it never starts out with a partial history.
+    """
+    if os.path.isfile(DATA_FILE) and not _layout_matches():
+        print("   Garmin daily store has an old record layout, rebuilding...")
+        return rebuild_from_csv()
+    if seed and not exists():
+        return rebuild_from_csv()
+    return _write_rows(rows)
+
+
+def rebuild_from_csv():
+    for path in (DATA_FILE, STRINGS_FILE, LAYOUT_FILE):
+        if os.path.isfile(path):
+            os.remove(path)
+    # Archived years, history, then the daily file: later rows win
+    return _write_rows(fitness_store.seed_rows("garmin_daily"))
+
+
+def read_range(start=None, end=None):
+    """
+    Slice an inclusive ISO date window out of the mapped file.
+    Returns {"dates": [...], "<CSV header>": array, ...} for present days only,
+    or None when the store has not been built.
+    """
+    if not exists():
+        return None
+
+    records = np.memmap(DATA_FILE, dtype=DTYPE, mode='r')
+    lo = max(_offset(str(start)[:10]), 0) if start else 0
+    hi = min(_offset(str(end)[:10]) + 1, len(records)) if end else len(records)
+    window = records[lo:max(hi, lo)]
+    present = np.flatnonzero(window["present"])
+
+    days = [(EPOCH + timedelta(days=int(lo + i))).isoformat() for i in present]
+    columns = {"dates": days}
+    for header, sql in NUMERIC:
+        columns[header] = window[sql][present]
+
+    strings = _load_strings()
+    for i, (header, _) in enumerate(TEXT):
+        columns[header] = [strings.get(d, [""] * len(TEXT))[i] or None for d in days]
+    return columns
+
+
+def main():
+    print("--- BUILDING GARMIN DAILY MMAP STORE ---")
+    print(f"Target: {DATA_FILE}")
+    total = rebuild_from_csv()
+    print(f"--- COMPLETE. {total} days written. ---")
+
+
+if __name__ == "__main__":
+    main()
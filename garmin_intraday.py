@@ -0,0 +1,307 @@
+import os
+import argparse
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from dotenv import load_dotenv
+import fitness_store
+import raw_archive
+import rate_limit
+
+# Intraday Garmin series (heart rate, stress, body battery, respiration) stored
+# as typed arrays, with pre-aggregated pyramid levels so a chart costs the same
+# whether it shows one night or a whole year:
+#
+#   data/intraday/<series>/<year>/<day>.npz   raw samples: t (uint32 seconds
+#                                             since local midnight), v (float32)
+#   data/intraday/<series>/<year>/L300.npy    5 min buckets  \  (buckets, 3) float32
+#   data/intraday/<series>/<year>/L3600.npy   1 h buckets     > mean, min, max
+#   data/intraday/<series>/<year>/L86400.npy  1 day buckets  /  NaN = no samples
+#
+# Level files are fixed-size per year and updated in place (memmap), so a
+# day's re-ingest only rewrites that day's slice. read() picks the finest
+# level that keeps a range under INTRADAY_MAX_POINTS points.
+#
+# Responses are archived as "garmin_intraday/<endpoint>" in raw_archive.
+#
+#     python3 garmin_intraday.py                                  # today
+#     python3 garmin_intraday.py --start 2025-01-01 --end 2025-01-31
+#     python3 garmin_intraday.py --replay                         # rebuild from the archive
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+INTRADAY_DIR = os.getenv("INTRADAY_DIR", os.path.join(fitness_store.LOCAL_DATA_DIR, "intraday"))
+MAX_POINTS = int(os.getenv("INTRADAY_MAX_POINTS", "2000"))
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+# -------------------------------------
+
+ARCHIVE_PREFIX = "garmin_intraday"
+
+ENDPOINTS = {
+    "heart_rate": lambda api, day: api.get_heart_rates(day),
+    "stress": lambda api, day: api.get_stress_data(day),
+    "respiration": lambda api, day: api.get_respiration_data(day),
+}
+
+# series -> (endpoint, array key in its response, index of the value in each entry)
+SERIES = {
+    "heart_rate": ("heart_rate", "heartRateValues", 1),
+    "stress": ("stress", "stressValuesArray", 1),
+    "body_battery": ("stress", "bodyBatteryValuesArray", 2),
+    "respiration": ("respiration", "respirationValuesArray", 1),
+}
+
+# Pyramid levels, in seconds per bucket
+LEVELS = [300, 3600, 86400]
+DAY_SECONDS = 86400
+
+
+def _year_dir(series, year):
+    return os.path.join(INTRADAY_DIR, series, str(year))
+
+
+def _day_path(series, day):
+    return os.path.join(_year_dir(series, day[:4]), f"{day}.npz")
+
+
+def _level_path(series, year, level):
+    return os.path.join(_year_dir(series, year), f"L{level}.npy")
+
+
+def _days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+# --- EXTRACTION ---
+def samples(payload, key, index, day):
+    """(seconds since local midnight, values) for one day; gaps and negative codes dropped"""
+    entries = payload.get(key) if isinstance(payload, dict) else None
+    midnight = datetime.combine(date.fromisoformat(day), time()).timestamp()
+    t, v = [], []
+    for entry in entries or []:
+        try:
+            ts, value = entry[0], entry[index]
+        except (IndexError, KeyError, TypeError):
+            continue
+        # Garmin marks "no reading" with None or negative values (e.g. stress -1/-2)
+        if ts is None or not isinstance(value, (int, float)) or value < 0:
+            continue
+        sec = ts / 1000 - midnight
+        if 0 <= sec < DAY_SECONDS:
+            t.append(int(sec))
+            v.append(value)
+    order = np.argsort(t, kind='stable')
+    return np.asarray(t, dtype='<u4')[order], np.asarray(v, dtype='<f4')[order]
+
+
+# --- STORAGE ---
+def aggregate(t, v, level):
+    """(buckets per day, 3) array of mean / min / max per bucket"""
+    per_day = DAY_SECONDS // level
+    out = np.full((per_day, 3), np.nan, dtype='<f4')
+    if len(t) == 0:
+        return out
+    buckets = (t // level).astype(np.intp)
+    counts = np.bincount(buckets, minlength=per_day)
+    sums = np.bincount(buckets, weights=v, minlength=per_day)
+    lows = np.full(per_day, np.inf)
+    highs = np.full(per_day, -np.inf)
+    np.minimum.at(lows, buckets, v)
+    np.maximum.at(highs, buckets, v)
+    filled = counts > 0
+    out[filled, 0] = sums[filled] / counts[filled]
+    out[filled, 1] = lows[filled]
+    out[filled, 2] = highs[filled]
+    return out
+
+
+def _level_array(series, year, level, mode='r+'):
+    path = _level_path(series, year, level)
+    if not os.path.isfile(path):
+        if mode == 'r':
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shape = (_days_in_year(year) * (DAY_SECONDS // level), 3)
+        array = np.lib.format.open_memmap(path, mode='w+', dtype='<f4', shape=shape)
+        array[:] = np.nan
+        return array
+    return np.load(path, mmap_mode=mode)
+
+
+def store_day(series, day, t, v):
+    """Write one day's raw samples and refresh its slice of every pyramid level"""
+    path = _day_path(series, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode='wb') as f:
+        np.savez(f, t=t, v=v)
+    os.replace(tmp_path, path)
+
+    d = date.fromisoformat(day)
+    day_index = d.timetuple().tm_yday - 1
+    for level in LEVELS:
+        per_day = DAY_SECONDS // level
+        array = _level_array(series, d.year, level)
+        array[day_index * per_day:(day_index + 1) * per_day] = aggregate(t, v, level)
+        array.flush()
+        del array
+
+
+def store_payloads(day, payloads):
+    """Extract and store every series from {endpoint: response}. Returns {series: samples}."""
+    counts = {}
+    for series, (endpoint, key, index) in SERIES.items():
+        if payloads.get(endpoint) is None:
+            continue
+        t, v = samples(payloads[endpoint], key, index, day)
+        if len(t):
+            store_day(series, day, t, v)
+        counts[series] = len(t)
+    return counts
+
+
+def ingest_day(api, day, archive=True, limiter=None, fetched=None):
+    """
+    Fetch, archive and store every intraday series for one day. Responses in
+    `fetched` ({endpoint name: payload}, e.g. garmin_metrics.fetch_day's respiration)
+    are reused instead of being requested again.
+    """
+    payloads = {}
+    for name, call in ENDPOINTS.items():
+        if (fetched or {}).get(name) is not None:
+            payloads[name] = fetched[name]
+        else:
+            rate_limit.acquire("garmin", limiter)
+            try:
+                payloads[name] = call(api, day)
+            except Exception as e:
+                print(f"   intraday {name} fetch error for {day}: {e}")
+                continue
+        if archive:
+            try:
+                raw_archive.put(f"{ARCHIVE_PREFIX}/{name}", day, payloads[name])
+            except Exception as e:
+                print(f"   Warning: Could not archive intraday {name} for {day}: {e}")
+    return store_payloads(day, payloads)
+
+
+def replay(start=None, end=None):
+    """Rebuild the raw files and pyramid from archived responses, no network"""
+    days = 0
+    for day, payloads in raw_archive.iter_days(ARCHIVE_PREFIX, start, end):
+        store_payloads(day, payloads)
+        days += 1
+    return days
+
+
+# --- READING ---
+def pick_level(start, end, max_points=None):
+    """Finest resolution (None = raw samples) that keeps [start, end] under max_points"""
+    max_points = max_points or MAX_POINTS
+    span = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    # Raw series are at most one sample a minute
+    if span * 1440 <= max_points:
+        return None
+    for level in LEVELS:
+        if span * (DAY_SECONDS // level) <= max_points:
+            return level
+    return LEVELS[-1]
+
+
+def _read_raw(series, start, end):
+    times, values = [], []
+    d, last = date.fromisoformat(start), date.fromisoformat(end)
+    while d <= last:
+        path = _day_path(series, d.isoformat())
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                midnight = np.datetime64(d.isoformat(), 's')
+                times.append(midnight + data["t"].astype('i8').astype('timedelta64[s]'))
+                values.append(data["v"])
+        d += timedelta(days=1)
+    if not times:
+        return None
+    v = np.concatenate(values)
+    return {"time": np.concatenate(times), "mean": v, "min": v, "max": v, "level": None}
+
+
+def _read_level(series, start, end, level):
+    per_day = DAY_SECONDS // level
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    chunks = []
+    found = False
+    for year in range(first.year, last.year + 1):
+        lo = max(first, date(year, 1, 1))
+        hi = min(last, date(year, 12, 31))
+        rows = ((hi - lo).days + 1) * per_day
+        array = _level_array(series, year, level, mode='r')
+        if array is None:
+            chunks.append(np.full((rows, 3), np.nan, dtype='<f4'))
+            continue
+        found = True
+        offset = (lo.timetuple().tm_yday - 1) * per_day
+        chunks.append(np.array(array[offset:offset + rows]))
+    if not found:
+        return None
+    data = np.concatenate(chunks)
+    times = np.datetime64(start, 's') + np.arange(len(data)) * np.timedelta64(level, 's')
+    keep = ~np.isnan(data[:, 0])
+    return {"time": times[keep], "mean": data[keep, 0], "min": data[keep, 1],
+            "max": data[keep, 2], "level": level}
+
+
+def read(series, start, end, level="auto", max_points=None):
+    """
+    {"time", "mean", "min", "max", "level"} arrays for [start, end] (ISO days),
+    or None when nothing is stored. level="auto" picks the pyramid level.
+    """
+    if level == "auto":
+        level = pick_level(start, end, max_points)
+    if level is None:
+        return _read_raw(series, start, end)
+    return _read_level(series, start, end, level)
+
+
+def available():
+    """Series with anything stored"""
+    if not os.path.isdir(INTRADAY_DIR):
+        return []
+    return [s for s in SERIES if os.path.isdir(os.path.join(INTRADAY_DIR, s))]
+
+
+def _login():
+    import garth
+    from garminconnect import Garmin
+    garth.resume(TOKEN_DIR)
+    api = Garmin("dummy", "dummy")
+    api.garth = garth.client
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest intraday Garmin series")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD (default today)")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD (default --start)")
+    parser.add_argument("--replay", action="store_true", help="rebuild from raw_archive without calling Garmin")
+    args = parser.parse_args()
+
+    if args.replay:
+        print(f"Replayed {replay(args.start, args.end)} days into {INTRADAY_DIR}")
+        return
+
+    start = date.fromisoformat(args.start) if args.start else date.today()
+    end = date.fromisoformat(args.end) if args.end else start
+    try:
+        api = _login()
+    except Exception as e:
+        print(f"Login failed: {e}")
+        return
+    d = start
+    while d <= end:
+        counts = ingest_day(api, d.isoformat())
+        print(f"{d}: " + ", ".join(f"{s} {n}" for s, n in counts.items()))
+        d += timedelta(days=1)
+
+
+if __name__ == "__main__":
+    main()
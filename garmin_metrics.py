@@ -0,0 +1,253 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+import fitness_store
+import raw_archive
+import rate_limit
+
+# Garmin daily health metrics, split into two steps so the same parsing runs
+# on live responses and on archived ones (see replay_archive.py):
+#
+#   fetch_day(api, day)   -> {endpoint name: raw JSON response}
+#   derive_row(day, raw)  -> one garmin_stats.csv / garmin_history.csv row
+#
+# Every response fetched here is stored in raw_archive under "garmin/<name>".
+# The endpoints of one day are requested concurrently; the SpO2 / respiration /
+# VO2 fallbacks are only chained onto the user summary they depend on.
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+# Seconds to wait for any single endpoint before treating it as missing
+CALL_TIMEOUT = float(os.getenv("GARMIN_CALL_TIMEOUT", "30"))
+# -------------------------------------
+
+HEADERS = fitness_store.csv_headers("garmin_daily")
+ARCHIVE_PREFIX = "garmin"
+
+
+def get_safe(data, *keys):
+    try:
+        for key in keys:
+            data = data[key]
+        return data
+    except (KeyError, TypeError, AttributeError, IndexError):
+        return None
+
+
+# --- ENDPOINTS ---
+def _training_status(api, day):
+    return api.get_training_status(day) if hasattr(api, 'get_training_status') else None
+
+
+def _max_metrics(api, day):
+    return api.get_max_metrics(day) if hasattr(api, 'get_max_metrics') else None
+
+
+def _hrv(api, day):
+    if hasattr(api, 'get_hrv_data'):
+        return api.get_hrv_data(day)
+    return api.connectapi(f"/hrv-service/hrv/daily/{day}")
+
+
+ENDPOINTS = {
+    "user_summary": lambda api, day: api.get_user_summary(day),
+    "spo2": lambda api, day: api.get_spo2_data(day),
+    "respiration": lambda api, day: api.get_respiration_data(day),
+    "max_metrics": _max_metrics,
+    "sleep": lambda api, day: api.get_sleep_data(day),
+    "training_status": _training_status,
+    "body_composition": lambda api, day: api.get_body_composition(day),
+    "hrv": _hrv,
+    "activities": lambda api, day: api.get_activities_by_date(day, day),
+}
+
+# Only called when the user summary is missing the value they back up
+FALLBACKS = {
+    "spo2": ("averageSpO2",),
+    "respiration": ("averageRespirationValue",),
+    "max_metrics": ("vo2Max",),
+}
+
+
+def fetch(api, name, day, archive=True, limiter=None):
+    """
+    Call one endpoint. Errors are printed and return None (nothing archived).
+    `limiter` (rate_limit.TokenBucket) is shared by concurrent callers.
+    """
+    rate_limit.acquire("garmin", limiter)
+    try:
+        data = ENDPOINTS[name](api, day)
+    except Exception as e:
+        print(f"   {name} fetch error for {day}: {e}")
+        return None
+    if archive:
+        try:
+            raw_archive.put(f"{ARCHIVE_PREFIX}/{name}", day, data)
+        except Exception as e:
+            print(f"   Warning: Could not archive {name} for {day}: {e}")
+    return data
+
+
+def _result(name, day, future, deadline):
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeout:
+        print(f"   {name} timed out for {day}")
+        return None
+
+
+def fetch_day(api, day, archive=True, limiter=None, timeout=None, skip=()):
+    """
+    Every endpoint for one day, issued concurrently. Fallbacks are only
+    requested once the user summary turns out to lack their value.
+    Endpoints in `skip` (see endpoint_planner.py) are not called at all.
+    """
+    timeout = CALL_TIMEOUT if timeout is None else timeout
+    pool = ThreadPoolExecutor(max_workers=len(ENDPOINTS))
+    try:
+        def submit(name):
+            return pool.submit(fetch, api, name, day, archive, limiter), time.monotonic() + timeout
+
+        pending = {name: submit(name) for name in ENDPOINTS if name not in FALLBACKS and name not in skip}
+        raw = {}
+        summary = pending.pop("user_summary", None)
+        if summary is not None:
+            raw["user_summary"] = _result("user_summary", day, *summary)
+        # Without a summary (skipped or failed) every fallback is needed
+        for name, keys in FALLBACKS.items():
+            if name not in skip and get_safe(raw.get("user_summary"), *keys) is None:
+                pending[name] = submit(name)
+
+        for name, (future, deadline) in pending.items():
+            raw[name] = _result(name, day, future, deadline)
+    finally:
+        # Don't wait for calls that timed out; their result is dropped
+        pool.shutdown(wait=False)
+    return raw
+
+
+# --- DERIVATION ---
+def _hours(seconds):
+    return round(seconds / 3600, 2) if seconds else seconds
+
+
+def derive_row(day, raw):
+    """Build the CSV row for `day` from raw endpoint responses (missing ones are None)"""
+    user_stats = raw.get("user_summary")
+    rhr = get_safe(user_stats, 'restingHeartRate')
+    min_hr = get_safe(user_stats, 'minHeartRate')
+    max_hr = get_safe(user_stats, 'maxHeartRate')
+    stress_avg = get_safe(user_stats, 'averageStressLevel')
+    steps = get_safe(user_stats, 'totalSteps')
+    vo2_max = get_safe(user_stats, 'vo2Max')
+    spo2_avg = get_safe(user_stats, 'averageSpO2')
+    respiration_avg = get_safe(user_stats, 'averageRespirationValue')
+    cals_total = get_safe(user_stats, 'totalKilocalories')
+    cals_active = get_safe(user_stats, 'activeKilocalories')
+    cals_goal = get_safe(user_stats, 'dailyStepGoal')
+
+    # Dedicated endpoints for metrics missing from the summary
+    spo2_data = raw.get("spo2")
+    if spo2_avg is None and spo2_data:
+        spo2_avg = get_safe(spo2_data, 'averageSpO2')
+        if spo2_avg is None:
+            spo2_avg = get_safe(spo2_data, 'latestSpO2')
+        if spo2_avg is None:
+            spo2_avg = get_safe(spo2_data, 'latestSpO2Value')
+
+    resp_data = raw.get("respiration")
+    if respiration_avg is None and resp_data:
+        respiration_avg = get_safe(resp_data, 'avgWakingRespirationValue')
+        if respiration_avg is None:
+            respiration_avg = get_safe(resp_data, 'avgSleepRespirationValue')
+
+    max_metrics = raw.get("max_metrics")
+    if vo2_max is None and max_metrics:
+        # Look for VO2 max in various locations
+        for metric in max_metrics if isinstance(max_metrics, list) else [max_metrics]:
+            vo2_max = get_safe(metric, 'generic', 'vo2MaxPreciseValue') or get_safe(metric, 'vo2MaxPreciseValue')
+            if vo2_max:
+                break
+
+    # Sleep
+    sleep_data = raw.get("sleep")
+    sleep_total = _hours(get_safe(sleep_data, 'dailySleepDTO', 'sleepTimeSeconds'))
+    sleep_deep = _hours(get_safe(sleep_data, 'dailySleepDTO', 'deepSleepSeconds'))
+    sleep_rem = _hours(get_safe(sleep_data, 'dailySleepDTO', 'remSleepSeconds'))
+    sleep_score = get_safe(sleep_data, 'dailySleepDTO', 'sleepScores', 'overall', 'value')
+
+    # Training Status (try multiple paths)
+    t_status = raw.get("training_status")
+    training_status = get_safe(t_status, 'mostRecentTerminatedTrainingStatus', 'status')
+    if training_status is None:
+        training_status = get_safe(t_status, 'trainingStatusData', 'status')
+    if training_status is None:
+        training_status = get_safe(t_status, 'status')
+    if training_status is None and isinstance(t_status, list) and len(t_status) > 0:
+        training_status = get_safe(t_status[0], 'status')
+    # Also try to get VO2 max from training status if still missing
+    if vo2_max is None and t_status:
+        vo2_max = get_safe(t_status, 'vo2MaxValue')
+        if vo2_max is None:
+            vo2_max = get_safe(t_status, 'mostRecentTerminatedTrainingStatus', 'vo2MaxValue')
+
+    # Body Comp
+    weight, muscle_mass, fat_pct, water_pct = None, None, None, None
+    avg = get_safe(raw.get("body_composition"), 'totalAverage')
+    if isinstance(avg, dict):
+        w_g = avg.get('weight')
+        if w_g: weight = round(w_g / 453.592, 1)
+        m_g = avg.get('muscleMass')
+        if m_g: muscle_mass = round(m_g / 453.592, 1)
+        fat_pct = avg.get('bodyFat')
+        water_pct = avg.get('bodyWater')
+
+    # HRV (multiple value sources in order of preference)
+    h = raw.get("hrv")
+    hrv_status = get_safe(h, 'hrvSummary', 'status')
+    hrv_avg = get_safe(h, 'hrvSummary', 'weeklyAverage')
+    if hrv_avg is None:
+        hrv_avg = get_safe(h, 'hrvSummary', 'lastNightAvg')
+    if hrv_avg is None:
+        hrv_avg = get_safe(h, 'lastNightAvg')
+    if hrv_avg is None:
+        hrv_values = get_safe(h, 'hrvValues')
+        if hrv_values:
+            hrv_avg = get_safe(hrv_values[-1], 'hrvValue')
+    if hrv_avg is None:
+        hrv_avg = get_safe(h, 'hrvValue')
+
+    # Activities
+    activity_str = ""
+    activities = raw.get("activities")
+    if activities:
+        try:
+            activity_str = "; ".join(
+                f"{act['activityName']} ({act['activityType']['typeKey']})" for act in activities
+            )
+        except (KeyError, TypeError):
+            pass
+
+    return [
+        day,
+        weight, muscle_mass, fat_pct, water_pct,
+        sleep_total, sleep_deep, sleep_rem, sleep_score,
+        rhr, min_hr, max_hr, stress_avg, respiration_avg, spo2_avg,
+        vo2_max, training_status, hrv_status, hrv_avg,
+        steps, cals_goal, cals_total, cals_active,
+        activity_str
+    ]
+
+
+def contributions(day, raw, names):
+    """{endpoint: [CSV columns it changed]} for each of `names` present in raw"""
+    full = derive_row(day, raw)
+    result = {}
+    for name in names:
+        if name not in raw:
+            continue
+        without = derive_row(day, {k: v for k, v in raw.items() if k != name})
+        result[name] = [h for h, a, b in zip(HEADERS, full, without) if a != b]
+    return result
@@ -0,0 +1,133 @@
+import os
+import time
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import rate_limit
+
+# One pooled HTTP client for every Hevy API call (sync scripts, Gemini_Hevy,
+# the dashboard). A shared requests.Session keeps connections alive, every
+# request has a timeout, and transient failures are retried with jittered
+# exponential backoff, honouring Retry-After:
+#
+#   GET / PUT / DELETE   retried on 429, 5xx and connection errors / timeouts
+#   POST                 retried on 429 and connect failures only (a 5xx or
+#                        read timeout may already have created the routine)
+#
+#     response = hevy_client.get("/v1/workouts", params={"page": 1})
+#     response = hevy_client.post("/v1/routines", json=payload, api_key=key)
+#
+# Responses are returned as-is after the last attempt; callers keep checking
+# status_code like before.
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+BASE_URL = "https://api.hevyapp.com"
+TIMEOUT = float(os.getenv("HEVY_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("HEVY_MAX_RETRIES", "5"))
+BACKOFF = float(os.getenv("HEVY_BACKOFF", "1.0"))
+MAX_BACKOFF = float(os.getenv("HEVY_MAX_BACKOFF", "60"))
+# -------------------------------------
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+_session = None
+
+
+def session():
+    """The shared keep-alive session (created on first use)"""
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        s.headers.update({"Accept": "application/json"})
+        _session = s
+    return _session
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * (2 ** attempt)))
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return min(MAX_BACKOFF, max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return min(MAX_BACKOFF, max(0.0, (when - datetime.now(timezone.utc)).total_seconds()))
+
+
+def _retryable(method, response=None, error=None):
+    if response is not None:
+        if method in IDEMPOTENT:
+            return response.status_code in RETRY_STATUS
+        return response.status_code == 429
+    if method in IDEMPOTENT:
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+    return isinstance(error, requests.ConnectTimeout)
+
+
+def request(method, path, api_key=None, **kwargs):
+    """
+    Send one Hevy API request with retries. `path` is relative to BASE_URL
+    (full URLs are accepted too); `api_key` defaults to HEVY_API_KEY.
+    Raises requests exceptions once retries are exhausted.
+    """
+    method = method.upper()
+    url = path if path.startswith("http") else BASE_URL + path
+    headers = {"api-key": api_key or os.getenv("HEVY_API_KEY", "")}
+    if "json" in kwargs:
+        headers["Content-Type"] = "application/json"
+    headers.update(kwargs.pop("headers", {}))
+    kwargs.setdefault("timeout", TIMEOUT)
+
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limit.acquire("hevy")
+        try:
+            response = session().request(method, url, headers=headers, **kwargs)
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES or not _retryable(method, error=e):
+                raise
+            delay = _backoff(attempt)
+            print(f"   Hevy {method} {path} failed ({e.__class__.__name__}); retrying in {delay:.1f}s")
+        else:
+            if attempt == MAX_RETRIES or not _retryable(method, response=response):
+                return response
+            retry_after = _retry_after(response)
+            delay = _backoff(attempt) if retry_after is None else retry_after
+            print(f"   Hevy {method} {path} returned {response.status_code}; retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def get(path, **kwargs):
+    return request("GET", path, **kwargs)
+
+
+def post(path, **kwargs):
+    return request("POST", path, **kwargs)
+
+
+def put(path, **kwargs):
+    return request("PUT", path, **kwargs)
+
+
+def delete(path, **kwargs):
+    return request("DELETE", path, **kwargs)
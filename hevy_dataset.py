@@ -0,0 +1,200 @@
+import os
+import shutil
+from datetime import date
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+import migrate_data
+import cold_archive
+from muscle_groups import get_muscle_group, is_cardio_exercise
+
+# Month-partitioned Parquet copy of hevy_stats.csv for the dashboard.
+# Layout: <HEVY_DATASET_DIR>/month=YYYY-MM/sets.parquet
+# Columns are typed and the derived fields (muscle group, cardio flag, volume)
+# are computed once at write time, so the loader only opens the months that
+# overlap the selected date range.
+#
+# Build (or rebuild) from the CSV:
+#     python3 hevy_dataset.py
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+SAVE_PATH = os.getenv("SAVE_PATH")
+CSV_FILE = os.path.join(SAVE_PATH, "hevy_stats.csv") if SAVE_PATH else "hevy_stats.csv"
+DATASET_DIR = os.getenv("HEVY_DATASET_DIR", os.path.join(fitness_store.LOCAL_DATA_DIR, "hevy_sets"))
+# -------------------------------------
+
+CSV_HEADERS = ["Date", "Workout", "Exercise", "Set", "Weight (lbs)", "Reps", "RPE", "Type"]
+KEY = ["Date", "Workout", "Exercise", "Set"]
+
+SCHEMA = pa.schema([
+    ("Date", pa.date32()),
+    ("Workout", pa.dictionary(pa.int32(), pa.string())),
+    ("Exercise", pa.dictionary(pa.int32(), pa.string())),
+    ("Set", pa.int16()),
+    ("Weight (lbs)", pa.float32()),
+    ("Reps", pa.int32()),
+    ("RPE", pa.float32()),
+    ("Type", pa.dictionary(pa.int8(), pa.string())),
+    ("primary_muscle_group", pa.dictionary(pa.int8(), pa.string())),
+    ("is_cardio", pa.bool_()),
+    ("Volume", pa.float32()),
+])
+
+
+def dataset_exists():
+    return os.path.isdir(DATASET_DIR) and any(
+        name.startswith("month=") for name in os.listdir(DATASET_DIR)
+    )
+
+
+def _partition_path(month):
+    return os.path.join(DATASET_DIR, f"month={month}", "sets.parquet")
+
+
+def _prepare(df, date_format='mixed'):
+    """Type a raw CSV-shaped frame and add the derived columns"""
+    df = df[CSV_HEADERS].copy()
+    df['Date'] = pd.to_datetime(df['Date'], format=date_format).dt.date
+    for col in ("Set", "Weight (lbs)", "Reps", "RPE"):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['Set'] = df['Set'].fillna(0).astype('int16')
+    df['Reps'] = df['Reps'].fillna(0).astype('int32')
+    for col in ("Workout", "Exercise", "Type"):
+        df[col] = df[col].fillna("").astype(str)
+
+    # Derived once per distinct exercise instead of once per set
+    names = df['Exercise'].unique()
+    df['primary_muscle_group'] = df['Exercise'].map({n: get_muscle_group(n) for n in names})
+    df['is_cardio'] = df['Exercise'].map({n: is_cardio_exercise(n) for n in names}).astype(bool)
+    df['Volume'] = df['Weight (lbs)'].fillna(0) * df['Reps']
+    return df
+
+
+def _write_partition(month, df):
+    """Atomically replace one month's file"""
+    path = _partition_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = df.drop_duplicates(subset=KEY, keep='last').sort_values(KEY)
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def _read_partition(month):
+    path = _partition_path(month)
+    if not os.path.isfile(path):
+        return None
+    return pq.read_table(path).to_pandas(date_as_object=True)
+
+
+def append_rows(rows, seed=True):
+    """
+    Merge new CSV-ordered rows into their month partitions.
+    On first use the dataset is built from the whole CSV instead (which already
+    contains the new rows), so it never starts out with a partial history.
+    """
+    if seed and not dataset_exists():
+        return rebuild_from_csv()
+
+    new_df = _prepare(pd.DataFrame([list(r)[:len(CSV_HEADERS)] for r in rows], columns=CSV_HEADERS))
+    months = pd.to_datetime(new_df['Date']).dt.strftime('%Y-%m')
+    for month, part in new_df.groupby(months):
+        existing = _read_partition(month)
+        if existing is not None:
+            existing = existing.astype({c: str for c in ("Workout", "Exercise", "Type", "primary_muscle_group")})
+            part = pd.concat([existing, part], ignore_index=True)
+        _write_partition(month, part)
+    return len(new_df)
+
+
+def rebuild_from_csv(csv_path=None):
+    """Rewrite every partition from hevy_stats.csv"""
+    csv_path = csv_path or staging_cache.read_path(CSV_FILE)
+    archived = cold_archive.read_frame(CSV_FILE, "hevy_sets")
+    if not os.path.isfile(csv_path) and archived is None:
+        print(f"   {csv_path} not found, nothing to build.")
+        return 0
+
+    frames = []
+    if archived is not None:
+        frames.append(_prepare(archived, date_format='%Y-%m-%d'))
+    if os.path.isfile(csv_path):
+        if migrate_data.is_canonical(csv_path):
+            # Migrated file: fixed dtypes and ISO dates, no format inference
+            raw = pd.read_csv(csv_path, dtype=migrate_data.csv_dtypes("hevy_sets"))
+            frames.append(_prepare(raw, date_format='%Y-%m-%d'))
+        else:
+            frames.append(_prepare(pd.read_csv(csv_path)))
+    df = pd.concat(frames, ignore_index=True)
+    if os.path.isdir(DATASET_DIR):
+        shutil.rmtree(DATASET_DIR)
+
+    months = pd.to_datetime(df['Date']).dt.strftime('%Y-%m')
+    for month, part in df.groupby(months):
+        _write_partition(month, part)
+    return len(df)
+
+
+def _months_between(start, end):
+    """YYYY-MM keys for every month overlapping [start, end]"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+def read_range(start=None, end=None):
+    """
+    Load sets for an inclusive ISO date window, opening only the overlapping
+    month partitions. Returns None when the dataset has not been built.
+    """
+    if not dataset_exists():
+        return None
+
+    available = sorted(
+        name.split("=", 1)[1] for name in os.listdir(DATASET_DIR) if name.startswith("month=")
+    )
+    start_d = date.fromisoformat(str(start)[:10]) if start else None
+    end_d = date.fromisoformat(str(end)[:10]) if end else None
+    if start_d or end_d:
+        wanted = set(_months_between(
+            start_d or date.fromisoformat(available[0] + "-01"),
+            end_d or date.fromisoformat(available[-1] + "-01"),
+        ))
+        available = [m for m in available if m in wanted]
+
+    paths = [_partition_path(m) for m in available if os.path.isfile(_partition_path(m))]
+    if not paths:
+        return pd.DataFrame({name: pd.Series(dtype=object) for name in SCHEMA.names})
+
+    filters = []
+    if start_d:
+        filters.append(("Date", ">=", start_d))
+    if end_d:
+        filters.append(("Date", "<=", end_d))
+    # partitioning=None: the month=YYYY-MM folders must not come back as an extra column
+    table = pq.read_table(paths, filters=filters or None, partitioning=None)
+    # Dictionary columns arrive as pandas categoricals
+    return table.to_pandas(date_as_object=False)
+
+
+def main():
+    print("--- BUILDING HEVY DATASET ---")
+    print(f"Source: {CSV_FILE}")
+    print(f"Target: {DATASET_DIR}")
+    total = rebuild_from_csv()
+    print(f"--- COMPLETE. {total} sets written. ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+import fitness_store
+import hevy_client
+
+# Cursor over Hevy's workout events feed (/v1/workouts/events), which lists
+# every workout updated or deleted since a timestamp:
+#
+#   {"type": "updated", "workout": {...full workout...}}
+#   {"type": "deleted", "id": "...", "deleted_at": "..."}
+#
+# daily_hevy_workouts.py reads the feed from the stored cursor, applies it and
+# only then moves the cursor forward, so a failed run is simply retried from the
+# same point and a backlog after downtime is caught up on the next run. The new
+# cursor is the run's start time minus OVERLAP_MINUTES; events replayed by the
+# overlap are no-ops (unchanged content hash / already deleted).
+#
+#   data/hevy_events.json   {"since": "2025-01-01T00:00:00Z", "synced_at": "..."}
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+# Set HEVY_EVENT_SYNC=False to go back to re-reading the newest page every hour
+EVENT_SYNC = os.getenv("HEVY_EVENT_SYNC", "True").lower() == "true"
+# How far back the first run (no cursor yet) reads the feed
+BOOTSTRAP_DAYS = int(os.getenv("HEVY_EVENTS_BOOTSTRAP_DAYS", "2"))
+# Re-read this much before the last run's start, covering clock skew and late writes
+OVERLAP_MINUTES = int(os.getenv("HEVY_EVENTS_OVERLAP_MINUTES", "10"))
+CURSOR_FILE = os.path.join(fitness_store.LOCAL_DATA_DIR, "hevy_events.json")
+# -------------------------------------
+
+PAGE_SIZE = 10  # API maximum
+
+
+def _iso(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def load_cursor():
+    try:
+        with open(CURSOR_FILE, mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cursor(since):
+    os.makedirs(os.path.dirname(CURSOR_FILE), exist_ok=True)
+    tmp_path = CURSOR_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump({"since": since, "synced_at": _iso(datetime.now(timezone.utc))}, f, indent=2)
+    os.replace(tmp_path, CURSOR_FILE)
+
+
+def since(state=None):
+    """Where the next read starts: the stored cursor, or BOOTSTRAP_DAYS ago"""
+    state = load_cursor() if state is None else state
+    return state.get("since") or _iso(datetime.now(timezone.utc) - timedelta(days=BOOTSTRAP_DAYS))
+
+
+def next_cursor(started):
+    """Cursor to store after a complete run that started at `started` (aware datetime)"""
+    return _iso(started - timedelta(minutes=OVERLAP_MINUTES))
+
+
+def fetch(since, api_key=None):
+    """Every event since `since` (all pages). Raises on an error response, so a partial feed is never applied."""
+    events, page = [], 1
+    while True:
+        response = hevy_client.get(
+            "/v1/workouts/events", api_key=api_key,
+            params={"page": page, "pageSize": PAGE_SIZE, "since": since},
+        )
+        if response.status_code == 404 and page > 1:
+            break  # Past the last page
+        response.raise_for_status()
+        data = response.json()
+        events.extend(data.get('events', []))
+        if not data.get('events') or page >= int(data.get('page_count') or page):
+            break
+        page += 1
+    return events
+
+
+def event_id(event):
+    if event.get('type') == 'deleted':
+        return event.get('id')
+    return (event.get('workout') or {}).get('id')
+
+
+def _event_time(event):
+    if event.get('type') == 'deleted':
+        return event.get('deleted_at') or ''
+    workout = event.get('workout') or {}
+    return workout.get('updated_at') or workout.get('created_at') or ''
+
+
+def latest(events):
+    """{workout id: its most recent event}, so a workout edited then deleted is only deleted"""
+    result = {}
+    for event in events:
+        workout_id = event_id(event)
+        if not workout_id:
+            continue
+        if workout_id not in result or _event_time(event) >= _event_time(result[workout_id]):
+            result[workout_id] = event
+    return result
@@ -1,10 +1,22 @@
 import garth
 from garminconnect import Garmin
 from datetime import date, timedelta, datetime
-import csv
 import os
-import time
-import random
+import json
+import argparse
+import signal
+from concurrent.futures import ThreadPoolExecutor
+import fitness_store
+import csv_upsert
+import staging_cache
+import garmin_metrics
+import garmin_bulk
+from rate_limit import TokenBucket
+
+try:
+    import garmin_daily_mmap  # Optional: needs numpy
+except ImportError:
+    garmin_daily_mmap = None
 
 import os
 import sys
@@ -27,9 +39,13 @@ if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
 
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
@@ -46,19 +62,77 @@ else:
     print("WARNING: SAVE_PATH not set in .env. Using current folder.")
     CSV_FILE = "garmin_history.csv"
 
-TOKEN_DIR = ".garth"
-START_DATE = "2025-12-12"       # <--- CHANGE THIS DATE to how far back you want to go
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
+# Default first day; override per run with --start (and --end)
+START_DATE = os.getenv("GARMIN_HISTORY_START", "2025-12-12")
+
+# Completed days, so an interrupted backfill resumes where it stopped
+CHECKPOINT_FILE = os.path.join(fitness_store.LOCAL_DATA_DIR, "garmin_history.checkpoint.json")
+
+# Days fetched concurrently, and the request rate they share (calls/second)
+WORKERS = int(os.getenv("GARMIN_HISTORY_WORKERS", "4"))
+RATE_LIMIT = float(os.getenv("GARMIN_RATE_LIMIT", "2.0"))
+RATE_BURST = int(os.getenv("GARMIN_RATE_BURST", "4"))
+# Merge finished days into the CSV (and checkpoint them) every this many days
+FLUSH_EVERY = int(os.getenv("GARMIN_HISTORY_FLUSH_DAYS", "50"))
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(CSV_FILE)
 # ---------------------
 
-def get_safe(data, *keys):
+def load_checkpoint():
     try:
-        for key in keys:
-            data = data[key]
-        return data
-    except (KeyError, TypeError, AttributeError):
-        return None
+        with open(CHECKPOINT_FILE, mode='r', encoding='utf-8') as f:
+            return set(json.load(f).get("completed", []))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_checkpoint(completed):
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump({"updated": datetime.now().isoformat(timespec='seconds'),
+                   "completed": sorted(completed)}, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def _has_value(value):
+    if isinstance(value, dict):
+        return any(_has_value(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_value(v) for v in value)
+    return value not in (None, "")
+
+
+def has_data(raw):
+    """True if the user summary or at least one endpoint returned an actual value.
+
+    Looks inside the payloads: the bulk pivots emit a dict for every date a range
+    call lists, with None fields on days the watch recorded nothing.
+    """
+    return bool(raw) and any(_has_value(value) for value in raw.values())
+
+
+def _terminate(signum, frame):
+    # SIGTERM (systemd stop, kill) takes the same path as Ctrl+C
+    raise KeyboardInterrupt
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill garmin_history.csv")
+    parser.add_argument("--start", default=START_DATE, help=f"first day, YYYY-MM-DD (default {START_DATE})")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD (default yesterday)")
+    parser.add_argument("--refetch", action="store_true",
+                        help="fetch every day in the window, even ones already checkpointed or in the CSV")
+    parser.add_argument("--bulk", action="store_true",
+                        help=f"use date-range endpoints ({garmin_bulk.WINDOW_DAYS}-day windows, far fewer calls, fewer fields)")
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
+
     # 1. Login
     try:
         garth.resume(TOKEN_DIR)
@@ -72,134 +146,110 @@ def main():
         print(f"Login failed: {e}")
         return
 
-    # 2. Setup Date Loop
-    start = date.fromisoformat(START_DATE)
-    end = date.today() - timedelta(days=1) # Stop at yesterday (daily script handles today)
-    delta = timedelta(days=1)
-    
-    current_date = start
+    # 2. Setup Date Window
+    start = date.fromisoformat(args.start)
+    # Stop at yesterday by default (daily script handles today)
+    end = date.fromisoformat(args.end) if args.end else date.today() - timedelta(days=1)
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+    # 3. Resume: skip days already checkpointed or already in the CSV
+    completed = load_checkpoint()
+    if not args.refetch:
+        done = set(completed)
+        if os.path.isfile(CSV_FILE) and os.path.getsize(CSV_FILE) > 0:
+            done.update(csv_upsert.load_index(CSV_FILE)["offsets"])
+        skipped = sum(1 for d in days if d in done)
+        days = [d for d in days if d not in done]
+        if skipped:
+            print(f"Resuming: {skipped} days already done, {len(days)} to fetch.")
     
     print(f"--- STARTING HISTORY PULL ---")
-    print(f"From {start} to {end}")
-    print("Press Ctrl+C to stop at any time.")
-    
-    # 3. Create CSV Header
-    headers = [
-        "Date", 
-        "Weight (lbs)", "Muscle Mass (lbs)", "Body Fat %", "Water %",
-        "Sleep Total (hr)", "Sleep Deep (hr)", "Sleep REM (hr)", "Sleep Score",
-        "RHR", "Min HR", "Max HR", "Avg Stress", "Respiration", "SpO2",
-        "VO2 Max", "Training Status", "HRV Status", "HRV Avg",
-        "Steps", "Step Goal", "Cals Total", "Cals Active",
-        "Activities"
-    ]
+    print(f"From {start} to {end} ({WORKERS} workers, {RATE_LIMIT} requests/s)")
+    print("Press Ctrl+C to stop at any time; the next run picks up where this one stopped.")
     
-    # Only write header if file doesn't exist
-    if not os.path.isfile(CSV_FILE):
-        with open(CSV_FILE, mode='w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
+    headers = garmin_metrics.HEADERS
+
+    # 4. Fetch concurrently, merge and write once
+    # Workers share one token bucket, so the request rate stays the same however
+    # many days (or bulk windows) are in flight. Finished rows are collected and
+    # merged into the CSV in one sorted write every FLUSH_EVERY days, and again
+    # however the run ends (finished, Ctrl+C, SIGTERM or an error); a day only
+    # counts as done once its row is on file.
+    limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
 
-    # 4. The Loop
-    while current_date <= end:
-        day_str = current_date.isoformat()
-        print(f"Processing {day_str}...", end="", flush=True)
+    if args.bulk:
+        tasks = garmin_bulk.windows(days)
+        print(f"Bulk mode: {len(tasks)} windows x {len(garmin_bulk.RANGE_ENDPOINTS)} range calls")
+
+        def fetch_rows(window):
+            first, last = (date.fromisoformat(d) for d in window)
+            raw_days = garmin_bulk.fetch_window(api, window[0], window[1], limiter=limiter)
+            window_days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+            return [(d, raw_days.get(d, {})) for d in window_days]
+    else:
+        tasks = days
 
+        def fetch_rows(day_str):
+            return [(day_str, garmin_metrics.fetch_day(api, day_str, limiter=limiter))]
+
+    finished = {}
+    pending = 0
+
+    def write_rows():
+        if not finished:
+            return
+        print(f"Writing {len(finished)} days to {CSV_FILE}...")
+        csv_upsert.upsert_rows(CSV_FILE, headers, finished)
+        staging_cache.mark_dirty(CSV_FILE)
+        completed.update(finished)
+        save_checkpoint(completed)
+
+        rows = [finished[d] for d in sorted(finished)]
         try:
-            # --- FETCH DATA (Same logic as Daily Script) ---
-            # Core
-            try:
-                user_stats = api.get_user_summary(day_str)
-                rhr = get_safe(user_stats, 'restingHeartRate')
-                min_hr = get_safe(user_stats, 'minHeartRate')
-                max_hr = get_safe(user_stats, 'maxHeartRate')
-                stress = get_safe(user_stats, 'averageStressLevel')
-                steps = get_safe(user_stats, 'totalSteps')
-                vo2 = get_safe(user_stats, 'vo2Max')
-                spo2 = get_safe(user_stats, 'averageSpO2')
-                resp = get_safe(user_stats, 'averageRespirationValue')
-                cals_tot = get_safe(user_stats, 'totalKilocalories')
-                cals_act = get_safe(user_stats, 'activeKilocalories')
-                cals_goal = get_safe(user_stats, 'dailyStepGoal')
-            except:
-                rhr, min_hr, max_hr, stress, steps, vo2, spo2, resp, cals_tot, cals_act, cals_goal = [None]*11
-
-            # Sleep
-            try:
-                sleep_data = api.get_sleep_data(day_str)
-                s_tot = get_safe(sleep_data, 'dailySleepDTO', 'sleepTimeSeconds')
-                s_deep = get_safe(sleep_data, 'dailySleepDTO', 'deepSleepSeconds')
-                s_rem = get_safe(sleep_data, 'dailySleepDTO', 'remSleepSeconds')
-                s_score = get_safe(sleep_data, 'dailySleepDTO', 'sleepScores', 'overall', 'value')
-                if s_tot: s_tot = round(s_tot / 3600, 2)
-                if s_deep: s_deep = round(s_deep / 3600, 2)
-                if s_rem: s_rem = round(s_rem / 3600, 2)
-            except:
-                s_tot, s_deep, s_rem, s_score = None, None, None, None
-
-            # Training Status
-            t_status = None
-            try:
-                if hasattr(api, 'get_training_status'):
-                    ts = api.get_training_status(day_str)
-                    t_status = get_safe(ts, 'mostRecentTerminatedTrainingStatus', 'status')
-            except:
-                pass
-
-            # Body Comp
-            wt, mus, fat, h2o = None, None, None, None
-            try:
-                bc = api.get_body_composition(day_str)
-                if bc and 'totalAverage' in bc:
-                    avg = bc['totalAverage']
-                    if avg.get('weight'): wt = round(avg.get('weight')/453.592, 1)
-                    if avg.get('muscleMass'): mus = round(avg.get('muscleMass')/453.592, 1)
-                    fat = avg.get('bodyFat')
-                    h2o = avg.get('bodyWater')
-            except:
-                pass
-
-            # HRV
-            hrv_s, hrv_a = None, None
-            try:
-                if hasattr(api, 'get_hrv_data'):
-                    h = api.get_hrv_data(day_str)
-                else:
-                    h = api.connectapi(f"/hrv-service/hrv/daily/{day_str}")
-                hrv_s = get_safe(h, 'hrvSummary', 'status')
-                hrv_a = get_safe(h, 'hrvSummary', 'weeklyAverage')
-            except:
-                pass
-
-            # Activities
-            act_str = ""
+            fitness_store.upsert_rows("garmin_daily", rows)
+        except Exception as e:
+            print(f"Warning: Could not update fitness store: {e}")
+        if garmin_daily_mmap:
             try:
-                acts = api.get_activities_by_date(day_str, day_str)
-                if acts:
-                    names = [f"{a['activityName']} ({a['activityType']['typeKey']})" for a in acts]
-                    act_str = "; ".join(names)
-            except:
-                pass
-
-            # Write Row
-            row = [
-                day_str, wt, mus, fat, h2o, s_tot, s_deep, s_rem, s_score,
-                rhr, min_hr, max_hr, stress, resp, spo2, vo2, t_status, hrv_s, hrv_a,
-                steps, cals_goal, cals_tot, cals_act, act_str
-            ]
-            
-            with open(CSV_FILE, mode='a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(row)
-            
-            print(" Done.")
+                garmin_daily_mmap.upsert_rows(rows)
+            except Exception as e:
+                print(f"Warning: Could not update mmap store: {e}")
+        finished.clear()
 
-        except Exception as e:
-            print(f" Failed ({e})")
+    signal.signal(signal.SIGTERM, _terminate)
+    executor = ThreadPoolExecutor(max_workers=WORKERS)
+    interrupted = False
+    try:
+        futures = [(task, executor.submit(fetch_rows, task)) for task in tasks]
+        for task, future in futures:
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Processing {task}... Failed ({e})")
+                continue
 
-        # Increment Date & Sleep to be nice to API
-        current_date += delta
-        time.sleep(random.uniform(1.5, 3.0)) # Sleep 1.5 to 3 seconds
+            for day_str, raw in results:
+                # Every endpoint failed, or no range call had a value for the day:
+                # leave it pending (a later run, or a per-day run, retries it)
+                if not has_data(raw):
+                    print(f"Processing {day_str}... No data, left for the next run.")
+                    pending += 1
+                    continue
+                finished[day_str] = garmin_metrics.derive_row(day_str, raw)
+                print(f"Processing {day_str}... Done.")
+            if len(finished) >= FLUSH_EVERY:
+                write_rows()
+    except KeyboardInterrupt:
+        print("\nStopping: cancelling queued days...")
+        interrupted = True
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        write_rows()
+    if interrupted:
+        print(f"Checkpoint saved ({len(completed)} days done).")
+        return
+    if pending:
+        print(f"{pending} days returned no data; re-run to retry them.")
 
     print("--- HISTORY PULL COMPLETE ---")
 
@@ -1,13 +1,25 @@
 import garth
 from garminconnect import Garmin
-from datetime import date, timedelta
+from datetime import date, timedelta, datetime
 import csv
 import os
 import sys
 import platform
 import json
-import time
+import argparse
+import bisect
 from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+import raw_archive
+import activity_details
+import rate_limit
+from rate_limit import TokenBucket
+
+try:
+    import activity_streams  # Optional: needs numpy
+except ImportError:
+    activity_streams = None
 
 # 1. Load configuration
 load_dotenv()
@@ -22,22 +34,204 @@ is_windows = platform.system() == "Windows"
 if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
     print("Note: Mount check skipped on Windows (not applicable).")
 
 # --- CONFIGURATION ---
-TOKEN_DIR = ".garth"
+TOKEN_DIR = os.getenv("GARMIN_TOKEN_DIR", ".garth")
 SAVE_PATH = os.getenv("SAVE_PATH")
-CSV_FILE = os.path.join(SAVE_PATH, "garmin_runs.csv") if SAVE_PATH else "garmin_runs.csv"
+REMOTE_CSV = os.path.join(SAVE_PATH, "garmin_runs.csv") if SAVE_PATH else "garmin_runs.csv"
 START_DATE = "2023-01-01" 
+WINDOW_DAYS = 31
+# A window fetched less than this many days after it ended is fetched again
+# (late syncs, edited activities)
+SETTLE_DAYS = int(os.getenv("GARMIN_RUNS_SETTLE_DAYS", "7"))
+# Shared request rate for the window and deep-fetch calls (calls/second)
+RATE_LIMIT = float(os.getenv("GARMIN_RATE_LIMIT", "2.0"))
+RATE_BURST = int(os.getenv("GARMIN_RATE_BURST", "4"))
+
+# Which windows were fetched when, so a re-run only fetches missing/stale ones
+STATE_FILE = os.path.join(fitness_store.LOCAL_DATA_DIR, "garmin_runs_history.json")
+WINDOWS_ENDPOINT = "garmin_runs/activities"
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(REMOTE_CSV)
 # ---------------------
 
+HEADERS = fitness_store.csv_headers("garmin_runs")
+
+# Merge mode (default): existing rows, including ones daily_garmin_runs.py
+# added, are kept. Only 31-day windows that were never fetched, or were fetched
+# before they had settled, are downloaded. On the first run (no window state,
+# e.g. right after upgrading) settled windows the CSV already has runs in are
+# recorded as done instead, so the upgrade does not refetch the whole history
+# (and its HR zones); --full still does. Each window's activity list is
+# archived, so when HEADERS changes (a new field) rows are re-derived from the
+# archive without a re-download. Everything is merged, sorted and written once;
+# runs in years sealed by cold_archive.py are never written back to the hot file.
+#
+#     python3 history_garmin_runs.py                # merge missing/stale windows
+#     python3 history_garmin_runs.py --full         # refetch every window (still merges)
+#     python3 history_garmin_runs.py --start 2024-01-01 --end 2024-06-30
+
+
+def activity_row(act, zones=None):
+    """One garmin_runs.csv row from an activity summary (zones: fetched HR-zone seconds)"""
+    start_local = act.get('startTimeLocal', '')
+    date_str = start_local[:10]
+    time_str = start_local[11:]
+
+    # Extract Data
+    title = act.get('activityName', 'Run')
+    atype_key = act.get('activityType', {}).get('typeKey', 'running')
+
+    dur = act.get('duration', 0)
+    elapsed = act.get('elapsedDuration', 0)
+    moving = act.get('movingDuration', 0)
+    avg_spd = act.get('averageSpeed', 0)
+    avg_hr = act.get('averageHR')
+    max_hr = act.get('maxHR')
+    steps = act.get('steps')
+
+    # Sets/Reps (JSON dump complex lists)
+    summ_sets = json.dumps(act.get('summarizedExerciseSets', []))
+    t_sets = act.get('totalSets')
+    a_sets = act.get('activeSets')
+    t_reps = act.get('totalReps')
+
+    te_lbl = act.get('trainingEffectLabel')
+    load = act.get('activityTrainingLoad')
+    min_lap = act.get('minActivityLapDuration')
+
+    # Zones
+    z1 = act.get('hrTimeInZone_1')
+    z2 = act.get('hrTimeInZone_2')
+    z3 = act.get('hrTimeInZone_3')
+    z4 = act.get('hrTimeInZone_4')
+    if zones:
+        z1, z2, z3, z4 = zones
+
+    return [
+        date_str, time_str, title, atype_key,
+        dur, elapsed, moving, avg_spd, avg_hr, max_hr, steps,
+        summ_sets, t_sets, a_sets, t_reps,
+        te_lbl, load, min_lap, z1, z2, z3, z4
+    ]
+
+
+def _as_csv(row):
+    return ["" if v is None else str(v) for v in row]
+
+
+def _key(row):
+    return f"{fitness_store.normalize_date(row[0]) or row[0]}_{row[1]}" if len(row) > 1 else None
+
+
+def windows(start, end):
+    """WINDOW_DAYS-long [start, end] windows (inclusive), aligned on the start date so re-runs line up"""
+    result = []
+    current = start
+    while current <= end:
+        chunk_end = min(current + timedelta(days=WINDOW_DAYS - 1), end)
+        result.append((current.isoformat(), chunk_end.isoformat()))
+        current = chunk_end + timedelta(days=1)
+    return result
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, mode='r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("windows", {})
+    return state
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def is_settled(entry, window_end):
+    """Fetched at least SETTLE_DAYS after the window ended (or recorded from the CSV)"""
+    if entry and entry.get("source") == "csv":
+        return True
+    fetched = entry.get("fetched") if entry else None
+    if not fetched:
+        return False
+    return date.fromisoformat(fetched[:10]) >= date.fromisoformat(window_end) + timedelta(days=SETTLE_DAYS)
+
+
+def load_existing():
+    """{Date_Time: row} from the hot CSV, plus the keys of archived years (coverage only)"""
+    rows = {}
+    if os.path.isfile(CSV_FILE):
+        with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            for row in reader:
+                if _key(row):
+                    rows[_key(row)] = row
+    archived = {_key(row) for row in fitness_store._archived_rows(REMOTE_CSV, "garmin_runs")}
+    return rows, archived
+
+
+def seed_from_csv(state, all_windows, rows):
+    """
+    First run without window state (e.g. after upgrading from the import that
+    rewrote the whole file): record the settled windows the CSV already has runs
+    in as source "csv", so they are not all downloaded again. Returns how many.
+    """
+    days = sorted({fitness_store.normalize_date(row[0]) or row[0] for row in rows.values()})
+    cutoff = (date.today() - timedelta(days=SETTLE_DAYS)).isoformat()
+    seeded = 0
+    for w_start, w_end in all_windows:
+        i = bisect.bisect_left(days, w_start)
+        if w_end <= cutoff and i < len(days) and days[i] <= w_end:
+            state["windows"][w_start] = {"end": w_end, "fetched": None, "source": "csv"}
+            seeded += 1
+    return seeded
+
+
+def plan(state, all_windows, full=False):
+    """
+    Windows to download: never fetched or not settled (all of them with --full).
+    Apart from the one-off seed_from_csv, runs already in the CSV don't count:
+    daily_garmin_runs.py may have added a few runs to a window that is otherwise
+    missing, so an unrecorded window is fetched once.
+    """
+    todo = []
+    for w_start, w_end in all_windows:
+        entry = state["windows"].get(w_start)
+        if full or entry is None or entry.get("end") != w_end or not is_settled(entry, w_end):
+            todo.append((w_start, w_end))
+    return todo
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill garmin_runs.csv (merges into the existing file)")
+    parser.add_argument("--start", default=START_DATE, help=f"first day, YYYY-MM-DD (default {START_DATE})")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD (default today)")
+    parser.add_argument("--full", action="store_true", help="download every window again (rows are still merged)")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     print("1. Loading tokens...")
     garth.resume(TOKEN_DIR)
     api = Garmin("dummy", "dummy")
@@ -47,98 +241,104 @@ def main():
     except:
         pass
 
-    print(f"2. Fetching runs from {START_DATE}...")
-
     # Ensure folder exists
     folder_path = os.path.dirname(CSV_FILE)
-    if not os.path.exists(folder_path):
+    if folder_path and not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
-    # WRITE HEADERS (Overwrite mode for fresh history)
-    with open(CSV_FILE, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-             "Date", "Time", "activityName", "activityType_typeKey", 
-             "duration", "elapsedDuration", "movingDuration", 
-             "averageSpeed", "averageHR", "maxHR", "steps", 
-             "summarizedExerciseSets", "totalSets", "activeSets", "totalReps", 
-             "trainingEffectLabel", "activityTrainingLoad", "minActivityLapDuration", 
-             "hrTimeInZone_1", "hrTimeInZone_2", "hrTimeInZone_3", "hrTimeInZone_4"
-        ])
-
-    start = date.fromisoformat(START_DATE)
-    end = date.today()
-    current = start
-    total_saved = 0
-
-    while current < end:
-        chunk_end = current + timedelta(days=30)
-        if chunk_end > end: chunk_end = end
-        
-        print(f"   Processing {current} to {chunk_end}...", end="", flush=True)
-        
-        try:
-            activities = api.get_activities_by_date(current.isoformat(), chunk_end.isoformat(), "running")
-            
-            new_rows = []
-            if activities:
-                for act in activities:
-                    start_local = act.get('startTimeLocal', '')
-                    date_str = start_local[:10]
-                    time_str = start_local[11:]
-                    
-                    # Extract Data
-                    title = act.get('activityName', 'Run')
-                    atype_key = act.get('activityType', {}).get('typeKey', 'running')
-                    
-                    dur = act.get('duration', 0)
-                    elapsed = act.get('elapsedDuration', 0)
-                    moving = act.get('movingDuration', 0)
-                    avg_spd = act.get('averageSpeed', 0)
-                    avg_hr = act.get('averageHR')
-                    max_hr = act.get('maxHR')
-                    steps = act.get('steps')
-                    
-                    # Sets/Reps (JSON dump complex lists)
-                    summ_sets = json.dumps(act.get('summarizedExerciseSets', []))
-                    t_sets = act.get('totalSets')
-                    a_sets = act.get('activeSets')
-                    t_reps = act.get('totalReps')
-                    
-                    te_lbl = act.get('trainingEffectLabel')
-                    load = act.get('activityTrainingLoad')
-                    min_lap = act.get('minActivityLapDuration')
-                    
-                    # Zones
-                    z1 = act.get('hrTimeInZone_1')
-                    z2 = act.get('hrTimeInZone_2')
-                    z3 = act.get('hrTimeInZone_3')
-                    z4 = act.get('hrTimeInZone_4')
-
-                    new_rows.append([
-                        date_str, time_str, title, atype_key,
-                        dur, elapsed, moving, avg_spd, avg_hr, max_hr, steps,
-                        summ_sets, t_sets, a_sets, t_reps,
-                        te_lbl, load, min_lap, z1, z2, z3, z4
-                    ])
-            
-            if new_rows:
-                new_rows.sort(key=lambda x: x[0])
-                with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(new_rows)
-                print(f" Saved {len(new_rows)}.")
-                total_saved += len(new_rows)
-            else:
-                print(" No data.")
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end) if args.end else date.today()
+    all_windows = windows(start, end)
 
-        except Exception as e:
-            print(f" Error: {e}")
+    rows, archived_keys = load_existing()
+    state = load_state()
+    if not state["windows"] and not args.full:
+        seeded = seed_from_csv(state, all_windows, rows)
+        if seeded:
+            print(f"   No window state yet: {seeded} settled windows with runs on file count as done (--full refetches them)")
+    todo = plan(state, all_windows, args.full)
+    print(f"2. {len(rows)} runs on file; {len(todo)} of {len(all_windows)} windows to fetch from {start}...")
 
-        current = chunk_end + timedelta(days=1)
-        time.sleep(1) 
+    merged = dict(rows)
+    changed = 0
+
+    def merge(new_rows):
+        nonlocal changed
+        for row in new_rows:
+            row = _as_csv(row)
+            key = _key(row)
+            if key in archived_keys:
+                continue  # Sealed year: its rows stay in the cold archive
+            old = merged.get(key)
+            if old:
+                # Keep values the new row lacks (e.g. zones an earlier deep fetch filled in)
+                row = [o if n == "" else n for o, n in zip(old + [""] * len(row), row)]
+            if row != old:
+                merged[key] = row
+                changed += 1
+
+    # A new field: re-derive every archived window, no network needed
+    if state.get("headers") != HEADERS:
+        rederived = 0
+        for _, _, activities in raw_archive.iter_items(WINDOWS_ENDPOINT):
+            merge(activity_row(act) for act in activities or [])
+            rederived += 1
+        if rederived:
+            print(f"   Columns changed: re-derived {rederived} archived windows")
+        state["headers"] = HEADERS
+
+    limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+    if activity_details.DEEP_FETCH:
+        print(f"   Deep fetch on: HR zones for runs missing them ({activity_details.WORKERS} workers)")
+
+    try:
+        for w_start, w_end in todo:
+            print(f"   Processing {w_start} to {w_end}...", end="", flush=True)
+            try:
+                rate_limit.acquire("garmin", limiter)
+                activities = api.get_activities_by_date(w_start, w_end, "running") or []
+            except Exception as e:
+                print(f" Error: {e}")
+                continue
+            try:
+                raw_archive.put(WINDOWS_ENDPOINT, w_start, activities, item=w_end)
+            except Exception as e:
+                print(f" (archive failed: {e})", end="")
+
+            # Zones come from the per-activity cache after the first run
+            zones = {}
+            if activities and activity_details.DEEP_FETCH:
+                zones = activity_details.fill_zones(api, activities, limiter=limiter)
+            if activities and activity_streams and activity_streams.INGEST:
+                try:
+                    activity_streams.ingest(api, activities, limiter=limiter)
+                except Exception as e:
+                    print(f" (streams failed: {e})", end="")
+
+            merge(activity_row(act, zones.get(act.get('activityId'))) for act in activities)
+            state["windows"][w_start] = {"end": w_end, "fetched": datetime.now().isoformat(timespec='seconds')}
+            print(f" {len(activities)} runs.")
+    except KeyboardInterrupt:
+        print("\nStopping: writing what was fetched so far...")
+
+    # 3. Merge, sort and write once
+    if changed:
+        ordered = sorted(merged.values(), key=lambda r: (fitness_store.normalize_date(r[0]) or r[0], r[1]))
+        tmp_path = CSV_FILE + ".tmp"
+        with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS)
+            writer.writerows(ordered)
+        os.replace(tmp_path, CSV_FILE)
+        staging_cache.mark_dirty(CSV_FILE)
+
+        try:
+            fitness_store.rebuild_from_csv("garmin_runs")
+        except Exception as e:
+            print(f"   Warning: Could not update fitness store: {e}")
+    save_state(state)
 
-    print(f"--- COMPLETE. Saved {total_saved} records. ---")
+    print(f"--- COMPLETE. {changed} runs added or updated, {len(merged)} on file. ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,17 @@
-import requests
 import csv
 import os
 import time
 from datetime import datetime
 from dotenv import load_dotenv  # <--- Loads the secret file
+import fitness_store
+import staging_cache
+import raw_archive
+import hevy_client
+
+try:
+    import hevy_dataset  # Optional: needs pandas + pyarrow
+except ImportError:
+    hevy_dataset = None
 
 import os
 import sys
@@ -26,9 +34,13 @@ if check_mount and not is_windows:
     print(f"Safety Check: Verifying mount at {drive_path}...")
 
     if not os.path.ismount(drive_path):
-        print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
-        print("Stopping script to prevent writing to local storage.")
-        sys.exit(1)
+        if staging_cache.enabled():
+            print(f"WARNING: Drive is not mounted at {drive_path}.")
+            print("Writing to local staging instead; the flusher will sync it once the mount is back.")
+        else:
+            print(f"CRITICAL ERROR: Drive is not mounted at {drive_path}.")
+            print("Stopping script to prevent writing to local storage.")
+            sys.exit(1)
     else:
         print("Safety Check: PASSED. Drive is mounted.")
 elif check_mount and is_windows:
@@ -53,6 +65,9 @@ else:
 
 # Optional: You can change this here, or add START_YEAR to .env if you prefer
 START_YEAR = 2023 
+
+# Write through the local staging cache when LOCAL_STAGING_DIR is set
+CSV_FILE = staging_cache.stage(CSV_FILE)
 # -------------------------------------
 
 def main():
@@ -61,11 +76,6 @@ def main():
         print("CRITICAL ERROR: 'HEVY_API_KEY' not found in .env file.")
         return
 
-    headers = {
-        "api-key": API_KEY,
-        "Accept": "application/json"
-    }
-    
     print(f"--- STARTING HEVY HISTORY PULL (Since {START_YEAR}) ---")
     print(f"Target File: {CSV_FILE}")
     
@@ -98,11 +108,11 @@ def main():
     while keep_going:
         print(f"Fetching Page {page}...", end="", flush=True)
         
-        url = "https://api.hevyapp.com/v1/workouts"
         params = {"page": page, "pageSize": 10}
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            # One keep-alive session for every page; transient errors are retried
+            response = hevy_client.get("/v1/workouts", api_key=API_KEY, params=params)
             
             if response.status_code != 200:
                 print(f"\nCRITICAL ERROR: {response.status_code}")
@@ -117,6 +127,7 @@ def main():
                 break
                 
             new_rows = []
+            page_workouts = []
             
             for workout in workouts:
                 w_date_str = workout.get('start_time')
@@ -129,8 +140,13 @@ def main():
                     print(f"\nReached {w_dt.year}. Stopping.")
                     keep_going = False
                     break
+                page_workouts.append(workout)
                 
                 w_date_clean = w_dt.strftime("%Y-%m-%d")
+                try:
+                    raw_archive.put("hevy/workout", w_date_clean, workout, item=workout.get('id', ''))
+                except Exception as e:
+                    print(f"\n   Warning: Could not archive workout: {e}")
                 w_title = workout.get('title', 'Unknown Workout')
 
                 exercises = workout.get('exercises', [])
@@ -157,13 +173,24 @@ def main():
                         ]
                         new_rows.append(row)
 
+            try:
+                fitness_store.upsert_hevy_workouts(page_workouts)
+            except Exception as e:
+                print(f"\n   Warning: Could not update normalized workouts: {e}")
+
             # 4. Save to CSV
             if new_rows:
                 with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
                     writer = csv.writer(f)
                     writer.writerows(new_rows)
+                staging_cache.mark_dirty(CSV_FILE)
                 print(f" Saved {len(new_rows)} sets.")
                 total_sets += len(new_rows)
+
+                try:
+                    fitness_store.upsert_rows("hevy_sets", new_rows)
+                except Exception as e:
+                    print(f"   Warning: Could not update fitness store: {e}")
             else:
                 print(" (Page empty).")
 
@@ -174,6 +201,14 @@ def main():
             print(f"\nGlobal Error: {e}")
             break
 
+    # Rebuild the month partitions once rather than per page
+    if hevy_dataset and total_sets:
+        try:
+            hevy_dataset.rebuild_from_csv(CSV_FILE)
+            print("Hevy dataset rebuilt.")
+        except Exception as e:
+            print(f"Warning: Could not rebuild Hevy dataset: {e}")
+
     print(f"--- COMPLETE. Total Sets Saved: {total_sets} ---")
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+import os
+import csv
+import sys
+import json
+import shutil
+from datetime import datetime
+from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+
+# Rewrites every data CSV into one canonical layout and stamps a schema version:
+#   - ISO dates (YYYY-MM-DD), no US-format rows
+#   - fixed column order and numeric formatting (integers without ".0")
+#   - unique keys (last row wins), sorted by date
+#
+# Loaders that see the stamp take a fixed-format parse path instead of
+# pd.to_datetime(..., format='mixed'), which is slow on ARM.
+#
+#     python3 migrate_data.py            # migrate everything in SAVE_PATH
+#     python3 migrate_data.py --check    # report what would change
+
+load_dotenv()
+
+SCHEMA_VERSION = 1
+STAMP_FILE = "schema_version.json"
+
+# CSV file -> fitness_store table describing its columns
+FILES = {
+    "hevy_stats.csv": "hevy_sets",
+    "garmin_stats.csv": "garmin_daily",
+    "garmin_history.csv": "garmin_daily",
+    "garmin_runs.csv": "garmin_runs",
+}
+
+SAVE_PATH = os.getenv("SAVE_PATH")
+
+
+def csv_dtypes(table):
+    """pandas read_csv dtypes for a canonical file (Date is parsed separately)"""
+    dtypes = {}
+    for header, sql, sql_type in fitness_store.TABLES[table]["columns"]:
+        if sql == "date":
+            continue
+        if sql_type == "TEXT":
+            dtypes[header] = str
+        elif sql_type == "INTEGER":
+            dtypes[header] = "Int64"
+        else:
+            dtypes[header] = "float64"
+    return dtypes
+
+
+def _stamp_path(folder):
+    return os.path.join(folder, STAMP_FILE)
+
+
+def read_stamp(folder):
+    try:
+        with open(_stamp_path(folder), mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_canonical(csv_path):
+    """True if csv_path was migrated to the current schema version"""
+    stamp = read_stamp(os.path.dirname(csv_path) or ".")
+    return stamp.get("files", {}).get(os.path.basename(csv_path)) == SCHEMA_VERSION
+
+
+# REAL columns that only ever hold whole numbers (written without ".0")
+WHOLE_NUMBER_COLUMNS = {
+    "sleep_score", "rhr", "min_hr", "max_hr", "avg_stress", "steps", "step_goal",
+    "cals_total", "cals_active", "total_sets", "active_sets", "total_reps",
+}
+
+
+def _format_value(value, sql, sql_type):
+    if value is None:
+        return ""
+    if sql == "date":
+        return value
+    if sql_type == "INTEGER" or (sql in WHOLE_NUMBER_COLUMNS and float(value).is_integer()):
+        return str(int(value))
+    return str(value)
+
+
+def canonical_rows(table, csv_path):
+    """Read a CSV and return (headers, rows) in canonical form"""
+    spec = fitness_store.TABLES[table]
+    columns = spec["columns"]
+    key_positions = [i for i, (_, sql, _) in enumerate(columns) if sql in spec["key"]]
+    # Sort on date (and time for runs) only; the stable sort keeps each
+    # workout's exercise order from the original file
+    sort_positions = [i for i, (_, sql, _) in enumerate(columns) if sql in ("date", "time")]
+
+    by_key = {}
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header
+        for row in reader:
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            row = row[:len(columns)] + [""] * (len(columns) - len(row))
+            values = fitness_store._clean_row(table, row)
+            if not values[0]:
+                continue
+            key = tuple("" if values[i] is None else str(values[i]) for i in key_positions)
+            # Re-assigning an existing key keeps its original position
+            by_key[key] = [
+                _format_value(v, sql, sql_type) for v, (_, sql, sql_type) in zip(values, columns)
+            ]
+
+    rows = sorted(by_key.values(), key=lambda r: tuple(r[i] for i in sort_positions))
+    return fitness_store.csv_headers(table), rows
+
+
+def migrate_file(name, table, folder, check_only=False):
+    remote_path = os.path.join(folder, name)
+    if not os.path.isfile(staging_cache.read_path(remote_path)):
+        print(f"   {name}: not found, skipping")
+        return False
+
+    csv_path = staging_cache.stage(remote_path)
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+        before = sum(1 for _ in f) - 1
+    headers, rows = canonical_rows(table, csv_path)
+    print(f"   {name}: {before} rows -> {len(rows)} canonical rows")
+    if check_only:
+        return False
+
+    backup = csv_path + ".pre-migration.bak"
+    if not os.path.exists(backup):
+        shutil.copy2(csv_path, backup)
+
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    staging_cache.mark_dirty(csv_path)
+    return True
+
+
+def main():
+    folder = SAVE_PATH or "."
+    check_only = "--check" in sys.argv
+    print(f"--- MIGRATING DATA FILES TO SCHEMA v{SCHEMA_VERSION} ---")
+    print(f"Folder: {folder}")
+
+    migrated = []
+    for name, table in FILES.items():
+        try:
+            if migrate_file(name, table, folder, check_only):
+                migrated.append(name)
+        except Exception as e:
+            print(f"   {name}: FAILED ({e}) - file left untouched")
+
+    if migrated:
+        stamp_path = staging_cache.stage(_stamp_path(folder))
+        stamp = read_stamp(os.path.dirname(stamp_path))
+        stamp["schema_version"] = SCHEMA_VERSION
+        files = stamp.setdefault("files", {})
+        for name in migrated:
+            files[name] = SCHEMA_VERSION
+        stamp["migrated_at"] = datetime.now().isoformat(timespec='seconds')
+        with open(stamp_path, mode='w', encoding='utf-8') as f:
+            json.dump(stamp, f, indent=2)
+        staging_cache.mark_dirty(stamp_path)
+        print(f"Stamped {STAMP_FILE}. Sidecar indexes will rebuild on the next sync.")
+
+    print("--- COMPLETE ---")
+
+
+if __name__ == "__main__":
+    main()
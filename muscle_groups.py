@@ -0,0 +1,75 @@
+# Exercise classification shared by the dashboard and the Hevy data writers
+
+# Exercise to muscle group mapping
+MUSCLE_GROUP_MAP = {
+    # Shoulders
+    'shoulder': 'Shoulders',
+    'lateral raise': 'Shoulders',
+    'rear delt': 'Shoulders',
+    'front raise': 'Shoulders',
+    'shrug': 'Shoulders',
+    'face pull': 'Shoulders',
+    # Chest
+    'bench press': 'Chest',
+    'chest': 'Chest',
+    'pec': 'Chest',
+    'fly': 'Chest',
+    'push up': 'Chest',
+    'pushup': 'Chest',
+    # Back
+    'row': 'Back',
+    'lat pulldown': 'Back',
+    'pull up': 'Back',
+    'pullup': 'Back',
+    'deadlift': 'Back',
+    'back extension': 'Back',
+    # Arms - Biceps
+    'bicep': 'Biceps',
+    'curl': 'Biceps',
+    'hammer curl': 'Biceps',
+    # Arms - Triceps
+    'tricep': 'Triceps',
+    'pushdown': 'Triceps',
+    'skull crusher': 'Triceps',
+    'dip': 'Triceps',
+    # Legs - Quads
+    'squat': 'Quads',
+    'leg press': 'Quads',
+    'leg extension': 'Quads',
+    'lunge': 'Quads',
+    # Legs - Hamstrings
+    'leg curl': 'Hamstrings',
+    'romanian deadlift': 'Hamstrings',
+    'rdl': 'Hamstrings',
+    # Legs - Glutes
+    'hip thrust': 'Glutes',
+    'glute': 'Glutes',
+    'hip abduction': 'Glutes',
+    'hip adduction': 'Glutes',
+    # Calves
+    'calf': 'Calves',
+    # Core
+    'ab': 'Core',
+    'crunch': 'Core',
+    'plank': 'Core',
+    'core': 'Core',
+}
+
+# Cardio exercises to filter out of strength training charts
+CARDIO_KEYWORDS = ['stair', 'treadmill', 'bike', 'elliptical', 'run', 'cardio', 'walk']
+
+
+def get_muscle_group(exercise_name):
+    """Map exercise name to muscle group"""
+    name_lower = exercise_name.lower()
+    for keyword, muscle in MUSCLE_GROUP_MAP.items():
+        if keyword in name_lower:
+            return muscle
+    return 'Other'
+
+
+def is_cardio_exercise(exercise_name):
+    """Check if exercise is cardio-based"""
+    name_lower = exercise_name.lower()
+    return any(keyword in name_lower for keyword in CARDIO_KEYWORDS)
+
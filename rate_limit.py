@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import threading
+
+try:
+    import fcntl  # Not available on Windows
+except ImportError:
+    fcntl = None
+
+# Thread-safe token bucket shared by concurrent API workers. Tokens refill at
+# `rate` per second up to `burst`; acquire() blocks until one is available.
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- SHARED (CROSS-PROCESS) LIMITS ---
+# When RATE_LIMIT_DIR is set (athletes.py sets it for every sync it starts),
+# all processes calling one service draw from a single bucket kept in
+# RATE_LIMIT_DIR/<service>.bucket, so N athletes' syncs together stay under
+# <SERVICE>_SHARED_RATE requests per second.
+
+SHARED_DEFAULTS = {"garmin": (2.0, 4), "hevy": (5.0, 10)}
+_shared = {}
+
+
+class SharedTokenBucket:
+    def __init__(self, path, rate, burst=1):
+        self.path = path
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available in the shared file, then take them"""
+        while True:
+            with open(self.path, mode='a+', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "{}")
+                    except ValueError:
+                        state = {}
+                    now = time.time()
+                    available = min(self.capacity, state.get("tokens", self.capacity)
+                                    + (now - state.get("updated", now)) * self.rate)
+                    if available >= tokens:
+                        f.seek(0)
+                        f.truncate()
+                        json.dump({"tokens": available - tokens, "updated": now}, f)
+                        return
+                    wait = (tokens - available) / self.rate
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            time.sleep(wait)
+
+
+def for_service(service):
+    """The shared bucket for a service, or None when RATE_LIMIT_DIR is not set"""
+    folder = os.getenv("RATE_LIMIT_DIR")
+    if not folder:
+        return None
+    if service not in _shared:
+        rate, burst = SHARED_DEFAULTS.get(service, (1.0, 1))
+        prefix = service.upper()
+        _shared[service] = SharedTokenBucket(
+            os.path.join(folder, f"{service}.bucket"),
+            float(os.getenv(f"{prefix}_SHARED_RATE", rate)),
+            int(os.getenv(f"{prefix}_SHARED_BURST", burst)),
+        )
+    return _shared[service]
+
+
+def acquire(service, limiter=None):
+    """Take a token from the caller's own limiter (if any), then from the service's shared one"""
+    if limiter:
+        limiter.acquire()
+    shared = for_service(service)
+    if shared:
+        shared.acquire()
@@ -0,0 +1,221 @@
+import os
+import gzip
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+import fitness_store
+
+# Archive of raw API responses (Garmin endpoints, Hevy workouts), so derived
+# columns can be re-computed later without going back to the network.
+#
+#   <RAW_ARCHIVE_DIR>/objects/ab/ab12...ef.json.gz   gzip'd JSON, named by sha256
+#   <RAW_ARCHIVE_DIR>/refs.db                        (endpoint, day, item) -> sha256
+#
+# Identical responses (e.g. the hourly job re-fetching an unchanged endpoint)
+# share one object; an object is deleted when its last ref moves on (gc() sweeps
+# any left over, run by cold_archive.py). Re-deriving: see replay_archive.py.
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+RAW_DIR = os.getenv("RAW_ARCHIVE_DIR", os.path.join(fitness_store.LOCAL_DATA_DIR, "raw"))
+# -------------------------------------
+
+REFS_DDL = """
+CREATE TABLE IF NOT EXISTS refs (
+    endpoint TEXT NOT NULL,
+    day TEXT NOT NULL,
+    item TEXT NOT NULL DEFAULT '',
+    sha256 TEXT NOT NULL,
+    fetched_at TEXT,
+    PRIMARY KEY (endpoint, day, item)
+)
+"""
+
+
+def get_connection():
+    os.makedirs(RAW_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(RAW_DIR, "refs.db"), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(REFS_DDL)
+    return conn
+
+
+def _object_path(digest):
+    return os.path.join(RAW_DIR, "objects", digest[:2], digest + ".json.gz")
+
+
+def _encode(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _read_object(digest):
+    with gzip.open(_object_path(digest), mode='rb') as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def _write_object(digest, data):
+    path = _object_path(digest)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, mode='wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def _remove_object(digest):
+    try:
+        os.remove(_object_path(digest))
+    except OSError:
+        pass
+
+
+def put(endpoint, day, payload, item=""):
+    """
+    Store one response for (endpoint, day[, item]). Returns its sha256.
+    The object the ref pointed to before is deleted once nothing else refers to it.
+    """
+    data = _encode(payload)
+    digest = hashlib.sha256(data).hexdigest()
+
+    conn = get_connection()
+    try:
+        # The write lock serializes puts across processes, so an object is never
+        # removed between another put's existence check and its ref insert
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT sha256 FROM refs WHERE endpoint = ? AND day = ? AND item = ?", (endpoint, day, str(item))
+        ).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO refs (endpoint, day, item, sha256, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (endpoint, day, str(item), digest, datetime.now().isoformat(timespec='seconds')),
+        )
+        _write_object(digest, data)
+        if row and row[0] != digest and conn.execute(
+            "SELECT 1 FROM refs WHERE sha256 = ? LIMIT 1", (row[0],)
+        ).fetchone() is None:
+            _remove_object(row[0])
+        conn.commit()
+    finally:
+        conn.close()
+    return digest
+
+
+def gc():
+    """Delete objects no ref points to (left behind by older versions of put). Returns the count."""
+    objects_dir = os.path.join(RAW_DIR, "objects")
+    if not os.path.isdir(objects_dir):
+        return 0
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        referenced = {r[0] for r in conn.execute("SELECT DISTINCT sha256 FROM refs")}
+        removed = 0
+        for folder, _, names in os.walk(objects_dir):
+            for name in names:
+                if name.endswith(".json.gz") and name[:-len(".json.gz")] not in referenced:
+                    _remove_object(name[:-len(".json.gz")])
+                    removed += 1
+        conn.commit()
+        return removed
+    finally:
+        conn.close()
+
+
+def forget(endpoint, item, keep_day=None):
+    """
+    Drop an item's refs on every day except keep_day (a workout that moved days,
+    or was deleted), removing objects nothing refers to any more. Returns the count.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT day, sha256 FROM refs WHERE endpoint = ? AND item = ? AND day != ?",
+            (endpoint, str(item), keep_day or ""),
+        ).fetchall()
+        for day, digest in rows:
+            conn.execute("DELETE FROM refs WHERE endpoint = ? AND day = ? AND item = ?", (endpoint, day, str(item)))
+            if conn.execute("SELECT 1 FROM refs WHERE sha256 = ? LIMIT 1", (digest,)).fetchone() is None:
+                _remove_object(digest)
+        conn.commit()
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def find(endpoint, item):
+    """[(day, payload)] archived for an item on any day"""
+    return [(day, _read_object(digest)) for _, day, _, digest in _select("endpoint = ? AND item = ?", (endpoint, str(item)))]
+
+
+def has(endpoint, day, item=""):
+    conn = get_connection()
+    try:
+        return conn.execute(
+            "SELECT 1 FROM refs WHERE endpoint = ? AND day = ? AND item = ?", (endpoint, day, str(item))
+        ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def get(endpoint, day, item=""):
+    """The archived response, or None if it was never archived"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT sha256 FROM refs WHERE endpoint = ? AND day = ? AND item = ?", (endpoint, day, str(item))
+        ).fetchone()
+    finally:
+        conn.close()
+    return _read_object(row[0]) if row else None
+
+
+def _select(where, params):
+    conn = get_connection()
+    try:
+        return conn.execute(
+            f"SELECT endpoint, day, item, sha256 FROM refs WHERE {where} ORDER BY day, endpoint, item", params
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _range_clause(start, end):
+    clause, params = "", []
+    if start:
+        clause += " AND day >= ?"
+        params.append(str(start))
+    if end:
+        clause += " AND day <= ?"
+        params.append(str(end))
+    return clause, params
+
+
+def iter_days(prefix, start=None, end=None):
+    """
+    Yield (day, {name: payload}) for every archived day of a source, in date
+    order. `prefix` is the endpoint namespace, e.g. "garmin" for "garmin/sleep".
+    """
+    clause, params = _range_clause(start, end)
+    rows = _select(f"endpoint LIKE ? AND item = ''{clause}", [prefix + "/%"] + params)
+
+    current, payloads = None, {}
+    for endpoint, day, _, digest in rows:
+        if day != current:
+            if current is not None:
+                yield current, payloads
+            current, payloads = day, {}
+        payloads[endpoint[len(prefix) + 1:]] = _read_object(digest)
+    if current is not None:
+        yield current, payloads
+
+
+def iter_items(endpoint, start=None, end=None):
+    """Yield (day, item, payload) for an itemised endpoint (e.g. one Hevy workout per item)"""
+    clause, params = _range_clause(start, end)
+    for _, day, item, digest in _select(f"endpoint = ?{clause}", [endpoint] + params):
+        yield day, item, _read_object(digest)
@@ -0,0 +1,88 @@
+import os
+import json
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+import fitness_store
+import raw_archive
+import garmin_metrics
+
+# Per-metric refresh policies for the hourly Garmin job.
+#
+#   live            user summary (steps, calories, stress, ...), activities,
+#                   SpO2 / respiration: re-polled on every run
+#   finalize once   sleep, HRV, body composition, training status, max metrics
+#                   (VO2 Max): once one of them has yielded data for a date it
+#                   is final, and later runs reuse the archived response
+#
+# Yesterday is re-polled in full exactly once, on the first run after
+# YESTERDAY_REFRESH_HOUR, so late-syncing steps and late-finalizing sleep/HRV
+# make it into its row.
+#
+#   data/refresh_state.json  {"final": {day: {endpoint: finalized_at}}, "refreshed": [day, ...]}
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+STATE_FILE = os.path.join(fitness_store.LOCAL_DATA_DIR, "refresh_state.json")
+YESTERDAY_REFRESH_HOUR = int(os.getenv("YESTERDAY_REFRESH_HOUR", "9"))
+# -------------------------------------
+
+FINALIZE_ONCE = ["sleep", "hrv", "body_composition", "training_status", "max_metrics"]
+KEEP_DAYS = 7
+
+
+def load():
+    try:
+        with open(STATE_FILE, mode='r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("final", {})
+    state.setdefault("refreshed", [])
+    return state
+
+
+def save(state):
+    cutoff = (date.today() - timedelta(days=KEEP_DAYS)).isoformat()
+    state["final"] = {d: v for d, v in state["final"].items() if d >= cutoff}
+    state["refreshed"] = sorted(d for d in state["refreshed"] if d >= cutoff)
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def final_endpoints(state, day):
+    """Endpoints already final for `day` whose archived response can be reused"""
+    return {
+        name for name in state["final"].get(day, {})
+        if raw_archive.has(f"{garmin_metrics.ARCHIVE_PREFIX}/{name}", day)
+    }
+
+
+def cached(day, names):
+    """Archived responses for endpoints that were not re-fetched"""
+    return {name: raw_archive.get(f"{garmin_metrics.ARCHIVE_PREFIX}/{name}", day) for name in names}
+
+
+def mark_final(state, day, raw):
+    """Finalize-once endpoints that yielded data for `day` in this run"""
+    now = datetime.now().isoformat(timespec='seconds')
+    final = state["final"].setdefault(day, {})
+    for name, columns in garmin_metrics.contributions(day, raw, FINALIZE_ONCE).items():
+        if columns and name not in final:
+            final[name] = now
+    return state
+
+
+def needs_refresh(state, day, now=None):
+    """True once per day: `day` (yesterday) has not had its single late re-poll yet"""
+    now = now or datetime.now()
+    return day not in state["refreshed"] and now.hour >= YESTERDAY_REFRESH_HOUR
+
+
+def mark_refreshed(state, day):
+    if day not in state["refreshed"]:
+        state["refreshed"].append(day)
+    return state
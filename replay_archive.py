@@ -0,0 +1,212 @@
+import os
+import csv
+import argparse
+from dotenv import load_dotenv
+import fitness_store
+import staging_cache
+import raw_archive
+import garmin_metrics
+import garmin_bulk
+import signature_index
+
+try:
+    import garmin_daily_mmap  # Optional: needs numpy
+except ImportError:
+    garmin_daily_mmap = None
+
+try:
+    import hevy_dataset  # Optional: needs pandas + pyarrow
+    import cold_archive
+except ImportError:
+    hevy_dataset = cold_archive = None
+
+# Re-derives the tables from raw_archive without touching the network, e.g.
+# after adding a column to garmin_metrics.derive_row:
+#
+#     python3 replay_archive.py garmin                          # whole archive
+#     python3 replay_archive.py garmin --start 2024-01-01 --end 2024-06-30
+#     python3 replay_archive.py garmin --dry-run                # count only
+#     python3 replay_archive.py hevy                            # sets + normalized workouts
+#
+# Garmin: days already in garmin_stats.csv are replaced there, everything else
+# is merged into garmin_history.csv, then the local stores are rebuilt.
+# Hevy: sets derived from the archived workouts replace the rows with the same
+# (date, workout, exercise, set) in hevy_stats.csv, then the local stores are
+# rebuilt. Both leave years sealed by cold_archive.py alone.
+
+load_dotenv()
+
+SAVE_PATH = os.getenv("SAVE_PATH")
+
+
+def _csv_path(name):
+    return os.path.join(SAVE_PATH, name) if SAVE_PATH else name
+
+
+def merge_into_csv(remote_path, rows_by_day, add_missing=True):
+    """
+    Replace the rows for the given days (and optionally append days the file
+    lacks), keeping the file sorted by date. Returns the set of days written.
+    """
+    csv_path = staging_cache.stage(remote_path)
+    existing = []
+    if os.path.isfile(csv_path):
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            existing = [row for row in reader if row]
+
+    written = set()
+    merged = {}
+    for row in existing:
+        day = fitness_store.normalize_date(row[0])
+        if day in rows_by_day:
+            row = rows_by_day[day]
+            written.add(day)
+        merged[day or row[0]] = row
+    if add_missing:
+        for day, row in rows_by_day.items():
+            if day not in merged:
+                merged[day] = row
+                written.add(day)
+    if not written:
+        return written
+
+    folder = os.path.dirname(csv_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(garmin_metrics.HEADERS)
+        writer.writerows(merged[day] for day in sorted(merged))
+    os.replace(tmp_path, csv_path)
+    staging_cache.mark_dirty(csv_path)
+    return written
+
+
+def _range_days(start=None, end=None):
+    """Per-day raw dicts pivoted out of archived bulk (range) responses"""
+    days = {}
+    for name in garmin_bulk.RANGE_ENDPOINTS:
+        for _, _, payload in raw_archive.iter_items(f"{garmin_bulk.ARCHIVE_PREFIX}/{name}"):
+            garmin_bulk.pivot({name: payload}, days)
+    return {d: raw for d, raw in days.items()
+            if (not start or d >= start) and (not end or d <= end)}
+
+
+def replay_garmin(start=None, end=None, dry_run=False):
+    # Bulk-mode responses first; per-day responses override them endpoint by endpoint
+    raw_days = _range_days(start, end)
+    for day, raw in raw_archive.iter_days(garmin_metrics.ARCHIVE_PREFIX, start, end):
+        raw_days.setdefault(day, {}).update(raw)
+    history_path = _csv_path("garmin_history.csv")
+    sealed = set(cold_archive.archived_years(history_path)) if cold_archive else set()
+    rows = {
+        day: garmin_metrics.derive_row(day, raw_days[day])
+        for day in sorted(raw_days) if int(day[:4]) not in sealed
+    }
+    print(f"   Derived {len(rows)} days from the archive")
+    if dry_run or not rows:
+        return len(rows)
+
+    # The hourly file keeps its own days; everything else lives in the history file
+    in_daily = merge_into_csv(_csv_path("garmin_stats.csv"), rows, add_missing=False)
+    in_history = merge_into_csv(history_path, {d: r for d, r in rows.items() if d not in in_daily})
+    print(f"   garmin_stats.csv: {len(in_daily)} days, garmin_history.csv: {len(in_history)} days")
+
+    fitness_store.rebuild_from_csv("garmin_daily")
+    if garmin_daily_mmap:
+        garmin_daily_mmap.rebuild_from_csv()
+    print("   Local stores rebuilt")
+    return len(rows)
+
+
+def _latest_workouts(start=None, end=None):
+    """One archived payload per workout id (the most recently updated, if it moved days)"""
+    latest = {}
+    for _, item, payload in raw_archive.iter_items("hevy/workout", start, end):
+        previous = latest.get(item)
+        if previous is None or str(payload.get('updated_at') or '') >= str(previous.get('updated_at') or ''):
+            latest[item] = payload
+    return list(latest.values())
+
+
+def merge_hevy_csv(remote_path, rows):
+    """
+    Replace CSV rows that share a set key with `rows`, append the rest, keep the
+    file sorted by date. Returns the number of rows written.
+    """
+    csv_path = staging_cache.stage(remote_path)
+    existing = []
+    if os.path.isfile(csv_path):
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            existing = [row for row in reader if row]
+
+    def key(row):
+        return (fitness_store.normalize_date(row[0]),) + tuple(str(v) for v in row[1:4])
+
+    merged = {key(row): row for row in existing if len(row) > 3}
+    for row in rows:
+        merged[key(row)] = row
+
+    folder = os.path.dirname(csv_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fitness_store.csv_headers("hevy_sets"))
+        # Stable sort keeps each workout's sets in their original order
+        writer.writerows(sorted(merged.values(), key=lambda r: fitness_store.normalize_date(r[0]) or ''))
+    os.replace(tmp_path, csv_path)
+    staging_cache.mark_dirty(csv_path)
+    return len(rows)
+
+
+def replay_hevy(start=None, end=None, dry_run=False):
+    workouts = _latest_workouts(start, end)
+    print(f"   {len(workouts)} archived workouts")
+    if dry_run or not workouts:
+        return len(workouts)
+
+    remote_path = _csv_path("hevy_stats.csv")
+    sealed = set(cold_archive.archived_years(remote_path)) if cold_archive else set()
+    rows = []
+    for workout in workouts:
+        date_str, workout_set_rows = fitness_store.workout_rows(workout)
+        if date_str and int(date_str[:4]) not in sealed:
+            rows.extend(workout_set_rows)
+    written = merge_hevy_csv(remote_path, rows)
+    print(f"   hevy_stats.csv: {written} sets written")
+
+    csv_path = staging_cache.stage(remote_path)
+    signature_index.rebuild(csv_path)
+    fitness_store.rebuild_from_csv("hevy_sets")
+    if hevy_dataset:
+        hevy_dataset.rebuild_from_csv()
+    fitness_store.upsert_hevy_workouts(workouts)
+    print("   Local stores and normalized workouts rebuilt")
+    return len(workouts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-derive tables from archived raw API responses")
+    parser.add_argument("source", choices=["garmin", "hevy"])
+    parser.add_argument("--start", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last day (YYYY-MM-DD)")
+    parser.add_argument("--dry-run", action="store_true", help="derive and count, write nothing")
+    args = parser.parse_args()
+
+    print(f"--- REPLAYING {args.source.upper()} FROM {raw_archive.RAW_DIR} ---")
+    if args.source == "garmin":
+        replay_garmin(args.start, args.end, args.dry_run)
+    else:
+        replay_hevy(args.start, args.end, args.dry_run)
+    print("--- COMPLETE ---")
+
+
+if __name__ == "__main__":
+    main()
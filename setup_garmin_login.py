@@ -25,7 +25,7 @@ def main():
         print(f"Attempting login for {email}...")
         garth.login(email, password)
         print("Login SUCCESS!")
-        garth.save(".garth")
+        garth.save(os.getenv("GARMIN_TOKEN_DIR", ".garth"))
         print("Tokens saved.")
 
     except Exception as e:
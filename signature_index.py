@@ -0,0 +1,151 @@
+import os
+import sys
+import csv
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+from datetime import date, timedelta
+
+# Persistent dedup index for hevy_stats.csv set signatures
+# (Date_Workout_Exercise_Set), kept next to the CSV so the hourly sync does not
+# have to stream the whole history to build its `existing_sets` set.
+#
+#   <csv>.sigs       sorted little-endian uint64 hashes of older signatures
+#   <csv>.sigs.json  exact signatures for the last TAIL_DAYS days + CSV size
+#
+# Lookups check the exact tail first, then binary-search the hash file through
+# mmap. Both are rebuilt from the CSV whenever its size no longer matches what
+# the index last saw (e.g. after a history import).
+
+TAIL_DAYS = 14
+_HASH = struct.Struct('<Q')
+
+
+def make_signature(date_str, workout, exercise, set_num):
+    return f"{date_str}_{workout}_{exercise}_{set_num}"
+
+
+def _hash(signature):
+    return int.from_bytes(hashlib.blake2b(signature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _paths(csv_file):
+    return csv_file + ".sigs", csv_file + ".sigs.json"
+
+
+def _tail_cutoff():
+    return (date.today() - timedelta(days=TAIL_DAYS)).isoformat()
+
+
+def _write_hashes(path, hashes):
+    hashes = array('Q', sorted(set(hashes)))
+    if sys.byteorder == 'big':
+        hashes.byteswap()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode='wb') as f:
+        hashes.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def _read_hashes(path):
+    hashes = array('Q')
+    if os.path.isfile(path):
+        with open(path, mode='rb') as f:
+            hashes.frombytes(f.read())
+        if sys.byteorder == 'big':
+            hashes.byteswap()
+    return hashes
+
+
+def _save_meta(csv_file, index):
+    _, meta_path = _paths(csv_file)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump({"csv_size": index["csv_size"], "tail": index["tail"]}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def rebuild(csv_file):
+    """Stream the CSV once and write both index files"""
+    hash_path, _ = _paths(csv_file)
+    cutoff = _tail_cutoff()
+    tail, hashes = {}, []
+
+    with open(csv_file, mode='r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header
+        for row in reader:
+            if len(row) > 3:
+                signature = make_signature(row[0], row[1], row[2], row[3])
+                if row[0] >= cutoff:
+                    tail[signature] = row[0]
+                else:
+                    hashes.append(_hash(signature))
+
+    _write_hashes(hash_path, hashes)
+    index = {"csv_file": csv_file, "csv_size": os.path.getsize(csv_file), "tail": tail}
+    _save_meta(csv_file, index)
+    return index
+
+
+def load(csv_file):
+    """Open the index for a CSV, rebuilding it if the CSV changed outside of add()"""
+    hash_path, meta_path = _paths(csv_file)
+    try:
+        with open(meta_path, mode='r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("csv_size") == os.path.getsize(csv_file) and os.path.isfile(hash_path):
+            return {"csv_file": csv_file, "csv_size": meta["csv_size"], "tail": meta.get("tail", {})}
+    except (OSError, ValueError):
+        pass
+    print("   Rebuilding set signature index...")
+    return rebuild(csv_file)
+
+
+def contains(index, signature):
+    if signature in index["tail"]:
+        return True
+
+    hash_path, _ = _paths(index["csv_file"])
+    if not os.path.isfile(hash_path) or os.path.getsize(hash_path) == 0:
+        return False
+
+    target = _hash(signature)
+    with open(hash_path, mode='rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lo, hi = 0, len(mm) // 8
+            while lo < hi:
+                mid = (lo + hi) // 2
+                value = _HASH.unpack_from(mm, mid * 8)[0]
+                if value == target:
+                    return True
+                if value < target:
+                    lo = mid + 1
+                else:
+                    hi = mid
+    return False
+
+
+def add(index, signatures):
+    """
+    Record signatures (iterable of (signature, date_str)) that were just appended
+    to the CSV. Tail entries that age out of the window are folded into the
+    sorted hash file.
+    """
+    for signature, date_str in signatures:
+        index["tail"][signature] = date_str
+
+    cutoff = _tail_cutoff()
+    expired = [s for s, d in index["tail"].items() if d < cutoff]
+    if expired:
+        hash_path, _ = _paths(index["csv_file"])
+        hashes = _read_hashes(hash_path)
+        hashes.extend(_hash(s) for s in expired)
+        _write_hashes(hash_path, hashes)
+        for s in expired:
+            del index["tail"][s]
+
+    index["csv_size"] = os.path.getsize(index["csv_file"])
+    _save_meta(index["csv_file"], index)
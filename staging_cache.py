@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl  # Not available on Windows
+except ImportError:
+    fcntl = None
+
+# Local write-back staging layer in front of the Google Drive (rclone FUSE) mount.
+#
+# When LOCAL_STAGING_DIR is set, writers call stage() to get a local copy of
+# their file, write to it, and mark_dirty() it. A background flusher copies
+# dirty files to the mount in batches, so ingestion keeps working while the
+# mount is briefly down, and readers use read_path() to get the local copy.
+#
+# Run the flusher (see ai-fitness-flusher.service):
+#     python3 staging_cache.py --daemon
+# Or flush once by hand:
+#     python3 staging_cache.py
+
+load_dotenv()
+
+# --- CONFIGURATION VIA ENVIRONMENT ---
+STAGING_DIR = os.getenv("LOCAL_STAGING_DIR")
+FLUSH_INTERVAL = int(os.getenv("STAGING_FLUSH_INTERVAL", "300"))
+check_mount = os.getenv("CHECK_MOUNT_STATUS", "False").lower() == "true"
+drive_path = os.getenv("DRIVE_MOUNT_PATH", "/home/pi/google_drive")
+is_windows = platform.system() == "Windows"
+# -------------------------------------
+
+
+def enabled():
+    return bool(STAGING_DIR)
+
+
+def mount_available():
+    """Same rule as the scripts' safety check: only enforced on Linux with CHECK_MOUNT_STATUS"""
+    if not check_mount or is_windows:
+        return True
+    return os.path.ismount(drive_path)
+
+
+def _manifest_path():
+    return os.path.join(STAGING_DIR, "manifest.json")
+
+
+@contextmanager
+def _locked_manifest():
+    """Read-modify-write the manifest under an exclusive lock"""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    with open(os.path.join(STAGING_DIR, "manifest.lock"), mode='w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(_manifest_path(), mode='r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+            yield manifest
+            tmp_path = _manifest_path() + ".tmp"
+            with open(tmp_path, mode='w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, _manifest_path())
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def local_path(remote_path):
+    """Where a remote file lives inside the staging dir (mirrors the absolute path)"""
+    drive, rest = os.path.splitdrive(os.path.abspath(remote_path))
+    parts = [drive.strip(":\\/")] if drive else []
+    parts.append(rest.lstrip("\\/"))
+    return os.path.join(STAGING_DIR, *[p for p in parts if p])
+
+
+def stage(remote_path):
+    """
+    Return the path a writer should use for remote_path.
+    With staging disabled this is remote_path itself. Otherwise the file is
+    pulled down from the mount first if the mount has a newer clean copy.
+    """
+    if not enabled():
+        return remote_path
+
+    local = local_path(remote_path)
+    os.makedirs(os.path.dirname(local), exist_ok=True)
+
+    with _locked_manifest() as manifest:
+        entry = manifest.setdefault(local, {"remote": remote_path, "dirty": False})
+        if not entry["dirty"] and mount_available() and os.path.isfile(remote_path):
+            if not os.path.isfile(local) or os.path.getmtime(remote_path) > os.path.getmtime(local):
+                shutil.copy2(remote_path, local)
+    return local
+
+
+def mark_dirty(path):
+    """Flag a staged file for the next flush (no-op when staging is disabled)"""
+    if not enabled():
+        return
+    with _locked_manifest() as manifest:
+        if path in manifest:
+            manifest[path]["dirty"] = True
+
+
+def read_path(remote_path):
+    """Path readers should open: the staged copy when there is one"""
+    if enabled():
+        local = local_path(remote_path)
+        if os.path.isfile(local):
+            return local
+    return remote_path
+
+
+def flush():
+    """Copy every dirty staged file to the mount. Returns the number flushed."""
+    if not enabled():
+        return 0
+    if not mount_available():
+        print(f"Staging: {drive_path} is not mounted, keeping changes local.")
+        return 0
+
+    flushed = 0
+    with _locked_manifest() as manifest:
+        for local, entry in manifest.items():
+            if not entry.get("dirty") or not os.path.isfile(local):
+                continue
+            remote = entry["remote"]
+            try:
+                mtime = os.path.getmtime(local)
+                folder = os.path.dirname(remote)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder)
+                # Write beside the target and rename so readers never see half a file
+                tmp_path = remote + ".staging-tmp"
+                shutil.copy2(local, tmp_path)
+                os.replace(tmp_path, remote)
+                # A writer may have touched the file while we copied it
+                if os.path.getmtime(local) == mtime:
+                    entry["dirty"] = False
+                flushed += 1
+            except OSError as e:
+                print(f"Staging: Failed to flush {remote}: {e}")
+    return flushed
+
+
+def main():
+    if not enabled():
+        print("LOCAL_STAGING_DIR is not set; staging is disabled.")
+        return
+
+    if "--daemon" in sys.argv:
+        print(f"Staging flusher running every {FLUSH_INTERVAL}s ({STAGING_DIR})")
+        while True:
+            count = flush()
+            if count:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} Flushed {count} file(s)")
+            time.sleep(FLUSH_INTERVAL)
+    else:
+        print(f"Flushed {flush()} file(s)")
+
+
+if __name__ == "__main__":
+    main()